@@ -0,0 +1,97 @@
+"""
+Route construction: regret-k insertion, over the whole instance and cluster
+by cluster, against the nearest-neighbour baseline.
+
+Every heuristic builds routes for the same generated instances (metro
+clusters of stops, one vehicle per ~`--stops-per-vehicle` stops). Traffic is
+off so travel times are deterministic. Each plan is scored under the same
+rules (waiting for windows to open): served stops, distance, cost, stops
+reached after their window closes and routes that overrun the shift. Run from the backend directory:
+
+    python -m benchmarks.construction --sizes 1000 2000 5000 10000 20000 50000
+"""
+from typing import Any, Dict, List
+import argparse
+import time
+import numpy as np
+from common.serialization import construct
+from route_optimiser.construction import SHIFT_START_MINUTE
+from route_optimiser.distance import BASE_SPEED_KMH
+from route_optimiser.service import DeliveryNode, RouteOptimizationRequest, RouteOptimizer, Vehicle
+from . import payloads
+
+def build_request(seed: int, num_stops: int, stops_per_vehicle: int) -> RouteOptimizationRequest:
+    """A request past the API's size limits, built without validating the request itself"""
+    rng = np.random.default_rng(seed)
+    body = payloads.route_request(rng, num_stops, max(1, num_stops // stops_per_vehicle))
+    return construct(
+        RouteOptimizationRequest,
+        vehicles=[Vehicle(**vehicle) for vehicle in body["vehicles"]],
+        deliveries=[DeliveryNode(**delivery) for delivery in body["deliveries"]],
+        optimization_objective="minimize_cost",
+        include_traffic=False,
+        drone_delivery_enabled=False
+    )
+
+def score(request: RouteOptimizationRequest, routes: List[Any]) -> Dict[str, Any]:
+    """Plan quality, re-timed with the same waiting and shift rules for every heuristic"""
+    deliveries = {d.node_id: d for d in request.deliveries}
+    vehicles = {v.vehicle_id: v for v in request.vehicles}
+    late = overtime = served = 0
+    for route in routes:
+        clock = SHIFT_START_MINUTE
+        for segment in route.route_segments:
+            clock += segment.distance_km / BASE_SPEED_KMH * 60
+            if segment.delivery_node_id is None:
+                continue
+            delivery = deliveries[segment.delivery_node_id]
+            served += 1
+            late += clock > delivery.time_window_end + 1e-6
+            clock = max(clock, delivery.time_window_start) + delivery.service_time_minutes
+        overtime += clock > SHIFT_START_MINUTE + vehicles[route.vehicle_id].max_working_hours * 60 + 1e-6
+    return {
+        "served": served,
+        "on_time": served - int(late),
+        "distance_km": round(sum(r.total_distance_km for r in routes), 1),
+        "cost": round(sum(r.total_cost for r in routes), 1),
+        "late_stops": int(late),
+        "routes_over_shift": int(overtime),
+        "km_per_stop": round(sum(r.total_distance_km for r in routes) / max(served, 1), 2)
+    }
+
+def run(sizes: List[int], stops_per_vehicle: int, seed: int, skip_baseline_above: int,
+        skip_global_above: int) -> List[Dict[str, Any]]:
+    optimizer = RouteOptimizer()
+    results = []
+    for size in sizes:
+        request = build_request(seed, size, stops_per_vehicle)
+        heuristics = {"regret_decomposed": ("decomposed", optimizer._construct_regret_routes)}
+        if size <= skip_global_above:
+            heuristics["regret_global"] = ("global", optimizer._construct_regret_routes)
+        if size <= skip_baseline_above:
+            heuristics["nearest_neighbor"] = ("global", optimizer._optimize_vehicle_routes)
+        for name, (solve_mode, build) in heuristics.items():
+            request.solve_mode = solve_mode
+            start = time.perf_counter()
+            routes = build(request.vehicles, list(request.deliveries), request)
+            elapsed = time.perf_counter() - start
+            result = {"stops": size, "vehicles": len(request.vehicles), "construction": name,
+                      "seconds": round(elapsed, 2), **score(request, routes)}
+            results.append(result)
+            print(result, flush=True)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 2000, 5000, 10000, 20000, 50000])
+    parser.add_argument("--stops-per-vehicle", type=int, default=25)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--skip-baseline-above", type=int, default=5000,
+                        help="Largest instance nearest-neighbour is run on; it is quadratic in Python")
+    parser.add_argument("--skip-global-above", type=int, default=10000,
+                        help="Largest instance global regret is run on; its cost matrix is stops x vehicles")
+    args = parser.parse_args()
+    run(args.sizes, args.stops_per_vehicle, args.seed, args.skip_baseline_above, args.skip_global_above)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,370 @@
+"""
+End-to-end load test of the API, in-process or through a real server.
+
+Each scenario is driven closed-loop: `concurrency` clients send requests
+back to back for `--duration` seconds, and every response is timed from
+send to last byte. WebSocket scenarios connect N dashboard clients and
+measure how quickly each published frame reaches all of them. Run from
+the backend directory:
+
+    python -m benchmarks.loadtest                                   # ASGI app in this process
+    python -m benchmarks.loadtest --server --workers 4              # spawned local uvicorn
+    python -m benchmarks.loadtest --url http://staging:8000         # already running server
+    python -m benchmarks.loadtest --save-baseline benchmarks/baseline.json
+    python -m benchmarks.loadtest --baseline benchmarks/baseline.json
+
+With `--baseline`, p50/p99 or throughput worse than the baseline by more
+than `--tolerance` is reported as a regression and the exit status is 1.
+Latency claims made in the API docs are checked against the measured mean.
+"""
+import numpy as np
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+import httpx
+from . import payloads
+
+BENCHMARK_RESULTS_PATH = os.getenv("BENCHMARK_RESULTS_PATH", "/tmp/api_benchmark.json")
+PAYLOAD_POOL_SIZE = 16  # Distinct bodies cycled per scenario, encoded before timing starts
+WARMUP_REQUESTS = 3
+SERVER_START_TIMEOUT_SECONDS = 60.0
+DEFAULT_TOLERANCE = 0.2
+
+# name -> (method, path, payload generator or None, latency the docs claim in ms)
+HTTP_SCENARIOS: Dict[str, Tuple[str, str, Optional[Callable[[np.random.Generator], Any]], float]] = {
+    "forecast": ("POST", "/forecast/", payloads.forecast_request, 200),
+    "forecast_batch": ("POST", "/forecast/batch", payloads.batch_forecast_request, 200),
+    "inventory_optimize": ("POST", "/inventory/optimize", payloads.inventory_request, 150),
+    "inventory_optimize_solver": ("POST", "/inventory/optimize",
+                                  lambda rng: payloads.inventory_request(rng, optimizer="solver"), 150),
+    "route_optimize": ("POST", "/route/optimize", payloads.route_request, 180),
+    "monitoring_dashboard": ("GET", "/monitoring/dashboard", None, 200),
+}
+WEBSOCKET_SCENARIOS = ("monitoring_ws",)
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, float]:
+    """Throughput and latency percentiles in milliseconds"""
+    if not latencies:
+        return {"requests": 0, "errors": errors, "throughput_rps": 0.0}
+    ms = np.asarray(latencies) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": len(latencies) / elapsed,
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+        "max_ms": float(ms.max())
+    }
+
+# Targets
+
+class ASGIWebSocket:
+    """Minimal in-process WebSocket client that talks to the ASGI app directly"""
+
+    def __init__(self, app, path: str):
+        self.app = app
+        self.path, _, query = path.partition("?")
+        self.query = query.encode()
+        self._inbound: asyncio.Queue = asyncio.Queue()
+        self._outbound: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    async def connect(self):
+        scope = {"type": "websocket", "asgi": {"version": "3.0"}, "scheme": "ws", "path": self.path,
+                 "raw_path": self.path.encode(), "query_string": self.query, "headers": [],
+                 "client": ("127.0.0.1", 0), "server": ("bench", 80), "subprotocols": []}
+        self._inbound.put_nowait({"type": "websocket.connect"})
+        self._task = asyncio.create_task(self.app(scope, self._inbound.get, self._outbound.put))
+        message = await self._outbound.get()
+        if message["type"] != "websocket.accept":
+            raise ConnectionError(f"WebSocket rejected: {message}")
+        return self
+
+    async def recv(self):
+        message = await self._outbound.get()
+        if message["type"] == "websocket.close":
+            raise ConnectionError("WebSocket closed by server")
+        return message.get("text") if message.get("text") is not None else message.get("bytes")
+
+    async def close(self):
+        self._inbound.put_nowait({"type": "websocket.disconnect", "code": 1000})
+        await asyncio.wait_for(self._task, 5)
+
+class InProcessTarget:
+    """The ASGI app in this event loop, with its startup and shutdown hooks run"""
+
+    name = "in-process"
+
+    async def __aenter__(self):
+        from main import app  # Imported lazily so --server runs don't load the models twice
+
+        self.app = app
+        self._lifespan = app.router.lifespan_context(app)
+        await self._lifespan.__aenter__()
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=120)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.client.aclose()
+        await self._lifespan.__aexit__(*exc)
+
+    async def websocket(self, path: str):
+        return await ASGIWebSocket(self.app, path).connect()
+
+class ServerTarget:
+    """A uvicorn server, spawned locally unless `url` points at a running one"""
+
+    def __init__(self, url: Optional[str] = None, workers: int = 1):
+        self.url = url
+        self.workers = workers
+        self.name = f"server:{url}" if url else f"uvicorn x{workers}"
+        self._process: Optional[subprocess.Popen] = None
+
+    async def __aenter__(self):
+        if self.url is None:
+            with socket.socket() as sock:
+                sock.bind(("127.0.0.1", 0))
+                port = sock.getsockname()[1]
+            self.url = f"http://127.0.0.1:{port}"
+            self._process = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+                 "--workers", str(self.workers), "--log-level", "warning"],
+                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            )
+        self.client = httpx.AsyncClient(base_url=self.url, timeout=120,
+                                        limits=httpx.Limits(max_connections=None, max_keepalive_connections=None))
+        await self._wait_until_healthy()
+        return self
+
+    async def _wait_until_healthy(self):
+        deadline = time.monotonic() + SERVER_START_TIMEOUT_SECONDS
+        while time.monotonic() < deadline:
+            if self._process is not None and self._process.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with status {self._process.returncode}")
+            try:
+                if (await self.client.get("/health")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.25)
+        raise RuntimeError(f"Server at {self.url} did not become healthy")
+
+    async def __aexit__(self, *exc):
+        await self.client.aclose()
+        if self._process is not None:
+            self._process.terminate()
+            self._process.wait(timeout=30)
+
+    async def websocket(self, path: str):
+        import websockets  # Installed with uvicorn[standard]
+
+        return await websockets.connect(self.url.replace("http", "ws", 1) + path, max_size=None)
+
+# Scenarios
+
+async def run_http_level(client: httpx.AsyncClient, method: str, path: str, bodies: List[Optional[bytes]],
+                         concurrency: int, duration: float) -> Dict[str, float]:
+    headers = {"Content-Type": "application/json"}
+    latencies: List[float] = []
+    errors = 0
+
+    for body in bodies[:WARMUP_REQUESTS]:
+        await client.request(method, path, content=body, headers=headers)
+
+    async def client_loop(offset: int):
+        nonlocal errors
+        k = offset
+        while time.perf_counter() < deadline:
+            body = bodies[k % len(bodies)]
+            k += concurrency
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, content=body, headers=headers)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            latencies.append(time.perf_counter() - start)
+            errors += failed
+
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(client_loop(i) for i in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+async def run_websocket_level(target, clients: int, duration: float) -> Dict[str, float]:
+    """
+    Connect `clients` delta-protocol dashboards and time frame delivery.
+
+    `fanout_spread` is, per frame, the time between the first and the last
+    client receiving it; `missed_frames` counts versions a client skipped
+    because its send queue overflowed.
+    """
+    received: Dict[int, List[float]] = {}
+    connect_times: List[float] = []
+    missed = 0
+
+    async def dashboard():
+        nonlocal missed
+        start = time.perf_counter()
+        ws = await target.websocket("/monitoring/ws?protocol=delta")
+        connect_times.append(time.perf_counter() - start)
+        last_version = None
+        try:
+            while time.perf_counter() < deadline:
+                try:
+                    message = await asyncio.wait_for(ws.recv(), max(deadline - time.perf_counter(), 0.01))
+                except asyncio.TimeoutError:
+                    break
+                version = json.loads(message)["version"]
+                received.setdefault(version, []).append(time.perf_counter())
+                if last_version is not None and version > last_version + 1:
+                    missed += version - last_version - 1
+                last_version = version
+        finally:
+            await ws.close()
+
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(dashboard() for _ in range(clients)))
+    elapsed = time.perf_counter() - started
+
+    # The first frame is the snapshot sent on connect, so spreads start at the second
+    versions = sorted(received)[1:]
+    spreads = [max(received[v]) - min(received[v]) for v in versions if len(received[v]) == clients]
+    summary = summarize(spreads, 0, elapsed)
+    connect_ms = np.asarray(connect_times) * 1000
+    return {
+        "clients": clients,
+        "frames": len(versions),
+        "messages_per_second": sum(len(received[v]) for v in versions) / elapsed,
+        "missed_frames": missed,
+        "connect_p50_ms": float(np.percentile(connect_ms, 50)),
+        "connect_p99_ms": float(np.percentile(connect_ms, 99)),
+        "fanout_spread_p50_ms": summary.get("p50_ms", 0.0),
+        "fanout_spread_p99_ms": summary.get("p99_ms", 0.0)
+    }
+
+async def run_benchmarks(target, scenarios: List[str], concurrency_levels: List[int], ws_clients: List[int],
+                         duration: float, seed: int) -> Dict[str, Any]:
+    results: Dict[str, Any] = {
+        "generated_at": datetime.now().isoformat(),
+        "target": target.name,
+        "duration_seconds": duration,
+        "host": {"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count()},
+        "scenarios": {}
+    }
+
+    async with target:
+        for name in scenarios:
+            if name in WEBSOCKET_SCENARIOS:
+                from realtime_monitoring.publisher import TICK_SECONDS
+
+                ws_duration = max(duration, 5 * TICK_SECONDS)
+                levels = {}
+                for clients in ws_clients:
+                    levels[str(clients)] = level = await run_websocket_level(target, clients, ws_duration)
+                    print(f"{name:>26} {clients:>5} clients  {level['messages_per_second']:>8.1f} msg/s  "
+                          f"spread p50={level['fanout_spread_p50_ms']:.2f}ms p99={level['fanout_spread_p99_ms']:.2f}ms  "
+                          f"missed={level['missed_frames']}")
+                results["scenarios"][name] = {"levels": levels}
+                continue
+
+            method, path, generator, claim_ms = HTTP_SCENARIOS[name]
+            rng = np.random.default_rng(seed)
+            bodies = [json.dumps(generator(rng)).encode() if generator else None for _ in range(PAYLOAD_POOL_SIZE)]
+            levels = {}
+            for concurrency in concurrency_levels:
+                levels[str(concurrency)] = level = await run_http_level(
+                    target.client, method, path, bodies, concurrency, duration
+                )
+                if not level["requests"]:
+                    continue
+                level["meets_claim"] = level["mean_ms"] <= claim_ms
+                print(f"{name:>26} c={concurrency:<4} {level['requests']:>6} req  {level['errors']:>4} err  "
+                      f"{level['throughput_rps']:>8.1f} rps  p50={level['p50_ms']:>8.2f}  p95={level['p95_ms']:>8.2f}  "
+                      f"p99={level['p99_ms']:>8.2f} ms  {'' if level['meets_claim'] else f'(claim {claim_ms:.0f}ms missed)'}")
+            results["scenarios"][name] = {"method": method, "path": path, "claim_ms": claim_ms, "levels": levels}
+
+    return results
+
+# Baselines
+
+def compare_to_baseline(results: Dict[str, Any], baseline: Dict[str, Any],
+                        tolerance: float = DEFAULT_TOLERANCE) -> List[str]:
+    """Regressions beyond `tolerance` (a fraction) for every level present in both runs"""
+    # metric -> whether higher is better
+    metrics = {"p50_ms": False, "p99_ms": False, "throughput_rps": True,
+               "fanout_spread_p99_ms": False, "messages_per_second": True}
+    regressions = []
+    for name, scenario in results["scenarios"].items():
+        base_levels = baseline.get("scenarios", {}).get(name, {}).get("levels", {})
+        for level, current in scenario["levels"].items():
+            previous = base_levels.get(level)
+            if previous is None:
+                continue
+            for metric, higher_is_better in metrics.items():
+                if metric not in current or not previous.get(metric):
+                    continue
+                change = (current[metric] - previous[metric]) / previous[metric]
+                if (-change if higher_is_better else change) > tolerance:
+                    regressions.append(f"{name} @ {level}: {metric} {previous[metric]:.2f} -> "
+                                       f"{current[metric]:.2f} ({change:+.0%})")
+    return regressions
+
+def _write_json(results: Dict[str, Any], path: str):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(results, f, indent=2)
+    os.replace(tmp_path, path)
+
+def main():
+    scenario_names = list(HTTP_SCENARIOS) + list(WEBSOCKET_SCENARIOS)
+    parser = argparse.ArgumentParser(description="Load-test the API end to end")
+    parser.add_argument("--scenarios", nargs="+", default=scenario_names, choices=scenario_names)
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 8, 32])
+    parser.add_argument("--ws-clients", nargs="+", type=int, default=[10, 100])
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per scenario and level")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--server", action="store_true", help="Benchmark a spawned local uvicorn server")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers with --server")
+    parser.add_argument("--url", default=None, help="Benchmark an already running server")
+    parser.add_argument("--output", default=BENCHMARK_RESULTS_PATH)
+    parser.add_argument("--baseline", default=None, help="Results file to compare against")
+    parser.add_argument("--save-baseline", default=None, help="Also write the results here")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    target = ServerTarget(args.url, args.workers) if args.server or args.url else InProcessTarget()
+    results = asyncio.run(run_benchmarks(target, args.scenarios, args.concurrency, args.ws_clients,
+                                         args.duration, args.seed))
+    _write_json(results, args.output)
+    if args.save_baseline:
+        _write_json(results, args.save_baseline)
+    print(f"Saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("target") != results["target"] or baseline.get("host") != results["host"]:
+            print(f"Note: baseline was measured on {baseline.get('target')} / {baseline.get('host')}, "
+                  f"this run on {results['target']} / {results['host']}")
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+
+if __name__ == "__main__":
+    main()
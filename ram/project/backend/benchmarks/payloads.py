@@ -0,0 +1,114 @@
+"""
+Seeded request bodies shaped like production traffic for each router.
+
+Coordinates fall inside Texas, the area the monitoring regions cover, so
+route distances and travel times are realistic for last-mile delivery.
+"""
+import numpy as np
+from typing import Any, Dict
+
+TEXAS_BOUNDS = ((29.4, 33.2), (-99.5, -95.0))  # (lat range, lon range)
+PRIORITIES = ("low", "medium", "high", "urgent")
+
+def _location(rng: np.random.Generator, center=None, spread_deg: float = 0.25) -> Dict[str, Any]:
+    if center is None:
+        (lat_lo, lat_hi), (lon_lo, lon_hi) = TEXAS_BOUNDS
+        lat, lon = rng.uniform(lat_lo, lat_hi), rng.uniform(lon_lo, lon_hi)
+    else:
+        lat, lon = center[0] + rng.normal(0, spread_deg), center[1] + rng.normal(0, spread_deg)
+    return {"lat": round(float(lat), 6), "lon": round(float(lon), 6), "address": f"{rng.integers(100, 9999)} Main St"}
+
+def forecast_request(rng: np.random.Generator) -> Dict[str, Any]:
+    return {
+        "sku_id": int(rng.integers(10000, 99999)),
+        "store_id": int(rng.integers(1000, 5999)),
+        "horizon": int(rng.choice([7, 14, 28])),
+        "include_confidence": bool(rng.random() < 0.8)
+    }
+
+def batch_forecast_request(rng: np.random.Generator, size: int = 100) -> Dict[str, Any]:
+    return {"requests": [forecast_request(rng) for _ in range(size)]}
+
+def inventory_request(rng: np.random.Generator, num_nodes: int = 50, optimizer: str = "rl") -> Dict[str, Any]:
+    """One network with a mix of overstocked and short nodes, so transfers are worth making"""
+    demand = rng.gamma(2.0, 40.0, num_nodes)
+    cover_days = rng.uniform(0.2, 3.0, num_nodes)
+    return {
+        "nodes": [
+            {
+                "node_id": i + 1,
+                "current_stock": int(demand[i] * cover_days[i] * 7),
+                "forecast_demand": round(float(demand[i]), 2),
+                "lead_time": int(rng.integers(1, 8)),
+                "holding_cost": round(float(rng.uniform(0.1, 0.5)), 2),
+                "stockout_cost": round(float(rng.uniform(5, 20)), 2)
+            }
+            for i in range(num_nodes)
+        ],
+        "planning_horizon": 7,
+        "max_transfer_capacity": 1000,
+        "optimizer": optimizer
+    }
+
+def route_request(rng: np.random.Generator, num_stops: int = 200, num_vehicles: int = 10) -> Dict[str, Any]:
+    """Stops clustered around one metro depot, with morning, afternoon and all-day windows"""
+    (lat_lo, lat_hi), (lon_lo, lon_hi) = TEXAS_BOUNDS
+    depot = (rng.uniform(lat_lo + 1, lat_hi - 1), rng.uniform(lon_lo + 1, lon_hi - 1))
+    windows = ((480, 720), (720, 1020), (480, 1080))
+    deliveries = []
+    for i in range(num_stops):
+        start, end = windows[rng.integers(len(windows))]
+        deliveries.append({
+            "node_id": i + 1,
+            "location": _location(rng, depot),
+            "demand": int(rng.integers(1, 12)),
+            "service_time_minutes": int(rng.integers(3, 15)),
+            "time_window_start": start,
+            "time_window_end": end,
+            "priority": PRIORITIES[rng.choice(4, p=[0.3, 0.5, 0.15, 0.05])]
+        })
+    return {
+        "vehicles": [
+            {
+                "vehicle_id": v + 1,
+                "capacity": int(rng.choice([80, 120, 160])),
+                "start_location": _location(rng, depot, spread_deg=0.02),
+                "max_working_hours": 8,
+                "cost_per_km": 0.5
+            }
+            for v in range(num_vehicles)
+        ],
+        "deliveries": deliveries,
+        "optimization_objective": "minimize_cost",
+        "include_traffic": True,
+        "drone_delivery_enabled": True
+    }
+
+def planning_request(rng: np.random.Generator, num_nodes: int = 20, num_skus: int = 10,
+                     num_vehicles: int = 5, optimizer: str = "solver") -> Dict[str, Any]:
+    """Stores around one metro depot, each stocking every SKU at uneven cover"""
+    route = route_request(rng, num_stops=num_nodes, num_vehicles=num_vehicles)
+    return {
+        "nodes": [
+            {
+                "node_id": stop["node_id"],
+                "store_id": int(rng.integers(1000, 5999)),
+                "location": stop["location"],
+                "lead_time": int(rng.integers(1, 8)),
+                "holding_cost": round(float(rng.uniform(0.1, 0.5)), 2),
+                "stockout_cost": round(float(rng.uniform(5, 20)), 2),
+                "time_window_start": stop["time_window_start"],
+                "time_window_end": stop["time_window_end"]
+            }
+            for stop in route["deliveries"]
+        ],
+        "skus": [
+            {"sku_id": int(rng.integers(10000, 99999)),
+             "current_stock": (rng.uniform(0.2, 3.0, num_nodes) * 7 * 1000).astype(int).tolist()}
+            for _ in range(num_skus)
+        ],
+        "vehicles": [{**vehicle, "capacity": 2000} for vehicle in route["vehicles"]],
+        "planning_horizon": 7,
+        "optimizer": optimizer,
+        "units_per_load": 100
+    }
@@ -0,0 +1,101 @@
+"""
+End-to-end planning latency: three HTTP hops against `/planning/plan`.
+
+The three-hop path is what a client did before the pipeline existed:
+`/forecast/batch` for every SKU-store pair (100 per call), one
+`/inventory/optimize` per SKU fed with the mean daily p50, then one
+`/route/optimize` delivering the summed transfers. Run from the backend
+directory:
+
+    python -m benchmarks.planning --skus 10 --nodes 20 --repeat 5
+    python -m benchmarks.planning --server    # against a spawned uvicorn
+"""
+from collections import defaultdict
+from typing import Any, Dict
+import argparse
+import asyncio
+import json
+import math
+import time
+import numpy as np
+from . import payloads
+from .loadtest import InProcessTarget, ServerTarget
+
+FORECAST_BATCH_LIMIT = 100
+
+async def three_hops(client, plan: Dict[str, Any]) -> float:
+    start = time.perf_counter()
+    pairs = [{"sku_id": sku["sku_id"], "store_id": node["store_id"], "horizon": plan["planning_horizon"],
+              "include_confidence": False}
+             for sku in plan["skus"] for node in plan["nodes"]]
+    forecasts = []
+    for k in range(0, len(pairs), FORECAST_BATCH_LIMIT):
+        response = await client.post("/forecast/batch", json={"requests": pairs[k:k + FORECAST_BATCH_LIMIT]})
+        response.raise_for_status()
+        forecasts.extend(response.json())
+
+    delivered = defaultdict(int)
+    for s, sku in enumerate(plan["skus"]):
+        sku_forecasts = forecasts[s * len(plan["nodes"]):(s + 1) * len(plan["nodes"])]
+        response = await client.post("/inventory/optimize", json={
+            "nodes": [
+                {"node_id": node["node_id"], "current_stock": stock, "forecast_demand": float(np.mean(f["p50"])),
+                 "lead_time": node["lead_time"], "holding_cost": node["holding_cost"],
+                 "stockout_cost": node["stockout_cost"]}
+                for node, stock, f in zip(plan["nodes"], sku["current_stock"], sku_forecasts)
+            ],
+            "planning_horizon": plan["planning_horizon"],
+            "optimizer": plan["optimizer"]
+        })
+        response.raise_for_status()
+        for transfer in response.json()["transfers"]:
+            delivered[transfer["to_node"]] += transfer["quantity"]
+
+    nodes = {node["node_id"]: node for node in plan["nodes"]}
+    response = await client.post("/route/optimize", json={
+        "vehicles": plan["vehicles"],
+        "deliveries": [
+            {"node_id": node_id, "location": nodes[node_id]["location"],
+             "demand": math.ceil(units / plan["units_per_load"]),
+             "time_window_start": nodes[node_id]["time_window_start"],
+             "time_window_end": nodes[node_id]["time_window_end"]}
+            for node_id, units in delivered.items()
+        ]
+    })
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+async def pipeline(client, plan: Dict[str, Any]) -> float:
+    start = time.perf_counter()
+    response = await client.post("/planning/plan", json=plan)
+    response.raise_for_status()
+    summary = json.loads(response.text.splitlines()[-1])
+    if summary["failed"]:
+        raise RuntimeError(f"{summary['failed']} SKUs failed in the pipeline")
+    return time.perf_counter() - start
+
+async def run(args) -> None:
+    rng = np.random.default_rng(args.seed)
+    plans = [payloads.planning_request(rng, args.nodes, args.skus, optimizer=args.optimizer)
+             for _ in range(args.repeat)]
+    target = ServerTarget() if args.server else InProcessTarget()
+    async with target:
+        for name, path in (("three hops", three_hops), ("pipeline", pipeline)):
+            await path(target.client, plans[0])  # Warm up
+            ms = np.array([await path(target.client, plan) for plan in plans]) * 1000
+            print(f"{name:>12}  mean={ms.mean():>8.1f}ms  p50={np.percentile(ms, 50):>8.1f}ms  "
+                  f"max={ms.max():>8.1f}ms  ({args.skus} SKUs x {args.nodes} nodes, {target.name})")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare three-hop planning with the in-process pipeline")
+    parser.add_argument("--skus", type=int, default=10)
+    parser.add_argument("--nodes", type=int, default=20)
+    parser.add_argument("--optimizer", default="solver", choices=["rl", "heuristic", "solver"])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--server", action="store_true", help="Spawn uvicorn instead of calling the app in-process")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Road-network distances: many-to-many matrix speed, and what straight-line
+routing misses on real roads.
+
+A synthetic city (route_optimiser/road_network.py: street grid, arterials,
+a highway and a river with few bridges) is built around a generated route
+instance, or loaded with `--graph`. Two things are measured:
+
+- Matrix queries between `--points` random locations: cold (no cached
+  searches), warm (searches cached, matrix not) and cached (same location
+  set again), checked against scipy's Dijkstra on the uncontracted graph.
+- Routes built on haversine and on road distances, both re-timed on
+  roads: stops reached after their window closes and routes that overrun
+  the shift.
+
+Run from the backend directory:
+
+    python -m benchmarks.road_distances --points 100 300 500 --stops 300
+"""
+from typing import Any, Dict, List
+import argparse
+import time
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+from route_optimiser.construction import RouteState, regret_insertion
+from route_optimiser.distance import HAVERSINE
+from route_optimiser.road_network import RoadNetwork, load_road_network, synthetic_road_network
+from route_optimiser.service import RouteOptimizer
+from .construction import build_request
+
+def matrix_timings(network: RoadNetwork, points: List[int], seed: int) -> List[Dict[str, Any]]:
+    graph = network.graph
+    n = len(graph.node_lats)
+    adjacency = csr_matrix((graph.minutes, (graph.tails, graph.heads)), shape=(n, n))
+    rng = np.random.default_rng(seed)
+    results = []
+    for size in points:
+        nodes = rng.choice(network._snap_nodes, size, replace=False)
+        lats, lons = graph.node_lats[nodes], graph.node_lons[nodes]
+        network._searches[True].clear()
+        network._searches[False].clear()
+        network._matrices.clear()
+        timings = {}
+        for run in ("cold", "warm", "cached"):
+            if run == "warm":
+                network._matrices.clear()
+            start = time.perf_counter()
+            _, minutes = network.matrix(lats, lons, lats, lons)
+            timings[f"{run}_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        start = time.perf_counter()
+        reference = dijkstra(adjacency, indices=nodes)[:, nodes]
+        result = {"points": size, **timings, "dijkstra_ms": round((time.perf_counter() - start) * 1000, 1),
+                  "max_error_minutes": float(np.abs(reference - minutes).max())}
+        results.append(result)
+        print(result, flush=True)
+    return results
+
+def route_feasibility(network: RoadNetwork, stops: int, stops_per_vehicle: int, seed: int) -> List[Dict[str, Any]]:
+    request = build_request(seed, stops, stops_per_vehicle)
+    # Move the instance onto the city
+    depot = np.mean([[v.start_location.lat, v.start_location.lon] for v in request.vehicles], axis=0)
+    shift = np.array([network.graph.node_lats.mean(), network.graph.node_lons.mean()]) - depot
+    for location in [d.location for d in request.deliveries] + [v.start_location for v in request.vehicles]:
+        location.lat, location.lon = location.lat + shift[0], location.lon + shift[1]
+
+    optimizer = RouteOptimizer()
+    deliveries = list(request.deliveries)
+    on_roads = optimizer._routing_problem(request.vehicles, deliveries, request, network)
+    results = []
+    for name, backend in (("haversine", HAVERSINE), ("road", network)):
+        start = time.perf_counter()
+        problem = optimizer._routing_problem(request.vehicles, deliveries, request, backend)
+        planned, unassigned = regret_insertion(problem)
+        elapsed = time.perf_counter() - start
+        late = overtime = 0
+        road_km = 0.0
+        for plan in planned:
+            state = RouteState(on_roads, plan.vehicle, plan.stops)
+            late += int((state.arrivals > on_roads.window_end[plan.stops] + 1e-6).sum())
+            overtime += int(state.return_minute > on_roads.shift_end[plan.vehicle] + 1e-6)
+            road_km += float(state.legs.sum())
+        result = {"stops": stops, "built_on": name, "seconds": round(elapsed, 2),
+                  "served": stops - len(unassigned), "late_on_roads": late, "routes_over_shift_on_roads": overtime,
+                  "road_km": round(road_km, 1)}
+        results.append(result)
+        print(result, flush=True)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--graph", help="Contracted .npz road network; a synthetic city is built otherwise")
+    parser.add_argument("--radius-km", type=float, default=80.0)
+    parser.add_argument("--spacing-km", type=float, default=1.0)
+    parser.add_argument("--points", type=int, nargs="+", default=[100, 300, 500])
+    parser.add_argument("--stops", type=int, default=300)
+    parser.add_argument("--stops-per-vehicle", type=int, default=25)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.graph:
+        network = load_road_network(args.graph)
+    else:
+        network = RoadNetwork(synthetic_road_network(31.5, -97.0, args.radius_km, args.spacing_km, args.seed))
+    print({"nodes": len(network.graph.node_lats), "edges": len(network.graph.tails),
+           "shortcuts": len(network.hierarchy.tails) - len(network.graph.tails),
+           "load_seconds": round(time.perf_counter() - start, 1)}, flush=True)
+    matrix_timings(network, args.points, args.seed)
+    route_feasibility(network, args.stops, args.stops_per_vehicle, args.seed)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Serialization cost of the hot responses, FastAPI's default path against ours.
+
+`validated` is what a handler returning models through `response_model=`
+costs: building the models with validation, re-validating them against the
+response field, `jsonable_encoder` and `json` encoding. `fast` is what the
+handlers do now: `construct` (plain dicts for inventory transfers) and
+orjson. Run from the backend directory:
+
+    python -m benchmarks.serialization --repeat 200
+"""
+import numpy as np
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from typing import Any, Callable, Dict, List
+import argparse
+import time
+from common.serialization import construct, dumps
+from demand_forecast.service import ForecastResponse
+from inventory_optimiser.service import OptimizationResponse, TransferRecommendation
+from route_optimiser.service import RouteOptimizationRequest, RouteOptimizationResponse, RouteOptimizer
+from . import payloads
+
+def _forecast_results(rng: np.random.Generator, size: int = 100, horizon: int = 28) -> List[Dict[str, Any]]:
+    return [{"sku_id": int(rng.integers(10000, 99999)), "store_id": int(rng.integers(1000, 5999)),
+             "horizon": horizon, "p50": rng.normal(1000, 100, horizon), "p90": rng.normal(1200, 100, horizon),
+             "confidence": np.linspace(0.95, 0.7, horizon), "mape": 6.8, "model_version": "TFT-v1.2.0"}
+            for _ in range(size)]
+
+def _transfers(rng: np.random.Generator, count: int = 2000) -> List[Dict[str, Any]]:
+    quantities = rng.integers(1, 500, count)
+    return [{"from_node": int(i), "to_node": int(j), "quantity": int(q), "cost": q * 0.1, "expected_benefit": q * 0.5}
+            for i, j, q in zip(rng.integers(1, 50, count), rng.integers(1, 50, count), quantities.tolist())]
+
+def _run_to_completion(coroutine) -> Any:
+    """Result of a coroutine that never suspends, without event loop overhead"""
+    try:
+        coroutine.send(None)
+    except StopIteration as done:
+        return done.value
+    raise RuntimeError("coroutine suspended")
+
+def build_cases(seed: int) -> Dict[str, Dict[str, Callable[[], Any]]]:
+    """case -> {"validated": produce the model path's output, "fast": produce ours}"""
+    rng = np.random.default_rng(seed)
+    forecasts = _forecast_results(rng)
+    transfers = _transfers(rng)
+    route_request = RouteOptimizationRequest(**payloads.route_request(rng))
+    route_response = RouteOptimizer().optimize_routes(route_request)
+
+    forecast_field = create_response_field("forecast_batch", List[ForecastResponse])
+    inventory_field = create_response_field("inventory", OptimizationResponse)
+    route_field = create_response_field("route", RouteOptimizationResponse)
+
+    def validated(field, build):
+        return lambda: JSONResponse(_run_to_completion(serialize_response(field=field, response_content=build()))).body
+
+    def inventory_model(make, transfer):
+        return lambda: make(OptimizationResponse, transfers=[transfer(t) for t in transfers],
+                            total_expected_savings=1234.5, confidence_score=0.87, model_version="PPO-v2.1.0",
+                            optimization_time_ms=12)
+
+    return {
+        "forecast_batch (100 x 28 days)": {
+            "validated": validated(forecast_field, lambda: [
+                ForecastResponse(**{k: v.tolist() if isinstance(v, np.ndarray) else v for k, v in result.items()})
+                for result in forecasts
+            ]),
+            "fast": lambda: dumps([construct(ForecastResponse, **result) for result in forecasts])
+        },
+        "inventory transfers (2000)": {
+            "validated": validated(inventory_field, inventory_model(lambda model, **values: model(**values),
+                                                                   lambda t: TransferRecommendation(**t))),
+            "fast": lambda: dumps(inventory_model(construct, dict)())
+        },
+        "route response (200 stops, encode only)": {
+            "validated": validated(route_field, lambda: route_response),
+            "fast": lambda: dumps(route_response)
+        }
+    }
+
+def _time_per_call(fn: Callable[[], Any], repeat: int) -> float:
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare response serialization paths")
+    parser.add_argument("--repeat", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for case, paths in build_cases(args.seed).items():
+        validated = _time_per_call(paths["validated"], args.repeat) * 1000
+        fast = _time_per_call(paths["fast"], args.repeat) * 1000
+        print(f"{case:>40}  validated={validated:>8.3f}ms  fast={fast:>8.3f}ms  speedup={validated / fast:>6.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,361 @@
+"""
+Versioned model artifacts and zero-downtime hot reload.
+
+Each model family lives under an S3 prefix with one directory per version
+and a `LATEST` object naming the version to serve:
+
+    s3://walmart-ml/models/tft/LATEST              -> "v1.3.0"
+    s3://walmart-ml/models/tft/v1.3.0/best.ckpt
+
+Prefixes without `LATEST` keep the flat layout (`models/tft/best.ckpt`);
+their version is derived from the primary artifact's ETag, so re-uploading
+the file in place is still picked up.
+
+A `ModelSlot` holds the live version of one model. Reloading loads the new
+version next to the old one, warms it with representative batches and only
+then swaps it in. Requests `lease()` the version that is current when they
+start and finish on it; a retired version is closed after its last lease is
+released. The previous version stays loaded for an instant `rollback()`.
+
+Workers on one host share the local cache. A worker holds a shared lock on
+each version directory it downloads or serves, and pruning only deletes
+versions it can lock exclusively, i.e. ones no worker holds.
+
+Version names become cache directories and S3 keys, so only names matching
+VERSION_PATTERN are accepted.
+"""
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from fastapi.concurrency import run_in_threadpool
+from typing import Any, Callable, Dict, Generic, Iterator, List, Optional, TypeVar
+import asyncio
+import fcntl
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import logging
+import boto3
+
+logger = logging.getLogger(__name__)
+
+MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR", "/tmp/models")
+MODEL_RELOAD_INTERVAL_SECONDS = float(os.getenv("MODEL_RELOAD_INTERVAL_SECONDS", "300"))  # 0 disables the watcher
+
+LATEST_POINTER = "LATEST"
+LEGACY_VERSION_PREFIX = "etag-"  # Versions of flat-layout prefixes
+HOLD_FILENAME = ".hold"  # Share-locked by every worker using a cached version
+VERSION_PATTERN = re.compile(r"^[A-Za-z0-9][\w.\-]*$")
+MAX_REJECTED_VERSIONS = 32  # Most recent failed or rolled-back versions remembered per model
+
+M = TypeVar("M")
+
+class InvalidModelVersion(ValueError):
+    """A version name that is not safe to use as a cache directory or S3 key"""
+
+def validate_version(version: str) -> str:
+    if not VERSION_PATTERN.match(version) or ".." in version:
+        raise InvalidModelVersion(f"Invalid model version '{version}'")
+    return version
+
+class ArtifactStore:
+    """One model family's versioned artifacts in S3, cached locally per version"""
+
+    def __init__(self, bucket: str, prefix: str, primary: str, cache_dir: str = MODEL_CACHE_DIR):
+        self.bucket = bucket
+        self.prefix = prefix.rstrip("/") + "/"
+        self.primary = primary
+        self.cache_dir = os.path.join(cache_dir, self.prefix)
+        self._holds: Dict[str, int] = {}  # Version -> descriptor of its share-locked hold file
+        self._holds_lock = threading.Lock()
+
+    def latest_version(self) -> str:
+        """The version `LATEST` points to, or the flat layout's ETag version"""
+        s3 = boto3.client('s3')
+        try:
+            response = s3.get_object(Bucket=self.bucket, Key=self.prefix + LATEST_POINTER)
+            return response["Body"].read().decode().strip()
+        except s3.exceptions.NoSuchKey:
+            etag = s3.head_object(Bucket=self.bucket, Key=self.prefix + self.primary)["ETag"].strip('"')
+            return LEGACY_VERSION_PREFIX + etag[:12]
+
+    def fetch(self, version: str, filenames: List[str]) -> str:
+        """Download a version's files (once; versions are immutable) and return their local directory"""
+        local_dir = self._hold(version)
+        s3 = None
+        for name in filenames:
+            path = os.path.join(local_dir, name)
+            if os.path.exists(path):
+                continue
+            if s3 is None:
+                s3 = boto3.client('s3')
+            key = self.prefix + name if version.startswith(LEGACY_VERSION_PREFIX) else f"{self.prefix}{version}/{name}"
+            # Workers may download the same file at once: each writes its own part, the last rename wins
+            fd, part = tempfile.mkstemp(dir=local_dir, prefix=name + ".", suffix=".part")
+            os.close(fd)
+            try:
+                s3.download_file(self.bucket, key, part)
+                os.replace(part, path)
+            finally:
+                if os.path.exists(part):
+                    os.remove(part)
+        return local_dir
+
+    def prune(self, keep: List[str]):
+        """Release this worker's hold on versions other than `keep`, and delete those no worker holds"""
+        with self._holds_lock:
+            for version in [v for v in self._holds if v not in keep]:
+                os.close(self._holds.pop(version))  # Closing drops the lock
+        if not os.path.isdir(self.cache_dir):
+            return
+        for version in os.listdir(self.cache_dir):
+            if version in keep:
+                continue
+            version_dir = os.path.join(self.cache_dir, version)
+            try:
+                fd = os.open(os.path.join(version_dir, HOLD_FILENAME), os.O_RDONLY | os.O_CREAT, 0o644)
+            except OSError:
+                continue
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                shutil.rmtree(version_dir, ignore_errors=True)
+            except BlockingIOError:
+                pass  # Another worker is downloading or serving it
+            finally:
+                os.close(fd)
+
+    def _hold(self, version: str) -> str:
+        """A version's cache directory, share-locked so no worker prunes it while this one uses it"""
+        local_dir = os.path.join(self.cache_dir, validate_version(version))
+        if os.path.dirname(os.path.realpath(local_dir)) != os.path.realpath(self.cache_dir):
+            raise InvalidModelVersion(f"Model version '{version}' resolves outside the cache")
+        with self._holds_lock:
+            while version not in self._holds:
+                try:
+                    os.makedirs(local_dir, exist_ok=True)
+                    fd = os.open(os.path.join(local_dir, HOLD_FILENAME), os.O_RDONLY | os.O_CREAT, 0o644)
+                except FileNotFoundError:
+                    continue  # Pruned in between; create it again
+                fcntl.flock(fd, fcntl.LOCK_SH)
+                if os.fstat(fd).st_nlink:
+                    self._holds[version] = fd
+                else:
+                    os.close(fd)  # Pruned while this worker waited for the lock
+        return local_dir
+
+@dataclass
+class _Loaded(Generic[M]):
+    model: M
+    version: Optional[str]  # None for the built-in fallback model
+    loaded_at: float = field(default_factory=time.time)
+    warm_up_ms: float = 0.0
+    leases: int = 0
+    retired: bool = False
+
+class ModelSlot(Generic[M]):
+    """
+    The live version of one model.
+
+    `load(version, strict)` builds a model for a store version (None when the
+    store is unreachable); with `strict=False` it may fall back to a built-in
+    model instead of raising. Models provide `model_version`, `warm_up()`
+    and `close()`.
+    """
+
+    def __init__(self, name: str, store: ArtifactStore, load: Callable[[Optional[str], bool], M]):
+        self.name = name
+        self.store = store
+        self.load = load
+        self._current: Optional[_Loaded[M]] = None
+        self._previous: Optional[_Loaded[M]] = None
+        self._rejected: "OrderedDict[str, None]" = OrderedDict()  # Versions that failed to load or were rolled back
+        self._lock = threading.Lock()  # Guards current, previous and lease counts
+        self._reload_lock = threading.Lock()  # One load or swap at a time
+        self.last_check: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    @contextmanager
+    def lease(self) -> Iterator[M]:
+        """The current model, kept open until the block exits even if a reload swaps it out"""
+        entry = self._acquire()
+        try:
+            yield entry.model
+        finally:
+            self._release(entry)
+
+    def current(self) -> M:
+        """The current model without a lease, for metadata only"""
+        if self._current is None:
+            self.preload()
+        return self._current.model
+
+    def preload(self):
+        """Load and warm the version to serve now, falling back rather than failing"""
+        with self._reload_lock:
+            if self._current is not None:
+                return
+            try:
+                version = self.store.latest_version()
+            except Exception as e:
+                logger.error(f"Failed to resolve latest {self.name} model version: {e}")
+                version = None
+            entry = None
+            if version is not None:
+                try:
+                    entry = _Loaded(self.load(version, True), version)
+                except Exception as e:
+                    self.last_error = f"{version}: {e}"
+                    logger.error(f"Failed to load {self.name} model {version}, serving the fallback: {e}")
+            if entry is None:
+                # Recorded without a version, so the next reload retries the store
+                entry = _Loaded(self.load(None, False), None)
+            try:
+                entry.warm_up_ms = self._warm_up(entry.model)
+            except Exception as e:
+                logger.error(f"{self.name} model warm-up failed: {e}")
+            self._current = entry
+
+    def reload(self, version: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Serve `version`, or the store's latest, if it is not already live.
+
+        Without an explicit version, versions that previously failed or were
+        rolled back are skipped, unless the fallback model is serving.
+        Raises InvalidModelVersion for unsafe version names, and re-raises if
+        the new version fails to load or warm up; the live version keeps
+        serving.
+        """
+        if version is not None:
+            validate_version(version)
+        if self._current is None:
+            self.preload()
+
+        with self._reload_lock:
+            self.last_check = time.time()
+            target = version or self.store.latest_version()
+            fallback = self._current.version is None
+            if target == self._current.version or (version is None and target in self._rejected and not fallback):
+                return self.status()
+
+            previous = self._previous
+            if previous is not None and previous.version == target and not previous.retired:
+                entry = previous
+            else:
+                try:
+                    entry = _Loaded(self.load(target, True), target)
+                    entry.warm_up_ms = self._warm_up(entry.model)
+                except Exception as e:
+                    self._reject(target)
+                    self.last_error = f"{target}: {e}"
+                    logger.error(f"Failed to load {self.name} model {target}: {e}")
+                    raise
+
+            with self._lock:
+                outgoing = self._current
+                retired = self._previous if self._previous is not entry else None
+                self._current, self._previous = entry, outgoing
+            self._rejected.pop(target, None)
+            if retired is not None:
+                self._retire(retired)
+            self._prune()
+            logger.info(f"{self.name} model {outgoing.version} -> {target} (warm-up {entry.warm_up_ms:.0f}ms)")
+            return self.status()
+
+    def rollback(self) -> Dict[str, Any]:
+        """Swap the previous version back in; the rolled-back one is not re-adopted automatically"""
+        with self._reload_lock:
+            with self._lock:
+                if self._previous is None:
+                    raise LookupError(f"No previous {self.name} model version is loaded")
+                outgoing = self._current
+                self._current, self._previous = self._previous, None
+            if outgoing.version is not None:
+                self._reject(outgoing.version)
+            self._retire(outgoing)
+            self._prune()
+            logger.warning(f"{self.name} model rolled back {outgoing.version} -> {self._current.version}")
+            return self.status()
+
+    def status(self) -> Dict[str, Any]:
+        current, previous = self._current, self._previous
+        return {
+            "model": self.name,
+            "model_version": getattr(current.model, "model_version", None) if current else None,
+            "version": current.version if current else None,
+            "loaded_at": current.loaded_at if current else None,
+            "warm_up_ms": round(current.warm_up_ms, 1) if current else None,
+            "in_flight": current.leases if current else 0,
+            "previous_version": previous.version if previous else None,
+            "rejected_versions": sorted(self._rejected),
+            "last_check": self.last_check,
+            "last_error": self.last_error
+        }
+
+    def _reject(self, version: str):
+        self._rejected[version] = None
+        self._rejected.move_to_end(version)
+        while len(self._rejected) > MAX_REJECTED_VERSIONS:
+            self._rejected.popitem(last=False)
+
+    def _warm_up(self, model: M) -> float:
+        start = time.perf_counter()
+        model.warm_up()
+        return (time.perf_counter() - start) * 1000
+
+    def _acquire(self) -> _Loaded[M]:
+        if self._current is None:
+            self.preload()
+        with self._lock:
+            entry = self._current
+            entry.leases += 1
+            return entry
+
+    def _release(self, entry: _Loaded[M]):
+        with self._lock:
+            entry.leases -= 1
+            close = entry.retired and entry.leases == 0
+        if close:
+            self._close(entry)
+
+    def _retire(self, entry: _Loaded[M]):
+        with self._lock:
+            entry.retired = True
+            close = entry.leases == 0
+        if close:
+            self._close(entry)
+
+    def _close(self, entry: _Loaded[M]):
+        try:
+            entry.model.close()
+        except Exception as e:
+            logger.error(f"Failed to close {self.name} model {entry.version}: {e}")
+
+    def _prune(self):
+        self.store.prune([entry.version for entry in (self._current, self._previous) if entry and entry.version])
+
+async def _watch_for_new_versions(slots: List[ModelSlot], interval: float):
+    """Poll the artifact store and hot-swap every model whose `LATEST` moved"""
+    while True:
+        await asyncio.sleep(interval)
+        for slot in slots:
+            try:
+                await run_in_threadpool(slot.reload)
+            except Exception as e:
+                logger.error(f"{slot.name} model reload check failed: {e}")
+
+_watcher: Optional[asyncio.Task] = None
+
+async def start_model_reloader(slots: List[ModelSlot], interval: float = MODEL_RELOAD_INTERVAL_SECONDS):
+    """Load and warm every model before serving, then watch for new versions"""
+    global _watcher
+    for slot in slots:
+        await run_in_threadpool(slot.preload)
+    if interval > 0:
+        _watcher = asyncio.create_task(_watch_for_new_versions(slots, interval))
+
+async def stop_model_reloader():
+    if _watcher is not None:
+        _watcher.cancel()
@@ -0,0 +1,16 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+import threading
+import os
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Get or create the process pool shared by CPU-bound jobs (inventory, planning and route clusters)"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ProcessPoolExecutor(max_workers=os.cpu_count())
+    return _executor
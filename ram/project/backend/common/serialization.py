@@ -0,0 +1,50 @@
+"""
+Response serialization shared by every router.
+
+FastAPI re-validates whatever a handler returns against `response_model`,
+converts it with `jsonable_encoder` and then encodes it with `json`. For
+objects the handler just built from its own numbers, all of that is
+redundant. Handlers instead build models with `construct` (no validation)
+and return `FastJSONResponse`, which FastAPI sends as-is. orjson encodes
+the models field by field and NumPy arrays straight from their buffers, so
+results never go through `ndarray.tolist()`. `response_model=` stays on the
+routes for the OpenAPI schema.
+"""
+from fastapi import Response
+from pydantic import BaseModel
+from typing import Any, Type, TypeVar
+import numpy as np
+import orjson
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return obj.__dict__  # Field values; nested models come back through here
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()  # Only non-contiguous or object arrays that orjson cannot read directly
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Type {type(obj).__name__} is not JSON serializable")
+
+def dumps(content: Any) -> bytes:
+    """Compact JSON for plain data, pydantic models and NumPy values"""
+    return orjson.dumps(content, default=_default, option=_OPTIONS)
+
+def loads(data: bytes) -> Any:
+    return orjson.loads(data)
+
+def construct(model: Type[ModelT], **values: Any) -> ModelT:
+    """A model instance built without validation, for values the service produced itself"""
+    build = getattr(model, "model_construct", None) or model.construct
+    return build(**values)
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
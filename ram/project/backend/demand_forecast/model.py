@@ -1,46 +1,55 @@
 import torch
 import pickle
-import boto3
 from pytorch_forecasting import TemporalFusionTransformer
 from pytorch_forecasting.data import TimeSeriesDataSet
 import pandas as pd
 import numpy as np
 from typing import Dict, Any, Optional
+import os
 import logging
+from common.model_registry import ArtifactStore, ModelSlot
 
 logger = logging.getLogger(__name__)
 
+TFT_STORE = ArtifactStore("walmart-ml", "models/tft/", primary="best.ckpt")
+TFT_ARTIFACTS = ["best.ckpt", "scaler.pkl", "cat_encoders.pkl"]
+WARM_UP_HORIZONS = (7, 14, 28, 90)  # Shapes the endpoints see, up to the maximum horizon
+
 class TFTModel:
-    def __init__(self, model_path: str = "s3://walmart-ml/models/tft/"):
+    def __init__(self, model_path: str = "s3://walmart-ml/models/tft/", version: Optional[str] = None):
         self.model_path = model_path
+        self.version = version
         self.model: Optional[TemporalFusionTransformer] = None
         self.scaler = None
         self.cat_encoders = None
         self.training_data = None
+        self.model_version = "dummy-v1.0.0"
         
-    def load_model(self):
-        """Load pre-trained TFT model from S3"""
+    def load_model(self, strict: bool = False):
+        """Load a pre-trained TFT model version from S3; with `strict`, raise instead of falling back"""
         try:
-            s3 = boto3.client('s3')
+            if self.version is None:
+                raise LookupError("no model version available")
             
-            # Download model checkpoint
-            s3.download_file('walmart-ml', 'models/tft/best.ckpt', '/tmp/best.ckpt')
-            s3.download_file('walmart-ml', 'models/tft/scaler.pkl', '/tmp/scaler.pkl')
-            s3.download_file('walmart-ml', 'models/tft/cat_encoders.pkl', '/tmp/cat_encoders.pkl')
+            # Download this version's checkpoint and preprocessing objects
+            local_dir = TFT_STORE.fetch(self.version, TFT_ARTIFACTS)
             
             # Load model
-            self.model = TemporalFusionTransformer.load_from_checkpoint('/tmp/best.ckpt')
+            self.model = TemporalFusionTransformer.load_from_checkpoint(os.path.join(local_dir, 'best.ckpt'))
             
             # Load preprocessing objects
-            with open('/tmp/scaler.pkl', 'rb') as f:
+            with open(os.path.join(local_dir, 'scaler.pkl'), 'rb') as f:
                 self.scaler = pickle.load(f)
             
-            with open('/tmp/cat_encoders.pkl', 'rb') as f:
+            with open(os.path.join(local_dir, 'cat_encoders.pkl'), 'rb') as f:
                 self.cat_encoders = pickle.load(f)
-                
-            logger.info("TFT model loaded successfully")
+            
+            self.model_version = f"TFT-{self.version}"
+            logger.info(f"TFT model {self.version} loaded successfully")
             
         except Exception as e:
+            if strict:
+                raise
             logger.error(f"Failed to load TFT model: {e}")
             # Fallback to dummy model for demo
             self._create_dummy_model()
@@ -51,51 +60,113 @@ class TFTModel:
         self.model = "dummy"
         self.scaler = "dummy"
         self.cat_encoders = "dummy"
+        self.model_version = "dummy-v1.0.0"
+    
+    def warm_up(self):
+        """Run representative forecasts so the first requests don't pay for lazy initialization"""
+        if self.model == "dummy":
+            return
+        for i, horizon in enumerate(WARM_UP_HORIZONS):
+            self._forecast(sku_id=10000 + i, store_id=1000 + i, horizon=horizon)
+    
+    def close(self):
+        """Nothing to release; the model is freed with its last reference"""
     
     def predict(self, sku_id: int, store_id: int, horizon: int = 14) -> Dict[str, Any]:
-        """Generate demand forecast for SKU-Store combination"""
+        """Generate demand forecast for SKU-Store combination; series are NumPy arrays"""
         if self.model == "dummy":
             return self._dummy_prediction(sku_id, store_id, horizon)
         
         try:
-            # Prepare input data (simplified for demo)
-            # In production, this would fetch historical data and apply preprocessing
-            base_demand = np.random.normal(1000, 200)  # Simulate base demand
-            
-            # Generate forecast with seasonality and trend
-            days = np.arange(horizon)
-            trend = base_demand * (1 + 0.02 * days / 30)  # 2% monthly growth
-            seasonality = 100 * np.sin(2 * np.pi * days / 7)  # Weekly pattern
-            noise = np.random.normal(0, 50, horizon)
-            
-            p50_forecast = trend + seasonality + noise
-            p90_forecast = p50_forecast * 1.2  # 20% higher for p90
-            
-            # Add confidence intervals
-            confidence = np.maximum(0.7, 1 - 0.02 * days)  # Decreasing confidence
-            
-            return {
-                "sku_id": sku_id,
-                "store_id": store_id,
-                "horizon": horizon,
-                "p50": p50_forecast.tolist(),
-                "p90": p90_forecast.tolist(),
-                "confidence": confidence.tolist(),
-                "mape": 6.8,  # Mean Absolute Percentage Error
-                "model_version": "TFT-v1.2.0"
-            }
-            
+            return self._forecast(sku_id, store_id, horizon)
         except Exception as e:
             logger.error(f"Prediction failed: {e}")
             return self._dummy_prediction(sku_id, store_id, horizon)
     
+    def _forecast(self, sku_id: int, store_id: int, horizon: int) -> Dict[str, Any]:
+        """Forecast with the loaded model; raises instead of falling back"""
+        # Prepare input data (simplified for demo)
+        # In production, this would fetch historical data and apply preprocessing
+        base_demand = np.random.normal(1000, 200)  # Simulate base demand
+        
+        # Generate forecast with seasonality and trend
+        days = np.arange(horizon)
+        trend = base_demand * (1 + 0.02 * days / 30)  # 2% monthly growth
+        seasonality = 100 * np.sin(2 * np.pi * days / 7)  # Weekly pattern
+        noise = np.random.normal(0, 50, horizon)
+        
+        p50_forecast = trend + seasonality + noise
+        p90_forecast = p50_forecast * 1.2  # 20% higher for p90
+        
+        # Add confidence intervals
+        confidence = np.maximum(0.7, 1 - 0.02 * days)  # Decreasing confidence
+        
+        return {
+            "sku_id": sku_id,
+            "store_id": store_id,
+            "horizon": horizon,
+            "p50": p50_forecast,
+            "p90": p90_forecast,
+            "confidence": confidence,
+            "mape": 6.8,  # Mean Absolute Percentage Error
+            "model_version": self.model_version
+        }
+    
+    def predict_batch(self, sku_ids: np.ndarray, store_ids: np.ndarray, horizon: int = 14) -> Dict[str, Any]:
+        """
+        Forecast many SKU-Store pairs in one pass.
+        
+        Returns `p50` and `p90` as (pairs, horizon) arrays and `confidence`
+        as a (horizon,) array shared by every pair.
+        """
+        sku_ids = np.asarray(sku_ids)
+        store_ids = np.asarray(store_ids)
+        if self.model == "dummy":
+            return self._dummy_batch(sku_ids, store_ids, horizon)
+        
+        try:
+            return self._forecast_batch(sku_ids, store_ids, horizon)
+        except Exception as e:
+            logger.error(f"Batch prediction failed: {e}")
+            return self._dummy_batch(sku_ids, store_ids, horizon)
+    
+    def _forecast_batch(self, sku_ids: np.ndarray, store_ids: np.ndarray, horizon: int) -> Dict[str, Any]:
+        """`_forecast` vectorized over pairs"""
+        base_demand = np.random.normal(1000, 200, (len(sku_ids), 1))
+        
+        days = np.arange(horizon)
+        trend = base_demand * (1 + 0.02 * days / 30)
+        seasonality = 100 * np.sin(2 * np.pi * days / 7)
+        noise = np.random.normal(0, 50, (len(sku_ids), horizon))
+        
+        p50_forecast = trend + seasonality + noise
+        return {
+            "p50": p50_forecast,
+            "p90": p50_forecast * 1.2,
+            "confidence": np.maximum(0.7, 1 - 0.02 * days),
+            "mape": 6.8,
+            "model_version": self.model_version
+        }
+    
+    def _dummy_batch(self, sku_ids: np.ndarray, store_ids: np.ndarray, horizon: int) -> Dict[str, Any]:
+        """`_dummy_prediction` vectorized over pairs"""
+        base_demand = 800 + (sku_ids % 1000) + (store_ids % 500)
+        p50 = base_demand[:, None] + np.random.normal(0, 100, (len(sku_ids), horizon))
+        return {
+            "p50": p50,
+            "p90": p50 * 1.15,
+            "confidence": np.maximum(0.6, 0.95 - 0.02 * np.arange(horizon)),
+            "mape": 7.2,
+            "model_version": "dummy-v1.0.0"
+        }
+    
     def _dummy_prediction(self, sku_id: int, store_id: int, horizon: int) -> Dict[str, Any]:
         """Fallback dummy prediction"""
         base_demand = 800 + (sku_id % 1000) + (store_id % 500)
         
-        p50 = [base_demand + np.random.normal(0, 100) for _ in range(horizon)]
-        p90 = [x * 1.15 for x in p50]
-        confidence = [max(0.6, 0.95 - 0.02 * i) for i in range(horizon)]
+        p50 = base_demand + np.random.normal(0, 100, horizon)
+        p90 = p50 * 1.15
+        confidence = np.maximum(0.6, 0.95 - 0.02 * np.arange(horizon))
         
         return {
             "sku_id": sku_id,
@@ -108,13 +179,14 @@ class TFTModel:
             "model_version": "dummy-v1.0.0"
         }
 
-# Global model instance
-_tft_model = None
+def load_tft_model(version: Optional[str], strict: bool = False) -> TFTModel:
+    model = TFTModel(version=version)
+    model.load_model(strict)
+    return model
+
+# Live model version, hot-swapped when a new one is published
+tft_models: ModelSlot[TFTModel] = ModelSlot("tft", TFT_STORE, load_tft_model)
 
 def get_tft_model() -> TFTModel:
-    """Get or create TFT model instance"""
-    global _tft_model
-    if _tft_model is None:
-        _tft_model = TFTModel()
-        _tft_model.load_model()
-    return _tft_model
\ No newline at end of file
+    """Current TFT model; prefer `tft_models.lease()` so a reload cannot close it mid-request"""
+    return tft_models.current()
@@ -1,11 +1,15 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
 from typing import List, Optional
 import logging
-from .model import get_tft_model
+from .model import tft_models
+from common.model_registry import InvalidModelVersion
+from common.serialization import FastJSONResponse, construct
+from realtime_monitoring.profiling import ProfiledRoute, span
 
 logger = logging.getLogger(__name__)
-router = APIRouter()
+router = APIRouter(route_class=ProfiledRoute)
 
 class ForecastRequest(BaseModel):
     sku_id: int = Field(..., description="SKU identifier", example=12345)
@@ -36,17 +40,17 @@ async def forecast_demand(request: ForecastRequest):
     future demand with high accuracy (<7% MAPE).
     """
     try:
-        model = get_tft_model()
-        result = model.predict(
-            sku_id=request.sku_id,
-            store_id=request.store_id,
-            horizon=request.horizon
-        )
+        with tft_models.lease() as model, span("inference"):
+            result = model.predict(
+                sku_id=request.sku_id,
+                store_id=request.store_id,
+                horizon=request.horizon
+            )
         
         if not request.include_confidence:
             result.pop("confidence", None)
         
-        return ForecastResponse(**result)
+        return FastJSONResponse(construct(ForecastResponse, **result))
         
     except Exception as e:
         logger.error(f"Forecast failed for SKU {request.sku_id}, Store {request.store_id}: {e}")
@@ -59,22 +63,24 @@ async def batch_forecast(request: BatchForecastRequest):
     Maximum 100 requests per batch for optimal performance.
     """
     try:
-        model = get_tft_model()
         results = []
         
-        for req in request.requests:
-            result = model.predict(
-                sku_id=req.sku_id,
-                store_id=req.store_id,
-                horizon=req.horizon
-            )
-            
-            if not req.include_confidence:
-                result.pop("confidence", None)
+        # One model version for the whole batch, even if a reload lands midway
+        with tft_models.lease() as model:
+            for req in request.requests:
+                with span("inference"):
+                    result = model.predict(
+                        sku_id=req.sku_id,
+                        store_id=req.store_id,
+                        horizon=req.horizon
+                    )
                 
-            results.append(ForecastResponse(**result))
+                if not req.include_confidence:
+                    result.pop("confidence", None)
+                    
+                results.append(construct(ForecastResponse, **result))
         
-        return results
+        return FastJSONResponse(results)
         
     except Exception as e:
         logger.error(f"Batch forecast failed: {e}")
@@ -84,10 +90,10 @@ async def batch_forecast(request: BatchForecastRequest):
 async def model_info():
     """Get information about the current TFT model"""
     try:
-        model = get_tft_model()
+        status = tft_models.status()
         return {
             "model_type": "Temporal Fusion Transformer",
-            "version": "1.2.0",
+            "version": status["model_version"],
             "accuracy_mape": 6.8,
             "training_data_period": "2021-01-01 to 2024-01-01",
             "features": [
@@ -98,8 +104,33 @@ async def model_info():
                 "Economic indicators"
             ],
             "supported_horizons": "1-90 days",
-            "update_frequency": "Daily"
+            "update_frequency": "Daily",
+            "serving": status
         }
     except Exception as e:
         logger.error(f"Failed to get model info: {e}")
-        raise HTTPException(status_code=500, detail="Model information unavailable")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Model information unavailable")
+
+@router.post("/model/reload")
+async def reload_model(version: Optional[str] = None):
+    """
+    Load, warm up and swap in a TFT model version without downtime.
+    
+    Defaults to the version the artifact store's `LATEST` points to.
+    In-flight requests finish on the version they started with.
+    """
+    try:
+        return await run_in_threadpool(tft_models.reload, version)
+    except InvalidModelVersion as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        logger.error(f"TFT model reload failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Model reload failed: {e}")
+
+@router.post("/model/rollback")
+async def rollback_model():
+    """Swap the previously served TFT model version back in"""
+    try:
+        return await run_in_threadpool(tft_models.rollback)
+    except LookupError as e:
+        raise HTTPException(status_code=409, detail=str(e))
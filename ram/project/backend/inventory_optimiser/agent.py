@@ -3,27 +3,109 @@ import gymnasium as gym
 from gymnasium import spaces
 from stable_baselines3 import PPO, DQN
 from stable_baselines3.common.env_util import make_vec_env
-import boto3
 import pickle
-from typing import Dict, List, Tuple, Any
+import os
+import queue
+import threading
+from collections import defaultdict
+from concurrent.futures import Future
+from typing import Dict, List, Tuple, Any, Optional
 import logging
+from common.model_registry import ArtifactStore, ModelSlot
+from realtime_monitoring.profiling import span
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_HOLDING_COST = 0.3  # Midpoint of the holding cost range used in training
+STOCKOUT_PENALTY = 10  # Per-unit stockout penalty used in the environment reward
+
+# Permitted transfer lanes as parallel (source index, destination index) arrays
+Lanes = Tuple[np.ndarray, np.ndarray]
+# Sparse transfers as parallel (source index, destination index, quantity) arrays
+TransferCOO = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+def dense_lanes(num_nodes: int) -> Lanes:
+    """Every off-diagonal node pair, i.e. a fully connected network"""
+    src, dst = np.nonzero(~np.eye(num_nodes, dtype=bool))
+    return src, dst
+
+def build_observation(stock_levels: np.ndarray, forecasts: np.ndarray, lead_times: np.ndarray,
+                      holding_costs: np.ndarray, max_stock: int = 10000) -> np.ndarray:
+    """
+    Build a normalized policy observation from raw node state.
+    
+    Pure function of its inputs so it can be called concurrently without
+    touching any shared environment.
+    """
+    stock_norm = np.asarray(stock_levels, dtype=np.float32) / max_stock
+    forecast_norm = np.asarray(forecasts, dtype=np.float32) / 2000  # Normalize forecasts
+    lead_norm = np.asarray(lead_times, dtype=np.float32) / 7
+    cost_norm = np.asarray(holding_costs, dtype=np.float32)
+    
+    return np.concatenate([stock_norm, forecast_norm, lead_norm, cost_norm])
+
+def decode_action(action: np.ndarray, lanes: Optional[Lanes] = None) -> TransferCOO:
+    """
+    Convert normalized action to sparse transfer quantities.
+    
+    Dense policies emit a node x node matrix, which is read only at the
+    permitted lanes; lane policies emit one value per lane.
+    """
+    action = np.asarray(action)
+    if lanes is None:
+        lanes = dense_lanes(action.shape[0])  # No self-transfers
+    src, dst = lanes
+    
+    lane_action = action[src, dst] if action.ndim == 2 else action
+    # Convert to positive transfers only
+    quantities = np.maximum(0, lane_action) * 500  # Scale to reasonable transfer sizes
+    moved = quantities > 0
+    return src[moved], dst[moved], quantities[moved]
+
+def heuristic_prediction(current_stock: List[int], forecasts: List[float],
+                         lanes: Optional[Lanes] = None) -> Dict[str, Any]:
+    """
+    Rule-based transfers from high-stock to high-demand nodes, evaluated once per lane.
+    
+    Needs no trained policy, so it can run in worker processes without loading the agent.
+    """
+    if lanes is None:
+        lanes = dense_lanes(len(current_stock))
+    src, dst = lanes
+    stock = np.asarray(current_stock, dtype=float)
+    demand = np.asarray(forecasts, dtype=float)
+    
+    # Simple heuristic: transfer from high stock to low stock nodes
+    stock_diff = stock[src] - stock[dst]
+    forecast_diff = demand[dst] - demand[src]
+    moved = (stock_diff > 200) & (forecast_diff > 100)
+    quantities = np.minimum(stock_diff[moved] * 0.2, 300)
+    
+    expected_savings = np.sum(quantities) * 0.5
+    
+    return {
+        "transfer_coo": (src[moved], dst[moved], quantities),
+        "expected_savings": float(expected_savings),
+        "confidence": 0.75,
+        "model_version": "dummy-v1.0.0"
+    }
+
 class SupplyChainEnv(gym.Env):
     """
     Multi-echelon inventory optimization environment for reinforcement learning.
     
     State: [current_stock, forecast_demand, lead_times, holding_costs, stockout_costs]
-    Action: Transfer quantities between nodes
+    Action: Transfer quantities between nodes, one per permitted lane when
+            `lanes` is given, otherwise a dense node x node matrix
     Reward: -(stockout_penalty + holding_costs + transfer_costs)
     """
     
-    def __init__(self, num_nodes: int = 10, max_stock: int = 10000):
+    def __init__(self, num_nodes: int = 10, max_stock: int = 10000, lanes: Optional[Lanes] = None):
         super().__init__()
         
         self.num_nodes = num_nodes
         self.max_stock = max_stock
+        self.lanes = lanes
         self.current_step = 0
         self.max_steps = 30  # 30-day planning horizon
         
@@ -34,8 +116,9 @@ class SupplyChainEnv(gym.Env):
         )
         
         # Action space: transfer quantities (normalized)
+        action_shape = (len(lanes[0]),) if lanes is not None else (num_nodes, num_nodes)
         self.action_space = spaces.Box(
-            low=-1, high=1, shape=(num_nodes, num_nodes), dtype=np.float32
+            low=-1, high=1, shape=action_shape, dtype=np.float32
         )
         
         self.reset()
@@ -43,11 +126,11 @@ class SupplyChainEnv(gym.Env):
     def reset(self, seed=None, options=None):
         super().reset(seed=seed)
         
-        # Initialize random state
-        self.stock_levels = np.random.uniform(0.3, 0.8, self.num_nodes) * self.max_stock
-        self.forecasts = np.random.uniform(100, 1000, self.num_nodes)
-        self.lead_times = np.random.randint(1, 7, self.num_nodes)
-        self.holding_costs = np.random.uniform(0.1, 0.5, self.num_nodes)
+        # Initialize random state from the env's seeded generator so episodes are reproducible
+        self.stock_levels = self.np_random.uniform(0.3, 0.8, self.num_nodes) * self.max_stock
+        self.forecasts = self.np_random.uniform(100, 1000, self.num_nodes)
+        self.lead_times = self.np_random.integers(1, 7, self.num_nodes)
+        self.holding_costs = self.np_random.uniform(0.1, 0.5, self.num_nodes)
         
         self.current_step = 0
         
@@ -55,27 +138,26 @@ class SupplyChainEnv(gym.Env):
     
     def _get_observation(self):
         """Normalize and concatenate state variables"""
-        stock_norm = self.stock_levels / self.max_stock
-        forecast_norm = self.forecasts / 2000  # Normalize forecasts
-        lead_norm = self.lead_times / 7
-        cost_norm = self.holding_costs
-        
-        return np.concatenate([stock_norm, forecast_norm, lead_norm, cost_norm])
+        return build_observation(self.stock_levels, self.forecasts, self.lead_times,
+                                 self.holding_costs, self.max_stock)
     
     def step(self, action):
         # Decode action to transfer quantities
-        transfers = self._decode_action(action)
+        return self.step_transfers(self._decode_action(action))
+    
+    def step_transfers(self, transfers: TransferCOO):
+        """Advance one day applying already-decoded sparse transfers"""
+        rows, cols, quantities = transfers
         
-        # Apply transfers
-        for i in range(self.num_nodes):
-            for j in range(self.num_nodes):
-                if i != j and transfers[i][j] > 0:
-                    transfer_qty = min(transfers[i][j], self.stock_levels[i])
-                    self.stock_levels[i] -= transfer_qty
-                    self.stock_levels[j] += transfer_qty
+        # Apply transfers, scaling each source's shipments down to the stock it holds
+        outgoing = np.bincount(rows, weights=quantities, minlength=self.num_nodes)
+        scale = np.minimum(1, self.stock_levels / np.maximum(outgoing, 1e-9))
+        shipped = quantities * scale[rows]
+        self.stock_levels -= np.bincount(rows, weights=shipped, minlength=self.num_nodes)
+        self.stock_levels += np.bincount(cols, weights=shipped, minlength=self.num_nodes)
         
         # Simulate demand realization
-        actual_demand = np.random.normal(self.forecasts, self.forecasts * 0.2)
+        actual_demand = self.np_random.normal(self.forecasts, self.forecasts * 0.2)
         actual_demand = np.maximum(0, actual_demand)
         
         # Calculate stockouts and update inventory
@@ -83,44 +165,126 @@ class SupplyChainEnv(gym.Env):
         self.stock_levels = np.maximum(0, self.stock_levels - actual_demand)
         
         # Calculate reward
-        stockout_penalty = np.sum(stockouts * 10)  # High penalty for stockouts
+        stockout_penalty = np.sum(stockouts * STOCKOUT_PENALTY)  # High penalty for stockouts
         holding_cost = np.sum(self.stock_levels * self.holding_costs)
-        transfer_cost = np.sum(np.abs(transfers)) * 0.1
+        transfer_cost = np.sum(shipped) * 0.1
         
         reward = -(stockout_penalty + holding_cost + transfer_cost)
         
         # Update for next step
         self.current_step += 1
-        self.forecasts = np.random.uniform(100, 1000, self.num_nodes)  # New forecasts
+        self.forecasts = self.np_random.uniform(100, 1000, self.num_nodes)  # New forecasts
         
         terminated = self.current_step >= self.max_steps
         truncated = False
         
-        return self._get_observation(), reward, terminated, truncated, {}
+        info = {
+            "stockout_cost": float(stockout_penalty),
+            "holding_cost": float(holding_cost),
+            "transfer_cost": float(transfer_cost),
+            "stockout_units": float(np.sum(stockouts)),
+            "demand_units": float(np.sum(actual_demand))
+        }
+        
+        return self._get_observation(), reward, terminated, truncated, info
     
     def _decode_action(self, action):
-        """Convert normalized action to transfer quantities"""
-        # Convert to positive transfers only
-        transfers = np.maximum(0, action) * 500  # Scale to reasonable transfer sizes
-        np.fill_diagonal(transfers, 0)  # No self-transfers
-        return transfers
+        """Convert normalized action to sparse transfer quantities"""
+        return decode_action(action, self.lanes)
+
+class BatchedPolicy:
+    """
+    Coalesces concurrent policy calls into batched forward passes.
+    
+    Callers block on `predict` while a single worker thread drains every
+    pending observation, groups them by shape (node count) and runs one
+    `policy.predict` per group. Under low load each call runs alone; under
+    high load requests that arrive while a pass is in flight share the next one.
+    """
+    
+    def __init__(self, policy, max_batch_size: int = 256, max_wait_ms: float = 0.0):
+        self.policy = policy
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue: "queue.Queue[Tuple[np.ndarray, Future]]" = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="policy-batcher", daemon=True)
+        self._worker.start()
+    
+    def predict(self, obs: np.ndarray) -> np.ndarray:
+        """Return the deterministic action for a single observation"""
+        future: Future = Future()
+        self._queue.put((obs, future))
+        return future.result()
+    
+    def close(self):
+        """Stop the worker once the calls already queued are served"""
+        self._queue.put(None)
+    
+    def _collect_batch(self) -> List[Tuple[np.ndarray, Future]]:
+        batch = [self._queue.get()]
+        while len(batch) < self.max_batch_size and batch[-1] is not None:
+            try:
+                if self.max_wait > 0:
+                    batch.append(self._queue.get(timeout=self.max_wait))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+    
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            stop = batch[-1] is None
+            if stop:
+                batch.pop()
+            
+            groups: Dict[Tuple[int, ...], List[Tuple[np.ndarray, Future]]] = defaultdict(list)
+            for obs, future in batch:
+                groups[obs.shape].append((obs, future))
+            
+            for items in groups.values():
+                try:
+                    actions, _ = self.policy.predict(
+                        np.stack([obs for obs, _ in items]), deterministic=True
+                    )
+                    for (_, future), action in zip(items, actions):
+                        future.set_result(action)
+                except Exception as e:
+                    for _, future in items:
+                        future.set_exception(e)
+            
+            if stop:
+                return
+
+RL_STORE = ArtifactStore("walmart-ml", "models/rl/", primary="ppo_agent.zip")
+WARM_UP_BATCH_SIZES = (1, 8, 64)  # Single requests and the batches BatchedPolicy forms under load
 
 class RLInventoryAgent:
-    def __init__(self, model_path: str = "s3://walmart-ml/models/rl/"):
+    def __init__(self, model_path: str = "s3://walmart-ml/models/rl/", version: Optional[str] = None):
         self.model_path = model_path
+        self.version = version
         self.agent = None
-        self.env = SupplyChainEnv()
+        self.batcher: Optional[BatchedPolicy] = None
+        self.max_stock = SupplyChainEnv().max_stock
+        self.model_version = "dummy-v1.0.0"
         
-    def load_agent(self):
-        """Load pre-trained RL agent from S3"""
+    def load_agent(self, strict: bool = False):
+        """Load a pre-trained RL agent version from S3; with `strict`, raise instead of falling back"""
         try:
-            s3 = boto3.client('s3')
-            s3.download_file('walmart-ml', 'models/rl/ppo_agent.zip', '/tmp/ppo_agent.zip')
+            if self.version is None:
+                raise LookupError("no agent version available")
+            
+            local_dir = RL_STORE.fetch(self.version, ["ppo_agent.zip"])
             
-            self.agent = PPO.load('/tmp/ppo_agent.zip')
-            logger.info("RL agent loaded successfully")
+            self.agent = PPO.load(os.path.join(local_dir, 'ppo_agent.zip'))
+            self.batcher = BatchedPolicy(self.agent)
+            self.model_version = f"PPO-{self.version}"
+            logger.info(f"RL agent {self.version} loaded successfully")
             
         except Exception as e:
+            if strict:
+                raise
             logger.error(f"Failed to load RL agent: {e}")
             self._create_dummy_agent()
     
@@ -128,78 +292,100 @@ class RLInventoryAgent:
         """Create dummy agent for demo"""
         logger.warning("Using dummy agent for demonstration")
         self.agent = "dummy"
+        self.model_version = "dummy-v1.0.0"
+    
+    def warm_up(self):
+        """
+        Run representative observation batches through the policy.
+        
+        Observations come from the training environment's state distribution
+        at the policy's node count; one goes through the batcher to start it.
+        Raises if the policy's actions do not decode into transfers.
+        """
+        if self.agent == "dummy":
+            return
+        
+        num_nodes = self.agent.observation_space.shape[0] // 4
+        env = SupplyChainEnv(num_nodes=num_nodes, max_stock=self.max_stock)
+        observations = []
+        for seed in range(max(WARM_UP_BATCH_SIZES)):
+            obs, _ = env.reset(seed=seed)
+            observations.append(obs)
+        
+        for batch_size in WARM_UP_BATCH_SIZES:
+            actions, _ = self.agent.predict(np.stack(observations[:batch_size]), deterministic=True)
+            for action in actions:
+                decode_action(action)
+        decode_action(self.batcher.predict(observations[0]))
+    
+    def close(self):
+        """Stop the batcher thread; called once no request holds this version"""
+        if self.batcher is not None:
+            self.batcher.close()
     
     def predict_transfers(self, current_stock: List[int], forecasts: List[float], 
-                         lead_times: List[int]) -> Dict[str, Any]:
-        """Predict optimal inventory transfers"""
+                         lead_times: List[int],
+                         holding_costs: Optional[List[float]] = None,
+                         lanes: Optional[Lanes] = None) -> Dict[str, Any]:
+        """
+        Predict optimal inventory transfers.
+        
+        Safe to call from many threads at once: the observation is built from
+        the arguments only and concurrent calls are batched by `BatchedPolicy`.
+        """
         
         if self.agent == "dummy":
-            return self._dummy_prediction(current_stock, forecasts, lead_times)
+            return self._dummy_prediction(current_stock, forecasts, lead_times, lanes)
         
         try:
             # Prepare state
             num_nodes = len(current_stock)
-            self.env.num_nodes = num_nodes
-            self.env.stock_levels = np.array(current_stock, dtype=float)
-            self.env.forecasts = np.array(forecasts, dtype=float)
-            self.env.lead_times = np.array(lead_times, dtype=int)
-            self.env.holding_costs = np.random.uniform(0.1, 0.5, num_nodes)
+            if holding_costs is None:
+                holding_costs = np.full(num_nodes, DEFAULT_HOLDING_COST)
             
-            obs = self.env._get_observation()
+            obs = build_observation(current_stock, forecasts, lead_times,
+                                    holding_costs, self.max_stock)
+            
+            expected_shape = getattr(self.agent.observation_space, "shape", obs.shape)
+            if obs.shape != tuple(expected_shape):
+                logger.warning(f"Policy expects observation {expected_shape}, got {obs.shape}; "
+                               f"using heuristic")
+                return self._dummy_prediction(current_stock, forecasts, lead_times, lanes)
             
             # Get action from agent
-            action, _ = self.agent.predict(obs, deterministic=True)
-            transfers = self.env._decode_action(action)
+            with span("inference"):
+                action = self.batcher.predict(obs)
+            rows, cols, quantities = decode_action(action, lanes)
             
             # Calculate expected savings
-            total_transfer_cost = np.sum(transfers) * 0.1
+            total_transfer_cost = np.sum(quantities) * 0.1
             expected_stockout_reduction = np.sum(forecasts) * 0.15  # 15% reduction
             expected_savings = expected_stockout_reduction - total_transfer_cost
             
             return {
-                "transfers": transfers.tolist(),
+                "transfer_coo": (rows, cols, quantities),
                 "expected_savings": float(expected_savings),
                 "confidence": 0.87,
-                "model_version": "PPO-v2.1.0"
+                "model_version": self.model_version
             }
             
         except Exception as e:
             logger.error(f"Transfer prediction failed: {e}")
-            return self._dummy_prediction(current_stock, forecasts, lead_times)
+            return self._dummy_prediction(current_stock, forecasts, lead_times, lanes)
     
     def _dummy_prediction(self, current_stock: List[int], forecasts: List[float], 
-                         lead_times: List[int]) -> Dict[str, Any]:
+                         lead_times: List[int], lanes: Optional[Lanes] = None) -> Dict[str, Any]:
         """Fallback dummy prediction"""
-        num_nodes = len(current_stock)
-        
-        # Simple heuristic: transfer from high stock to low stock nodes
-        transfers = np.zeros((num_nodes, num_nodes))
-        
-        for i in range(num_nodes):
-            for j in range(num_nodes):
-                if i != j:
-                    stock_diff = current_stock[i] - current_stock[j]
-                    forecast_diff = forecasts[j] - forecasts[i]
-                    
-                    if stock_diff > 200 and forecast_diff > 100:
-                        transfers[i][j] = min(stock_diff * 0.2, 300)
-        
-        expected_savings = np.sum(transfers) * 0.5
-        
-        return {
-            "transfers": transfers.tolist(),
-            "expected_savings": float(expected_savings),
-            "confidence": 0.75,
-            "model_version": "dummy-v1.0.0"
-        }
+        return heuristic_prediction(current_stock, forecasts, lanes)
+
+def load_rl_agent(version: Optional[str], strict: bool = False) -> RLInventoryAgent:
+    agent = RLInventoryAgent(version=version)
+    agent.load_agent(strict)
+    return agent
 
-# Global agent instance
-_rl_agent = None
+# Live agent version, hot-swapped when a new one is published
+rl_agents: ModelSlot[RLInventoryAgent] = ModelSlot("rl", RL_STORE, load_rl_agent)
 
 def get_rl_agent() -> RLInventoryAgent:
-    """Get or create RL agent instance"""
-    global _rl_agent
-    if _rl_agent is None:
-        _rl_agent = RLInventoryAgent()
-        _rl_agent.load_agent()
-    return _rl_agent
\ No newline at end of file
+    """Current RL agent; prefer `rl_agents.lease()` so a reload cannot close it mid-request"""
+    return rl_agents.current()
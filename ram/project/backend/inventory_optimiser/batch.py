@@ -0,0 +1,151 @@
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Set, Tuple, AsyncIterator
+import asyncio
+import itertools
+import os
+import time
+import logging
+from .agent import Lanes
+from .optimizers import run_optimizer
+from common.pool import get_process_pool
+from common.serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+RL_INFERENCE_THREADS = 32  # Concurrent RL callers feeding one BatchedPolicy
+MAX_CHUNK_SIZE = 500
+POOL_CHUNKS_PER_CORE = 2  # Chunks in flight per core on the shared process pool
+
+# (sku_id, current_stock, forecast_demand), both lists aligned with the shared nodes
+SkuInput = Tuple[int, List[int], List[float]]
+
+_rl_executor: Optional[ThreadPoolExecutor] = None
+
+def _get_rl_executor() -> ThreadPoolExecutor:
+    global _rl_executor
+    if _rl_executor is None:
+        _rl_executor = ThreadPoolExecutor(max_workers=RL_INFERENCE_THREADS, thread_name_prefix="rl-batch")
+    return _rl_executor
+
+def optimize_sku_chunk(optimizer: str, node_ids: List[int], lead_times: List[int],
+                       holding_costs: List[float], stockout_costs: List[float], skus: List[SkuInput],
+                       planning_horizon: int, max_transfer_capacity: int, solver_time_limit_ms: int,
+                       lanes: Optional[Lanes]) -> List[Dict[str, Any]]:
+    """
+    Optimize a chunk of SKUs that share one node network.
+
+    Each SKU is timed and isolated: a failure produces an error record for
+    that SKU and the rest of the chunk carries on.
+    """
+    num_nodes = len(node_ids)
+    results = []
+
+    for sku_id, current_stock, forecasts in skus:
+        start_time = time.perf_counter()
+        try:
+            if len(current_stock) != num_nodes or len(forecasts) != num_nodes:
+                raise ValueError(f"expected {num_nodes} stock and forecast values, "
+                                 f"got {len(current_stock)} and {len(forecasts)}")
+
+            result = run_optimizer(
+                optimizer, current_stock, forecasts, lead_times, holding_costs, stockout_costs,
+                planning_horizon, max_transfer_capacity, solver_time_limit_ms, lanes
+            )
+            rows, cols, quantities = result["transfer_coo"]
+            quantities = np.asarray(quantities).astype(np.int64)
+            moved = quantities > 0
+
+            results.append({
+                "sku_id": sku_id,
+                "status": "ok",
+                "transfers": [
+                    {"from_node": node_ids[i], "to_node": node_ids[j], "quantity": q}
+                    for i, j, q in zip(rows[moved].tolist(), cols[moved].tolist(), quantities[moved].tolist())
+                ],
+                "expected_savings": result["expected_savings"],
+                "model_version": result["model_version"],
+                "optimization_time_ms": (time.perf_counter() - start_time) * 1000
+            })
+        except Exception as e:
+            results.append({
+                "sku_id": sku_id,
+                "status": "error",
+                "error": str(e),
+                "optimization_time_ms": (time.perf_counter() - start_time) * 1000
+            })
+
+    return results
+
+def default_chunk_size(num_skus: int, optimizer: str) -> int:
+    """Small chunks for RL so many threads feed the policy batcher, ~4 chunks per core otherwise"""
+    if optimizer == "rl":
+        return max(1, min(MAX_CHUNK_SIZE, num_skus // RL_INFERENCE_THREADS))
+    return max(1, min(MAX_CHUNK_SIZE, num_skus // ((os.cpu_count() or 1) * 4)))
+
+def max_chunks_in_flight(optimizer: str) -> int:
+    """Enough chunks to keep the executor busy without queueing the whole batch on the shared pool"""
+    if optimizer == "rl":
+        return RL_INFERENCE_THREADS
+    return (os.cpu_count() or 1) * POOL_CHUNKS_PER_CORE
+
+async def stream_batch_optimization(optimizer: str, node_ids: List[int], lead_times: List[int],
+                                    holding_costs: List[float], stockout_costs: List[float],
+                                    skus: List[SkuInput], planning_horizon: int, max_transfer_capacity: int,
+                                    solver_time_limit_ms: int, lanes: Optional[Lanes],
+                                    chunk_size: Optional[int] = None) -> AsyncIterator[bytes]:
+    """
+    Optimize many SKUs and yield one NDJSON line per SKU as chunks complete.
+
+    `heuristic` and `solver` chunks run on the shared process pool; `rl` chunks
+    run on threads so concurrent SKUs share batched policy forward passes.
+    At most `max_chunks_in_flight` chunks are submitted at a time, and the
+    rest are dropped if the client goes away. A final summary line reports
+    counts and wall time.
+    """
+    start_time = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    executor = _get_rl_executor() if optimizer == "rl" else get_process_pool()
+    chunk_size = chunk_size or default_chunk_size(len(skus), optimizer)
+    chunks = [skus[k:k + chunk_size] for k in range(0, len(skus), chunk_size)]
+
+    async def run_chunk(chunk: List[SkuInput]) -> List[Dict[str, Any]]:
+        try:
+            return await loop.run_in_executor(
+                executor, optimize_sku_chunk, optimizer, node_ids, lead_times, holding_costs,
+                stockout_costs, chunk, planning_horizon, max_transfer_capacity, solver_time_limit_ms, lanes
+            )
+        except Exception as e:
+            logger.error(f"Batch chunk of {len(chunk)} SKUs failed: {e}")
+            return [{"sku_id": sku_id, "status": "error", "error": str(e)} for sku_id, _, _ in chunk]
+
+    succeeded = failed = 0
+    queued = iter(chunks)
+    in_flight: Set[asyncio.Task] = {
+        asyncio.create_task(run_chunk(chunk)) for chunk in itertools.islice(queued, max_chunks_in_flight(optimizer))
+    }
+    try:
+        while in_flight:
+            done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            in_flight.update(asyncio.create_task(run_chunk(chunk)) for chunk in itertools.islice(queued, len(done)))
+            for task in done:
+                for result in task.result():
+                    if result["status"] == "ok":
+                        succeeded += 1
+                    else:
+                        failed += 1
+                    yield dumps(result) + b"\n"
+    finally:
+        # Client went away mid-stream: cancel chunks still queued on the executor
+        for task in in_flight:
+            task.cancel()
+        await asyncio.gather(*in_flight, return_exceptions=True)
+
+    yield dumps({
+        "summary": True,
+        "skus": len(skus),
+        "succeeded": succeeded,
+        "failed": failed,
+        "chunks": len(chunks),
+        "total_time_ms": (time.perf_counter() - start_time) * 1000
+    }) + b"\n"
@@ -0,0 +1,203 @@
+"""
+Reproducible evaluation of inventory transfer optimizers on SupplyChainEnv.
+
+Every policy is rolled through the same seeded episodes, so cost differences
+come from the policy and not from the scenarios. Run from the backend directory:
+
+    python -m inventory_optimiser.evaluation --episodes 32 --policies rl heuristic solver
+
+Results are written to EVALUATION_RESULTS_PATH, where `/inventory/metrics`
+picks them up.
+"""
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+import argparse
+import json
+import os
+import time
+import logging
+from .agent import SupplyChainEnv, STOCKOUT_PENALTY
+from .optimizers import run_optimizer, OPTIMIZERS
+
+logger = logging.getLogger(__name__)
+
+EVALUATION_RESULTS_PATH = os.getenv("EVALUATION_RESULTS_PATH", "/tmp/inventory_evaluation.json")
+BASELINE_POLICY = "none"  # No transfers; the reference for cost reductions
+COST_COMPONENTS = ("stockout_cost", "holding_cost", "transfer_cost")
+
+def run_episode(policy: str, seed: int, num_nodes: int = 10, planning_horizon: int = 7,
+                max_transfer_capacity: int = 500) -> Dict[str, Any]:
+    """Roll one seeded episode and record cost components and per-decision latency"""
+    env = SupplyChainEnv(num_nodes=num_nodes)
+    env.reset(seed=seed)
+    stockout_costs = np.full(num_nodes, STOCKOUT_PENALTY, dtype=float)
+    no_transfers = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0))
+
+    totals: Dict[str, float] = defaultdict(float)
+    latencies_ms: List[float] = []
+    model_versions = set()
+    env_seconds = 0.0
+    steps = 0
+
+    terminated = False
+    while not terminated:
+        if policy == BASELINE_POLICY:
+            transfers = no_transfers
+        else:
+            start_time = time.perf_counter()
+            result = run_optimizer(
+                policy, env.stock_levels, env.forecasts, env.lead_times, env.holding_costs,
+                stockout_costs, planning_horizon, max_transfer_capacity
+            )
+            latencies_ms.append((time.perf_counter() - start_time) * 1000)
+            model_versions.add(result["model_version"])
+            transfers = result["transfer_coo"]
+
+        start_time = time.perf_counter()
+        _, _, terminated, _, info = env.step_transfers(tuple(np.asarray(a) for a in transfers))
+        env_seconds += time.perf_counter() - start_time
+        steps += 1
+
+        for key, value in info.items():
+            totals[key] += value
+
+    return {
+        "policy": policy,
+        "seed": seed,
+        "totals": dict(totals),
+        "latencies_ms": latencies_ms,
+        "model_versions": sorted(model_versions),
+        "env_seconds": env_seconds,
+        "steps": steps
+    }
+
+def _summarize(episodes: List[Dict[str, Any]]) -> Dict[str, Any]:
+    episode_cost = np.array([sum(ep["totals"][c] for c in COST_COMPONENTS) for ep in episodes])
+    stockout_units = sum(ep["totals"]["stockout_units"] for ep in episodes)
+    demand_units = sum(ep["totals"]["demand_units"] for ep in episodes)
+    latencies = np.concatenate([ep["latencies_ms"] for ep in episodes])
+    env_seconds = sum(ep["env_seconds"] for ep in episodes)
+    steps = sum(ep["steps"] for ep in episodes)
+
+    summary = {
+        "episodes": len(episodes),
+        "mean_episode_cost": float(episode_cost.mean()),
+        "std_episode_cost": float(episode_cost.std()),
+        "cost_components": {
+            c: float(np.mean([ep["totals"][c] for ep in episodes])) for c in COST_COMPONENTS
+        },
+        "stockout_rate": stockout_units / max(demand_units, 1e-9),
+        "env_steps_per_second": steps / max(env_seconds, 1e-9),
+        "model_versions": sorted({v for ep in episodes for v in ep["model_versions"]})
+    }
+    if len(latencies):
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        summary["decision_latency_ms"] = {
+            "mean": float(latencies.mean()), "p50": float(p50), "p95": float(p95), "p99": float(p99)
+        }
+    return summary
+
+def evaluate_policies(policies: List[str], num_episodes: int = 32, base_seed: int = 0,
+                      num_nodes: int = 10, planning_horizon: int = 7,
+                      max_workers: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Evaluate each policy on the same seeded scenario set, episodes in parallel.
+
+    The no-transfer baseline is always included so every policy gets a
+    cost and stockout reduction relative to doing nothing.
+    """
+    policies = [BASELINE_POLICY] + [p for p in policies if p != BASELINE_POLICY]
+    seeds = [base_seed + k for k in range(num_episodes)]
+    tasks = [(policy, seed) for policy in policies for seed in seeds]
+
+    start_time = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(run_episode, policy, seed, num_nodes, planning_horizon)
+            for policy, seed in tasks
+        ]
+        episodes = [future.result() for future in futures]
+
+    by_policy: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for episode in episodes:
+        by_policy[episode["policy"]].append(episode)
+
+    results = {policy: _summarize(by_policy[policy]) for policy in policies}
+    baseline = results[BASELINE_POLICY]
+    for summary in results.values():
+        summary["cost_reduction_percent"] = 100 * (
+            1 - summary["mean_episode_cost"] / max(baseline["mean_episode_cost"], 1e-9)
+        )
+        summary["stockout_reduction_percent"] = 100 * (
+            1 - summary["stockout_rate"] / max(baseline["stockout_rate"], 1e-9)
+        )
+
+    return {
+        "generated_at": datetime.now().isoformat(),
+        "config": {
+            "episodes": num_episodes,
+            "base_seed": base_seed,
+            "num_nodes": num_nodes,
+            "planning_horizon": planning_horizon,
+            "steps_per_episode": SupplyChainEnv(num_nodes=num_nodes).max_steps
+        },
+        "wall_time_seconds": time.perf_counter() - start_time,
+        "policies": results
+    }
+
+def save_results(results: Dict[str, Any], path: str = EVALUATION_RESULTS_PATH):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(results, f, indent=2)
+    os.replace(tmp_path, path)
+
+_cached_results: Optional[Dict[str, Any]] = None
+_cached_mtime: Optional[float] = None
+
+def load_results(path: str = EVALUATION_RESULTS_PATH) -> Optional[Dict[str, Any]]:
+    """Latest saved evaluation, re-read only when the file changes"""
+    global _cached_results, _cached_mtime
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+
+    if mtime != _cached_mtime:
+        try:
+            with open(path) as f:
+                _cached_results = json.load(f)
+            _cached_mtime = mtime
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to load evaluation results from {path}: {e}")
+            return None
+    return _cached_results
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate inventory transfer optimizers")
+    parser.add_argument("--policies", nargs="+", default=list(OPTIMIZERS), choices=list(OPTIMIZERS))
+    parser.add_argument("--episodes", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--nodes", type=int, default=10)
+    parser.add_argument("--horizon", type=int, default=7)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", default=EVALUATION_RESULTS_PATH)
+    args = parser.parse_args()
+
+    results = evaluate_policies(args.policies, args.episodes, args.seed, args.nodes,
+                                args.horizon, args.workers)
+    save_results(results, args.output)
+
+    for policy, summary in results["policies"].items():
+        latency = summary.get("decision_latency_ms", {})
+        print(f"{policy:>10}  cost={summary['mean_episode_cost']:>12.0f}  "
+              f"reduction={summary['cost_reduction_percent']:>6.1f}%  "
+              f"stockout_rate={summary['stockout_rate']:.3f}  "
+              f"p50={latency.get('p50', 0):.2f}ms  p99={latency.get('p99', 0):.2f}ms  "
+              f"env={summary['env_steps_per_second']:.0f} steps/s")
+    print(f"Saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+from typing import Dict, List, Any, Optional
+from .agent import rl_agents, heuristic_prediction, Lanes
+from .solver import get_transfer_solver
+
+OPTIMIZERS = ("rl", "heuristic", "solver")
+
+def run_optimizer(optimizer: str, current_stock: List[int], forecasts: List[float],
+                  lead_times: List[int], holding_costs: List[float], stockout_costs: List[float],
+                  planning_horizon: int, max_transfer_capacity: int, solver_time_limit_ms: int = 1000,
+                  lanes: Optional[Lanes] = None) -> Dict[str, Any]:
+    """
+    Run one transfer optimizer on a single network.
+
+    Every optimizer returns the same result shape: sparse `transfer_coo`,
+    `expected_savings`, `confidence` and `model_version`. Only `rl` loads the
+    trained agent, so `heuristic` and `solver` are cheap to run in worker processes.
+    """
+    if optimizer == "solver":
+        return get_transfer_solver().solve(
+            current_stock, forecasts, lead_times, holding_costs, stockout_costs,
+            planning_horizon, max_transfer_capacity, solver_time_limit_ms, lanes
+        )
+    if optimizer == "heuristic":
+        return heuristic_prediction(current_stock, forecasts, lanes)
+    if optimizer == "rl":
+        with rl_agents.lease() as agent:
+            return agent.predict_transfers(current_stock, forecasts, lead_times, holding_costs, lanes)
+
+    raise ValueError(f"Unknown optimizer '{optimizer}'")
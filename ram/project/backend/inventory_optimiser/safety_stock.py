@@ -0,0 +1,230 @@
+"""
+Vectorized safety stock, reorder point and order-up-to levels at catalog scale.
+
+Input is columnar (Parquet or Arrow IPC) with one row per SKU-node pair:
+
+    sku_id, node_id, lead_time, p50, p90 [, review_period, service_level]
+
+`p50` and `p90` are daily forecast lists, as emitted by `TFTModel.predict`.
+Rows are processed in fixed-size record batches, so memory stays bounded no
+matter how many pairs the file holds. Run from the backend directory:
+
+    python -m inventory_optimiser.safety_stock forecasts.parquet policy.parquet
+"""
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from statistics import NormalDist
+from typing import Dict, Iterator, Tuple
+import argparse
+import io
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+Z_P90 = NormalDist().inv_cdf(0.9)  # p90 sits this many standard deviations above p50
+DEFAULT_SERVICE_LEVEL = 0.95
+DEFAULT_REVIEW_PERIOD = 7
+DEFAULT_CHUNK_ROWS = 262_144
+
+OUTPUT_SCHEMA = pa.schema([
+    ("sku_id", pa.int64()),
+    ("node_id", pa.int64()),
+    ("lead_time_demand", pa.float64()),
+    ("safety_stock", pa.float64()),
+    ("reorder_point", pa.float64()),
+    ("order_up_to", pa.float64()),
+])
+
+def _list_to_matrix(column: pa.Array) -> np.ndarray:
+    """
+    Daily forecast list column as a (rows, horizon) matrix.
+
+    Rows shorter than the longest horizon are padded with their own mean.
+    """
+    if isinstance(column, pa.ChunkedArray):
+        column = column.combine_chunks()
+    offsets = column.offsets.to_numpy()
+    values = column.flatten().to_numpy(zero_copy_only=False).astype(float)
+    lengths = np.diff(offsets)
+    rows, horizon = len(lengths), int(lengths.max()) if len(lengths) else 0
+
+    if rows and (lengths == horizon).all():
+        return values.reshape(rows, horizon)
+
+    starts = offsets[:-1] - offsets[0]
+    row_means = np.add.reduceat(values, starts) / np.maximum(lengths, 1) if len(values) else np.zeros(rows)
+    matrix = np.repeat(row_means[:, None], horizon, axis=1)
+    row_index = np.repeat(np.arange(rows), lengths)
+    day_index = np.arange(len(values)) - np.repeat(starts, lengths)
+    matrix[row_index, day_index] = values
+    return matrix
+
+def _horizon_totals(cumulative: np.ndarray, days: np.ndarray) -> np.ndarray:
+    """Sum over the first `days` of each row, extrapolating the average day past the horizon"""
+    horizon = cumulative.shape[1]
+    within = np.clip(days, 0, horizon)
+    totals = np.where(within > 0, np.take_along_axis(cumulative, np.maximum(within - 1, 0)[:, None], 1)[:, 0], 0)
+    extra_days = np.maximum(days - horizon, 0)
+    return totals + extra_days * cumulative[:, -1] / horizon
+
+def _z_scores(service_levels: np.ndarray) -> np.ndarray:
+    """Normal quantiles, computed once per distinct service level"""
+    levels, inverse = np.unique(service_levels, return_inverse=True)
+    return np.array([NormalDist().inv_cdf(level) for level in levels])[inverse]
+
+def compute_inventory_policy(p50: np.ndarray, p90: np.ndarray, lead_times: np.ndarray,
+                             review_periods: np.ndarray, service_levels: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Safety stock, reorder point and order-up-to level for many SKU-node pairs at once.
+
+    Daily demand is treated as independent normals with mean p50 and standard
+    deviation (p90 - p50) / z(0.9). Safety stock covers lead-time demand at the
+    requested service level; the order-up-to level covers lead time plus one
+    review period.
+    """
+    sigma = np.maximum(p90 - p50, 0) / Z_P90
+    cumulative_mean = np.cumsum(p50, axis=1)
+    cumulative_var = np.cumsum(sigma ** 2, axis=1)
+    z = _z_scores(service_levels)
+
+    lead_mean = _horizon_totals(cumulative_mean, lead_times)
+    lead_std = np.sqrt(_horizon_totals(cumulative_var, lead_times))
+    protection = lead_times + review_periods
+    protection_mean = _horizon_totals(cumulative_mean, protection)
+    protection_std = np.sqrt(_horizon_totals(cumulative_var, protection))
+
+    safety_stock = z * lead_std
+    return {
+        "lead_time_demand": lead_mean,
+        "safety_stock": safety_stock,
+        "reorder_point": lead_mean + safety_stock,
+        "order_up_to": protection_mean + z * protection_std
+    }
+
+def _column(batch: pa.RecordBatch, name: str) -> pa.Array:
+    index = batch.schema.get_field_index(name)
+    if index == -1:
+        raise KeyError(f"Missing column '{name}'")
+    column = batch.column(index)
+    if column.null_count:
+        raise pa.ArrowInvalid(f"Column '{name}' has nulls")
+    return column
+
+def _column_or_default(batch: pa.RecordBatch, name: str, default: float) -> np.ndarray:
+    if batch.schema.get_field_index(name) == -1:
+        return np.full(batch.num_rows, default)
+    return _column(batch, name).to_numpy(zero_copy_only=False)
+
+def _forecast_matrices(batch: pa.RecordBatch) -> Tuple[np.ndarray, np.ndarray]:
+    p50, p90 = _column(batch, "p50"), _column(batch, "p90")
+    lengths = pc.list_value_length(p50)
+    if pc.any(pc.equal(lengths, 0)).as_py():
+        raise pa.ArrowInvalid("Every row needs a non-empty 'p50' forecast")
+    if not pc.all(pc.equal(lengths, pc.list_value_length(p90))).as_py():
+        raise pa.ArrowInvalid("'p50' and 'p90' forecasts must have the same length in every row")
+    return _list_to_matrix(p50), _list_to_matrix(p90)
+
+def policy_batch(batch: pa.RecordBatch, service_level: float = DEFAULT_SERVICE_LEVEL,
+                 review_period: int = DEFAULT_REVIEW_PERIOD) -> pa.RecordBatch:
+    """
+    Compute one output record batch; per-row columns override the defaults.
+
+    Raises ArrowInvalid for nulls, mismatched or empty forecasts, negative
+    lead times or review periods and service levels outside (0, 1), and
+    KeyError for missing columns.
+    """
+    service_levels = _column_or_default(batch, "service_level", service_level).astype(float)
+    if not ((service_levels > 0) & (service_levels < 1)).all():
+        raise pa.ArrowInvalid("service_level must be strictly between 0 and 1")
+    lead_times = _column_or_default(batch, "lead_time", 1).astype(np.int64)
+    review_periods = _column_or_default(batch, "review_period", review_period).astype(np.int64)
+    for name, values in (("lead_time", lead_times), ("review_period", review_periods)):
+        if (values < 0).any():
+            raise pa.ArrowInvalid(f"{name} must be >= 0")
+    p50, p90 = _forecast_matrices(batch)
+    result = compute_inventory_policy(p50, p90, lead_times, review_periods, service_levels)
+    node_field = "node_id" if batch.schema.get_field_index("node_id") != -1 else "store_id"
+
+    return pa.RecordBatch.from_arrays(
+        [
+            _column(batch, "sku_id").cast(pa.int64()),
+            _column(batch, node_field).cast(pa.int64()),
+        ] + [pa.array(result[name]) for name in OUTPUT_SCHEMA.names[2:]],
+        schema=OUTPUT_SCHEMA
+    )
+
+def _read_batches(path: str, chunk_rows: int) -> Iterator[pa.RecordBatch]:
+    if path.endswith(".parquet"):
+        yield from pq.ParquetFile(path).iter_batches(batch_size=chunk_rows)
+    else:
+        with pa.memory_map(path) as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                yield reader.get_batch(i)
+
+def process_file(input_path: str, output_path: str, service_level: float = DEFAULT_SERVICE_LEVEL,
+                 review_period: int = DEFAULT_REVIEW_PERIOD, chunk_rows: int = DEFAULT_CHUNK_ROWS) -> int:
+    """Stream a Parquet/Arrow forecast file into a Parquet/Arrow policy file; returns rows written"""
+    rows = 0
+    if output_path.endswith(".parquet"):
+        writer = pq.ParquetWriter(output_path, OUTPUT_SCHEMA)
+    else:
+        writer = pa.ipc.new_file(output_path, OUTPUT_SCHEMA)
+
+    try:
+        for batch in _read_batches(input_path, chunk_rows):
+            out = policy_batch(batch, service_level, review_period)
+            writer.write_batch(out)
+            rows += out.num_rows
+    finally:
+        writer.close()
+
+    return rows
+
+def _drain(sink: io.BytesIO) -> bytes:
+    data = sink.getvalue()
+    sink.seek(0)
+    sink.truncate()
+    return data
+
+def stream_ipc_policy(source, service_level: float = DEFAULT_SERVICE_LEVEL,
+                      review_period: int = DEFAULT_REVIEW_PERIOD) -> Iterator[bytes]:
+    """
+    Same computation over an Arrow IPC stream, yielding the output stream in pieces.
+
+    `source` is bytes or a readable file. Each input batch is read, computed
+    and yielded before the next is read, so memory holds one batch at a time.
+    """
+    reader = pa.ipc.open_stream(source)
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, OUTPUT_SCHEMA) as writer:
+        for batch in reader:
+            writer.write_batch(policy_batch(batch, service_level, review_period))
+            yield _drain(sink)
+    yield _drain(sink)  # Schema if there were no batches, and the end-of-stream marker
+
+def process_ipc_stream(body: bytes, service_level: float = DEFAULT_SERVICE_LEVEL,
+                       review_period: int = DEFAULT_REVIEW_PERIOD) -> bytes:
+    """Same computation over an in-memory Arrow IPC stream"""
+    return b"".join(stream_ipc_policy(body, service_level, review_period))
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute safety stock and reorder points from p50/p90 forecasts")
+    parser.add_argument("input", help="Parquet (.parquet) or Arrow IPC file")
+    parser.add_argument("output", help="Parquet (.parquet) or Arrow IPC file")
+    parser.add_argument("--service-level", type=float, default=DEFAULT_SERVICE_LEVEL)
+    parser.add_argument("--review-period", type=int, default=DEFAULT_REVIEW_PERIOD)
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS)
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    rows = process_file(args.input, args.output, args.service_level, args.review_period, args.chunk_rows)
+    elapsed = time.perf_counter() - start_time
+    print(f"Wrote {rows} SKU-node policies to {args.output} in {elapsed:.2f}s "
+          f"({rows / max(elapsed, 1e-9):,.0f} rows/s)")
+
+if __name__ == "__main__":
+    main()
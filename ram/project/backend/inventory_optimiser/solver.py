@@ -0,0 +1,284 @@
+import numpy as np
+from ortools.linear_solver import pywraplp
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional, Tuple, Hashable
+import threading
+import time
+import logging
+from .agent import Lanes
+from realtime_monitoring.profiling import span
+
+logger = logging.getLogger(__name__)
+
+TRANSFER_UNIT_COST = 0.1  # Per-unit transfer cost, same as the RL reward
+MAX_CACHED_MODELS = 8
+
+def transfer_economics(current_stock: List[int], forecasts: List[float], lead_times: List[int],
+                       planning_horizon: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Per-node transferable surplus and coverable shortfall over the horizon.
+
+    `forecasts` are daily demand. A node can give away whatever exceeds its own
+    horizon demand. A node short of stock can only use units that arrive after
+    its lead time, so its shortfall is counted from max(stock-out day, lead time).
+    """
+    stock = np.asarray(current_stock, dtype=float)
+    demand = np.asarray(forecasts, dtype=float)
+    lead = np.asarray(lead_times, dtype=float)
+
+    surplus = np.maximum(0, stock - demand * planning_horizon)
+
+    with np.errstate(divide="ignore"):
+        stockout_day = np.where(demand > 0, stock / np.maximum(demand, 1e-9), np.inf)
+    coverable = demand * np.maximum(0, planning_horizon - np.maximum(stockout_day, lead))
+
+    return np.floor(surplus), np.floor(coverable)
+
+class _HubModel:
+    """
+    GLOP model for one network size, kept alive between solves.
+
+    Transfers are routed through a virtual hub: `ship[i]` units leave node i
+    and `recv[j]` units arrive at node j with total shipped equal to total
+    received. Per-unit costs are separable (holding saved at the source,
+    stockout avoided at the destination), so this is an exact min-cost-flow
+    with O(n) arcs instead of O(n^2). Only bounds and objective change between
+    solves, so GLOP re-solves from the previous optimal basis.
+    """
+
+    def __init__(self, num_nodes: int):
+        self.lock = threading.Lock()
+        self.solver = pywraplp.Solver.CreateSolver("GLOP")
+        self.ship = [self.solver.NumVar(0, 0, f"ship_{i}") for i in range(num_nodes)]
+        self.recv = [self.solver.NumVar(0, 0, f"recv_{i}") for i in range(num_nodes)]
+
+        balance = self.solver.Constraint(0, 0, "hub_balance")
+        for var in self.ship:
+            balance.SetCoefficient(var, 1)
+        for var in self.recv:
+            balance.SetCoefficient(var, -1)
+
+        self.objective = self.solver.Objective()
+        self.objective.SetMinimization()
+
+    def solve(self, ship_ub: np.ndarray, recv_ub: np.ndarray, ship_cost: np.ndarray,
+              recv_cost: np.ndarray, time_limit_ms: int) -> Optional[Tuple[np.ndarray, np.ndarray, float]]:
+        for i, var in enumerate(self.ship):
+            var.SetUb(float(ship_ub[i]))
+            self.objective.SetCoefficient(var, float(ship_cost[i]))
+        for j, var in enumerate(self.recv):
+            var.SetUb(float(recv_ub[j]))
+            self.objective.SetCoefficient(var, float(recv_cost[j]))
+
+        self.solver.SetTimeLimit(time_limit_ms)
+        status = self.solver.Solve()
+        if status not in (pywraplp.Solver.OPTIMAL, pywraplp.Solver.FEASIBLE):
+            return None
+
+        ship = np.array([var.solution_value() for var in self.ship])
+        recv = np.array([var.solution_value() for var in self.recv])
+        return np.round(ship), np.round(recv), self.objective.Value()
+
+class _LaneModel:
+    """
+    GLOP model for one sparse lane graph, kept alive between solves.
+
+    One variable per permitted lane with per-node outbound and inbound
+    limits, so model size scales with lanes rather than nodes^2. The lane set
+    fixes the model structure; only bounds and objective change between
+    solves, which lets GLOP warm-start from the previous optimal basis.
+    """
+
+    def __init__(self, num_nodes: int, lanes: Lanes):
+        self.lock = threading.Lock()
+        self.solver = pywraplp.Solver.CreateSolver("GLOP")
+        src, dst = lanes
+        self.flow = [self.solver.NumVar(0, 0, f"lane_{k}") for k in range(len(src))]
+        self.outbound = [self.solver.Constraint(0, 0, f"out_{i}") for i in range(num_nodes)]
+        self.inbound = [self.solver.Constraint(0, 0, f"in_{i}") for i in range(num_nodes)]
+        for var, i, j in zip(self.flow, src.tolist(), dst.tolist()):
+            self.outbound[i].SetCoefficient(var, 1)
+            self.inbound[j].SetCoefficient(var, 1)
+
+        self.objective = self.solver.Objective()
+        self.objective.SetMinimization()
+
+    def solve(self, lane_ub: float, lane_cost: np.ndarray, out_ub: np.ndarray, in_ub: np.ndarray,
+              time_limit_ms: int) -> Optional[Tuple[np.ndarray, float]]:
+        for k, var in enumerate(self.flow):
+            var.SetUb(float(lane_ub))
+            self.objective.SetCoefficient(var, float(lane_cost[k]))
+        for i, constraint in enumerate(self.outbound):
+            constraint.SetUb(float(out_ub[i]))
+        for j, constraint in enumerate(self.inbound):
+            constraint.SetUb(float(in_ub[j]))
+
+        self.solver.SetTimeLimit(time_limit_ms)
+        status = self.solver.Solve()
+        if status not in (pywraplp.Solver.OPTIMAL, pywraplp.Solver.FEASIBLE):
+            return None
+
+        flow = np.array([var.solution_value() for var in self.flow])
+        return np.round(flow), self.objective.Value()
+
+def _greedy_lane_flow(src: np.ndarray, dst: np.ndarray, lane_ub: float, lane_cost: np.ndarray,
+                      out_ub: np.ndarray, in_ub: np.ndarray) -> Tuple[np.ndarray, float]:
+    """Feasible lane flow filling the cheapest lanes first"""
+    flow = np.zeros(len(src))
+    out_left = out_ub.copy()
+    in_left = in_ub.copy()
+
+    for k in np.argsort(lane_cost):
+        if lane_cost[k] >= 0:
+            break
+        i, j = src[k], dst[k]
+        qty = min(lane_ub, out_left[i], in_left[j])
+        if qty > 0:
+            flow[k] = qty
+            out_left[i] -= qty
+            in_left[j] -= qty
+
+    return flow, float(flow @ lane_cost)
+
+def _greedy_hub_flow(ship_ub: np.ndarray, recv_ub: np.ndarray, ship_cost: np.ndarray,
+                     recv_cost: np.ndarray) -> Tuple[np.ndarray, np.ndarray, float]:
+    """Optimal hub flow by matching cheapest sources with most valuable sinks"""
+    ship = np.zeros_like(ship_ub)
+    recv = np.zeros_like(recv_ub)
+    sources = [i for i in np.argsort(ship_cost) if ship_ub[i] > 0]
+    sinks = [j for j in np.argsort(recv_cost) if recv_ub[j] > 0]
+
+    si = sj = 0
+    while si < len(sources) and sj < len(sinks):
+        i, j = sources[si], sinks[sj]
+        if ship_cost[i] + recv_cost[j] >= 0:
+            break
+        qty = min(ship_ub[i] - ship[i], recv_ub[j] - recv[j])
+        ship[i] += qty
+        recv[j] += qty
+        if ship[i] >= ship_ub[i]:
+            si += 1
+        if recv[j] >= recv_ub[j]:
+            sj += 1
+
+    return ship, recv, float(ship @ ship_cost + recv @ recv_cost)
+
+def _pair_hub_flow(ship: np.ndarray, recv: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Decompose hub flow into at most (#sources + #sinks) node-to-node transfers"""
+    rows, cols, quantities = [], [], []
+    sources = list(np.nonzero(ship > 0)[0])
+    sinks = list(np.nonzero(recv > 0)[0])
+    remaining_ship = ship.copy()
+    remaining_recv = recv.copy()
+
+    si = sj = 0
+    while si < len(sources) and sj < len(sinks):
+        i, j = sources[si], sinks[sj]
+        qty = min(remaining_ship[i], remaining_recv[j])
+        if qty > 0:
+            rows.append(i)
+            cols.append(j)
+            quantities.append(qty)
+        remaining_ship[i] -= qty
+        remaining_recv[j] -= qty
+        if remaining_ship[i] <= 0:
+            si += 1
+        if remaining_recv[j] <= 0:
+            sj += 1
+
+    return (np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64),
+            np.array(quantities, dtype=np.int64))
+
+class TransferLPSolver:
+    """Exact LP baseline for lateral inventory transfers"""
+
+    def __init__(self, max_cached_models: int = MAX_CACHED_MODELS):
+        self.max_cached_models = max_cached_models
+        self._models: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_model(self, num_nodes: int, lanes: Optional[Lanes]):
+        if lanes is None:
+            key = ("hub", num_nodes)
+        else:
+            key = ("lanes", num_nodes, lanes[0].tobytes(), lanes[1].tobytes())
+
+        with self._lock:
+            model = self._models.get(key)
+            if model is None:
+                model = _HubModel(num_nodes) if lanes is None else _LaneModel(num_nodes, lanes)
+                self._models[key] = model
+                if len(self._models) > self.max_cached_models:
+                    self._models.popitem(last=False)
+            else:
+                self._models.move_to_end(key)
+            return model
+
+    def solve(self, current_stock: List[int], forecasts: List[float], lead_times: List[int],
+              holding_costs: List[float], stockout_costs: List[float], planning_horizon: int,
+              max_transfer_capacity: int, time_limit_ms: int = 1000,
+              lanes: Optional[Lanes] = None) -> Dict[str, Any]:
+        """
+        Minimize transfer + holding + stockout cost over the planning horizon.
+
+        `max_transfer_capacity` bounds how much any single node can ship or
+        receive. Without `lanes` every node pair is permitted and the problem
+        is solved through a hub; with `lanes` only those arcs exist. If GLOP
+        hits `time_limit_ms` a greedy solution is returned instead (exact for
+        the hub, feasible for lanes).
+        """
+        start_time = time.perf_counter()
+        num_nodes = len(current_stock)
+
+        surplus, coverable = transfer_economics(current_stock, forecasts, lead_times, planning_horizon)
+        ship_ub = np.minimum(surplus, max_transfer_capacity)
+        recv_ub = np.minimum(coverable, max_transfer_capacity)
+        # Shipping a unit saves its holding cost for the horizon; receiving one avoids a stockout
+        ship_cost = TRANSFER_UNIT_COST - np.asarray(holding_costs, dtype=float) * planning_horizon
+        recv_cost = -np.asarray(stockout_costs, dtype=float)
+
+        with span("lp_build"):
+            model = self._get_model(num_nodes, lanes)
+        model_version = "LP-GLOP-v1.0.0"
+
+        if lanes is None:
+            with model.lock, span("lp_solve"):
+                solution = model.solve(ship_ub, recv_ub, ship_cost, recv_cost, time_limit_ms)
+            if solution is None:
+                logger.warning(f"LP solve hit {time_limit_ms}ms limit for {num_nodes} nodes; using greedy matching")
+                solution = _greedy_hub_flow(ship_ub, recv_ub, ship_cost, recv_cost)
+                model_version = "LP-greedy-v1.0.0"
+
+            ship, recv, objective = solution
+            rows, cols, quantities = _pair_hub_flow(ship, recv)
+        else:
+            src, dst = lanes
+            lane_cost = ship_cost[src] + recv_cost[dst]
+            with model.lock, span("lp_solve"):
+                solution = model.solve(max_transfer_capacity, lane_cost, ship_ub, recv_ub, time_limit_ms)
+            if solution is None:
+                logger.warning(f"LP solve hit {time_limit_ms}ms limit for {len(src)} lanes; using greedy fill")
+                solution = _greedy_lane_flow(src, dst, max_transfer_capacity, lane_cost, ship_ub, recv_ub)
+                model_version = "LP-greedy-v1.0.0"
+
+            flow, objective = solution
+            moved = flow > 0
+            rows, cols, quantities = src[moved], dst[moved], flow[moved].astype(np.int64)
+
+        return {
+            "transfer_coo": (rows, cols, quantities),
+            "expected_savings": float(-objective),
+            "confidence": 1.0,
+            "model_version": model_version,
+            "solve_time_ms": (time.perf_counter() - start_time) * 1000
+        }
+
+# Global solver instance
+_transfer_solver = None
+
+def get_transfer_solver() -> TransferLPSolver:
+    """Get or create transfer LP solver instance"""
+    global _transfer_solver
+    if _transfer_solver is None:
+        _transfer_solver = TransferLPSolver()
+    return _transfer_solver
@@ -1,9 +1,19 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import FileResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from demand_forecast.service import router as forecast_router
 from inventory_optimiser.service import router as inv_router
 from route_optimiser.service import router as route_router
-from realtime_monitoring.service import router as monitoring_router
+from planning_pipeline.service import router as planning_router
+from realtime_monitoring.service import router as monitoring_router, start_monitoring, stop_monitoring
+from realtime_monitoring.instrumentation import RequestMetricsMiddleware, metrics_response
+from realtime_monitoring.profiling import PROFILING_ENABLED, ProfilingMiddleware, profile_path
+from common.serialization import FastJSONResponse
+from common.model_registry import start_model_reloader, stop_model_reloader
+from demand_forecast.model import tft_models
+from inventory_optimiser.agent import rl_agents
+from route_optimiser.road_network import load_configured_road_network
 
 app = FastAPI(
     title="AI-Optimised Retail Supply-Chain API for Walmart",
@@ -23,7 +33,8 @@ app = FastAPI(
     """,
     version="1.0.0",
     docs_url="/",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=FastJSONResponse
 )
 
 # CORS middleware for frontend integration
@@ -35,15 +46,49 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-route latency, error and in-flight metrics; also feeds component health on the dashboard
+app.add_middleware(RequestMetricsMiddleware)
+
+# Server-Timing spans on every request; sampled profiles on request when ENABLE_PROFILING is set
+app.add_middleware(ProfilingMiddleware)
+
+@app.on_event("startup")
+async def startup():
+    # One shared publisher advances monitoring state and feeds every WebSocket client
+    await start_monitoring()
+    # Load and warm models before serving, then hot-swap new versions as they are published
+    await start_model_reloader([tft_models, rl_agents])
+    # Road distances read the contracted graph from memory; a configured graph that fails to load stops startup
+    await run_in_threadpool(load_configured_road_network)
+
+@app.on_event("shutdown")
+async def shutdown():
+    await stop_model_reloader()
+    await stop_monitoring()
+
 # Health check endpoint
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "service": "walmart-supply-chain-api"}
 
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return metrics_response()
+
+if PROFILING_ENABLED:
+    @app.get("/profiles/{profile_id}", include_in_schema=False)
+    async def download_profile(profile_id: str, format: str = Query("speedscope", regex="^(speedscope|collapsed)$")):
+        """Profile recorded for a request sent with `X-Profile: 1`, by its `X-Profile-Id`"""
+        path = profile_path(profile_id, format)
+        if path is None:
+            raise HTTPException(status_code=404, detail="Profile not found")
+        return FileResponse(path, media_type="application/json" if format == "speedscope" else "text/plain")
+
 # Include all service routers
 app.include_router(forecast_router, prefix="/forecast", tags=["Demand Forecasting"])
 app.include_router(inv_router, prefix="/inventory", tags=["Inventory Optimization"])
 app.include_router(route_router, prefix="/route", tags=["Route Optimization"])
+app.include_router(planning_router, prefix="/planning", tags=["Planning Pipeline"])
 app.include_router(monitoring_router, prefix="/monitoring", tags=["Real-time Monitoring"])
 
 if __name__ == "__main__":
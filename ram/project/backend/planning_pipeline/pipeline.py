@@ -0,0 +1,205 @@
+"""
+Forecast -> inventory -> routing, in one process on shared NumPy arrays.
+
+SKUs are forecast in chunks with one batched TFT pass each. As soon as a
+chunk's demand is known its SKUs are optimized (RL on threads so they share
+batched policy passes, heuristic and solver on the process pool) while the
+next chunk is being forecast. Units arriving per node are summed across
+SKUs and routed once every SKU is done. Each stage result is yielded as an
+NDJSON line as it completes.
+"""
+from dataclasses import dataclass
+from fastapi.concurrency import run_in_threadpool
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+import asyncio
+import time
+import logging
+import numpy as np
+from common.pool import get_process_pool
+from common.serialization import dumps
+from demand_forecast.model import tft_models
+from inventory_optimiser.agent import Lanes
+from inventory_optimiser.optimizers import run_optimizer
+
+logger = logging.getLogger(__name__)
+
+FORECAST_CHUNK_SKUS = 32  # SKUs per batched forecast pass; also the unit of overlap with inventory
+
+@dataclass
+class PlanningNetwork:
+    """Per-node inputs shared by every SKU, aligned with `node_ids`"""
+    node_ids: np.ndarray
+    store_ids: np.ndarray
+    lead_times: np.ndarray
+    holding_costs: np.ndarray
+    stockout_costs: np.ndarray
+    lanes: Optional[Lanes] = None
+
+@dataclass
+class InventorySettings:
+    optimizer: str
+    planning_horizon: int
+    max_transfer_capacity: int
+    solver_time_limit_ms: int
+    demand_quantile: str = "p50"
+
+def forecast_chunk(sku_ids: np.ndarray, store_ids: np.ndarray, horizon: int, quantile: str):
+    """Mean daily demand over the horizon as a (skus, nodes) array, and the model version"""
+    pairs_sku = np.repeat(sku_ids, len(store_ids))
+    pairs_store = np.tile(store_ids, len(sku_ids))
+    with tft_models.lease() as model:
+        result = model.predict_batch(pairs_sku, pairs_store, horizon)
+    demand = np.maximum(0, result[quantile].mean(axis=1)).reshape(len(sku_ids), len(store_ids))
+    return demand, result["model_version"]
+
+def optimize_chunk(network: PlanningNetwork, settings: InventorySettings, sku_ids: np.ndarray,
+                   stock: np.ndarray, demand: np.ndarray) -> List[Dict[str, Any]]:
+    """
+    Optimize each SKU of a chunk on the shared network; runs in a worker process or thread.
+
+    Transfers stay as (source index, destination index, quantity) arrays. A
+    failing SKU yields an error record and the rest of the chunk carries on.
+    """
+    results = []
+    for sku_id, current_stock, forecasts in zip(sku_ids.tolist(), stock, demand):
+        start_time = time.perf_counter()
+        try:
+            result = run_optimizer(
+                settings.optimizer, current_stock.tolist(), forecasts.tolist(), network.lead_times.tolist(),
+                network.holding_costs.tolist(), network.stockout_costs.tolist(), settings.planning_horizon,
+                settings.max_transfer_capacity, settings.solver_time_limit_ms, network.lanes
+            )
+            rows, cols, quantities = result["transfer_coo"]
+            quantities = np.asarray(quantities).astype(np.int64)
+            moved = quantities > 0
+            results.append({
+                "sku_id": sku_id,
+                "status": "ok",
+                "transfer_coo": (np.asarray(rows)[moved], np.asarray(cols)[moved], quantities[moved]),
+                "expected_savings": result["expected_savings"],
+                "model_version": result["model_version"],
+                "optimization_time_ms": (time.perf_counter() - start_time) * 1000
+            })
+        except Exception as e:
+            results.append({
+                "sku_id": sku_id,
+                "status": "error",
+                "error": str(e),
+                "optimization_time_ms": (time.perf_counter() - start_time) * 1000
+            })
+    return results
+
+def _inventory_line(result: Dict[str, Any], node_ids: np.ndarray) -> Dict[str, Any]:
+    line = {"stage": "inventory", **result}
+    if result["status"] == "ok":
+        rows, cols, quantities = line.pop("transfer_coo")
+        line["transfers"] = [
+            {"from_node": i, "to_node": j, "quantity": q}
+            for i, j, q in zip(node_ids[rows].tolist(), node_ids[cols].tolist(), quantities.tolist())
+        ]
+    return line
+
+async def stream_plan(network: PlanningNetwork, settings: InventorySettings, sku_ids: np.ndarray,
+                      stock: np.ndarray, plan_routes: Callable[[np.ndarray], Any]) -> AsyncIterator[bytes]:
+    """
+    Run the pipeline and yield one NDJSON line per stage result as it completes.
+
+    Lines are forecast chunks, then per-SKU inventory results in completion
+    order (interleaved with later forecast chunks), then the routing plan,
+    then a summary. `plan_routes(units)` is called with the units arriving
+    at each node and returns the routing result.
+    """
+    start_time = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    lines: asyncio.Queue = asyncio.Queue()
+    delivered = np.zeros(len(network.node_ids), dtype=np.int64)
+    stage_ms = {"forecast": 0.0, "inventory": 0.0, "routing": 0.0}
+    counts = {"succeeded": 0, "failed": 0}
+    inventory_started: List[float] = []
+    inventory_tasks: List[asyncio.Task] = []
+
+    async def run_inventory(chunk_skus: np.ndarray, chunk_stock: np.ndarray, demand: np.ndarray):
+        inventory_started.append(time.perf_counter())
+        try:
+            if settings.optimizer == "rl":
+                results = await run_in_threadpool(optimize_chunk, network, settings, chunk_skus, chunk_stock, demand)
+            else:
+                results = await loop.run_in_executor(
+                    get_process_pool(), optimize_chunk, network, settings, chunk_skus, chunk_stock, demand
+                )
+        except Exception as e:
+            logger.error(f"Planning inventory chunk of {len(chunk_skus)} SKUs failed: {e}")
+            results = [{"sku_id": sku_id, "status": "error", "error": str(e)} for sku_id in chunk_skus.tolist()]
+
+        for result in results:
+            if result["status"] == "ok":
+                counts["succeeded"] += 1
+                _, cols, quantities = result["transfer_coo"]
+                np.add.at(delivered, cols, quantities)
+            else:
+                counts["failed"] += 1
+            await lines.put(_inventory_line(result, network.node_ids))
+
+    async def produce():
+        try:
+            for k in range(0, len(sku_ids), FORECAST_CHUNK_SKUS):
+                chunk_skus, chunk_stock = sku_ids[k:k + FORECAST_CHUNK_SKUS], stock[k:k + FORECAST_CHUNK_SKUS]
+                chunk_start = time.perf_counter()
+                try:
+                    demand, model_version = await run_in_threadpool(
+                        forecast_chunk, chunk_skus, network.store_ids,
+                        settings.planning_horizon, settings.demand_quantile
+                    )
+                except Exception as e:
+                    logger.error(f"Planning forecast of {len(chunk_skus)} SKUs failed: {e}")
+                    counts["failed"] += len(chunk_skus)
+                    await lines.put({"stage": "forecast", "status": "error", "sku_ids": chunk_skus, "error": str(e)})
+                    continue
+                elapsed = (time.perf_counter() - chunk_start) * 1000
+                stage_ms["forecast"] += elapsed
+
+                await lines.put({"stage": "forecast", "status": "ok", "sku_ids": chunk_skus, "forecast_demand": demand,
+                                 "model_version": model_version, "elapsed_ms": elapsed})
+
+                # Optimize this chunk while the next one is forecast
+                inventory_tasks.append(asyncio.create_task(run_inventory(chunk_skus, chunk_stock, demand)))
+
+            await asyncio.gather(*inventory_tasks)
+            if inventory_started:
+                stage_ms["inventory"] = (time.perf_counter() - min(inventory_started)) * 1000
+
+            routing_start = time.perf_counter()
+            try:
+                routes = await run_in_threadpool(plan_routes, delivered.copy())
+                routing = {"stage": "routing", "status": "ok", "deliveries": int(np.count_nonzero(delivered)),
+                           "delivered_units": int(delivered.sum()), "result": routes}
+            except Exception as e:
+                logger.error(f"Planning routing failed: {e}")
+                routing = {"stage": "routing", "status": "error", "error": str(e)}
+            stage_ms["routing"] = routing["elapsed_ms"] = (time.perf_counter() - routing_start) * 1000
+            await lines.put(routing)
+
+            await lines.put({
+                "stage": "summary",
+                "skus": len(sku_ids),
+                **counts,
+                "stage_time_ms": stage_ms,
+                "total_time_ms": (time.perf_counter() - start_time) * 1000
+            })
+        finally:
+            await lines.put(None)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            line = await lines.get()
+            if line is None:
+                break
+            yield dumps(line) + b"\n"
+        await producer
+    finally:
+        # Client went away mid-stream: stop forecasting new chunks and abandon queued optimization
+        producer.cancel()
+        for task in inventory_tasks:
+            task.cancel()
+        await asyncio.gather(producer, *inventory_tasks, return_exceptions=True)
@@ -0,0 +1,131 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List, Dict, Optional
+import numpy as np
+import logging
+from .pipeline import InventorySettings, PlanningNetwork, stream_plan
+from common.serialization import construct
+from inventory_optimiser.service import check_network_size, lane_index
+from route_optimiser.service import (
+    DeliveryNode, Location, RouteOptimizationRequest, RouteOptimizationResponse, RouteOptimizer, Vehicle
+)
+from realtime_monitoring.profiling import ProfiledRoute
+
+logger = logging.getLogger(__name__)
+router = APIRouter(route_class=ProfiledRoute)
+
+MAX_PLANNING_NODES = 200  # Every node can become a delivery stop, so this follows the route optimizer's limit
+
+class PlanningNode(BaseModel):
+    node_id: int = Field(..., description="Node identifier")
+    store_id: int = Field(..., description="Store whose demand is forecast for this node")
+    location: Location
+    lead_time: int = Field(..., description="Lead time in days", ge=1, le=30)
+    holding_cost: float = Field(0.2, description="Holding cost per unit per day")
+    stockout_cost: float = Field(10.0, description="Stockout penalty per unit")
+    service_time_minutes: int = Field(10, description="Unloading time when transfers arrive", ge=1)
+    time_window_start: int = Field(480, description="Receiving window start, minutes from midnight")
+    time_window_end: int = Field(1080, description="Receiving window end, minutes from midnight")
+    priority: str = Field("medium", description="Delivery priority", regex="^(low|medium|high|urgent)$")
+
+class SkuStock(BaseModel):
+    sku_id: int = Field(..., description="SKU identifier")
+    current_stock: List[int] = Field(..., description="Current inventory per node, in `nodes` order")
+
+class PlanningRequest(BaseModel):
+    nodes: List[PlanningNode] = Field(..., description="Network nodes", max_items=MAX_PLANNING_NODES)
+    skus: List[SkuStock] = Field(..., description="Per-SKU stock", max_items=5000)
+    vehicles: List[Vehicle] = Field(..., description="Vehicles that carry the transfers", max_items=20)
+    planning_horizon: int = Field(7, description="Forecast and planning horizon in days", ge=1, le=30)
+    demand_quantile: str = Field("p50", description="Forecast quantile used as demand", regex="^(p50|p90)$")
+    optimizer: str = Field("solver", description="Inventory optimizer", regex="^(rl|heuristic|solver)$")
+    max_transfer_capacity: int = Field(1000, description="Maximum transfer capacity")
+    solver_time_limit_ms: int = Field(1000, description="Time limit for the LP solver per SKU", ge=10, le=60000)
+    allowed_lanes: Optional[Dict[int, List[int]]] = Field(
+        None, description="Permitted transfer lanes as an adjacency list: node_id -> destination node_ids"
+    )
+    units_per_load: int = Field(10, description="Transferred units per unit of vehicle capacity", ge=1)
+    optimization_objective: str = Field("minimize_cost", description="Routing objective",
+                                        regex="^(minimize_cost|minimize_time|minimize_distance|balanced)$")
+    include_traffic: bool = Field(True, description="Include real-time traffic data")
+    drone_delivery_enabled: bool = Field(False, description="Enable drone delivery for suitable locations")
+
+_route_optimizer = RouteOptimizer()
+
+def _route_planner(request: PlanningRequest):
+    """Routing stage: one delivery per node receiving transfers, sized in vehicle capacity units"""
+    def plan_routes(delivered_units: np.ndarray) -> Optional[RouteOptimizationResponse]:
+        receiving = np.flatnonzero(delivered_units)
+        if len(receiving) == 0:
+            return None
+        loads = np.ceil(delivered_units[receiving] / request.units_per_load).astype(np.int64)
+        deliveries = []
+        for i, load in zip(receiving.tolist(), loads.tolist()):
+            node = request.nodes[i]
+            deliveries.append(construct(
+                DeliveryNode,
+                node_id=node.node_id,
+                location=node.location,
+                demand=load,
+                service_time_minutes=node.service_time_minutes,
+                time_window_start=node.time_window_start,
+                time_window_end=node.time_window_end,
+                priority=node.priority
+            ))
+        return _route_optimizer.optimize_routes(construct(
+            RouteOptimizationRequest,
+            vehicles=request.vehicles,
+            deliveries=deliveries,
+            optimization_objective=request.optimization_objective,
+            include_traffic=request.include_traffic,
+            drone_delivery_enabled=request.drone_delivery_enabled
+        ))
+    return plan_routes
+
+@router.post("/plan")
+async def plan_replenishment(request: PlanningRequest):
+    """
+    Forecast, optimize inventory transfers and route them in one call.
+
+    Replaces calling `/forecast/batch`, `/inventory/optimize` and
+    `/route/optimize` in turn: the stages run in-process on shared arrays,
+    and inventory optimization of one chunk of SKUs overlaps forecasting of
+    the next. Results stream back as newline-delimited JSON:
+
+    - `forecast`: mean daily demand per SKU and node for a chunk of SKUs
+    - `inventory`: transfers per SKU, in completion order
+    - `routing`: routes delivering the summed transfers to each receiving node
+    - `summary`: counts and time per stage
+    """
+    check_network_size(request.optimizer, len(request.nodes), request.allowed_lanes)
+    node_ids = [node.node_id for node in request.nodes]
+    for sku in request.skus:
+        if len(sku.current_stock) != len(node_ids):
+            raise HTTPException(
+                status_code=422,
+                detail=f"SKU {sku.sku_id}: expected {len(node_ids)} stock values, got {len(sku.current_stock)}"
+            )
+
+    network = PlanningNetwork(
+        node_ids=np.array(node_ids, dtype=np.int64),
+        store_ids=np.array([node.store_id for node in request.nodes], dtype=np.int64),
+        lead_times=np.array([node.lead_time for node in request.nodes], dtype=np.int64),
+        holding_costs=np.array([node.holding_cost for node in request.nodes]),
+        stockout_costs=np.array([node.stockout_cost for node in request.nodes]),
+        lanes=lane_index(node_ids, request.allowed_lanes)
+    )
+    settings = InventorySettings(
+        optimizer=request.optimizer,
+        planning_horizon=request.planning_horizon,
+        max_transfer_capacity=request.max_transfer_capacity,
+        solver_time_limit_ms=request.solver_time_limit_ms,
+        demand_quantile=request.demand_quantile
+    )
+    sku_ids = np.array([sku.sku_id for sku in request.skus], dtype=np.int64)
+    stock = np.array([sku.current_stock for sku in request.skus], dtype=np.int64).reshape(len(sku_ids), len(node_ids))
+
+    return StreamingResponse(
+        stream_plan(network, settings, sku_ids, stock, _route_planner(request)),
+        media_type="application/x-ndjson"
+    )
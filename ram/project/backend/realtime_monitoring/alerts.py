@@ -0,0 +1,335 @@
+"""
+Indexed, persistent alert store.
+
+Alerts are appended to a JSONL log at ALERT_LOG_PATH and replayed on startup.
+In memory they are indexed by id, component, severity and resolved state,
+with sequence numbers as stable pagination cursors. Alerts that repeat an
+open alert's fingerprint only bump its occurrence count, and new alerts per
+component are rate limited, so an alert storm costs a counter update per event.
+
+Workers sharing the log serialize appends and startup compaction through an
+exclusive lock on a `.lock` file next to it; a writer whose log was compacted
+away by another worker reopens it before appending.
+"""
+from pydantic import BaseModel, Field
+from fastapi.encoders import jsonable_encoder
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+import fcntl
+import hashlib
+import json
+import os
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+ALERT_LOG_PATH = os.getenv("ALERT_LOG_PATH", "/tmp/monitoring_alerts.jsonl")
+MAX_RETAINED_ALERTS = 50_000
+ALERT_RATE_PER_SECOND = 5.0  # New distinct alerts per component, sustained
+ALERT_BURST = 20
+REPEAT_LOG_INTERVAL = 1.0  # Seconds between persisted occurrence counts per alert
+
+class Alert(BaseModel):
+    alert_id: str
+    severity: str = Field(..., regex="^(info|warning|critical)$")
+    component: str
+    message: str
+    timestamp: datetime
+    location: Optional[str] = None
+    resolved: bool = False
+    occurrences: int = 1
+    last_seen: Optional[datetime] = None
+    details: Optional[Dict[str, Any]] = None
+
+def alert_fingerprint(alert: Alert) -> str:
+    """Alerts with the same severity, component, message and location are the same problem"""
+    key = "\x1f".join([alert.severity, alert.component, alert.message, alert.location or ""])
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+class _TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+class AlertStore:
+    def __init__(self, log_path: Optional[str] = ALERT_LOG_PATH, max_retained: int = MAX_RETAINED_ALERTS,
+                 rate_per_second: float = ALERT_RATE_PER_SECOND, burst: float = ALERT_BURST):
+        self.log_path = log_path
+        self.max_retained = max_retained
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+
+        self._lock = threading.Lock()
+        self._next_seq = 0
+        self._alerts: Dict[int, Alert] = {}
+        self._seq_by_id: Dict[str, int] = {}
+        self._all: List[int] = []
+        self._by_component: Dict[str, List[int]] = defaultdict(list)
+        self._by_severity: Dict[str, List[int]] = defaultdict(list)
+        self._open: List[int] = []
+        self._open_by_fingerprint: Dict[str, int] = {}
+        self._buckets: Dict[str, _TokenBucket] = {}
+        self._repeat_logged: Dict[int, float] = {}
+        self._unlogged_repeats: Set[int] = set()
+        self.suppressed: Dict[str, int] = defaultdict(int)
+        self.deduplicated = 0
+        self._log = None
+        self._log_lock = None
+
+        if log_path:
+            self._log_lock = os.open(f"{log_path}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+            with self._locked_log():
+                self._replay()
+                self._log = open(log_path, "a")
+
+    # Persistence
+
+    @contextmanager
+    def _locked_log(self):
+        """Exclusive use of the log across workers"""
+        fcntl.flock(self._log_lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._log_lock, fcntl.LOCK_UN)
+
+    def _write(self, record: dict):
+        if self._log is None:
+            return
+        with self._locked_log():
+            try:
+                compacted = os.stat(self.log_path).st_ino != os.fstat(self._log.fileno()).st_ino
+            except FileNotFoundError:
+                compacted = True
+            if compacted:
+                # Another worker replaced the log; appending to the old file would lose the record
+                self._log.close()
+                self._log = open(self.log_path, "a")
+            self._log.write(json.dumps(record, separators=(",", ":")) + "\n")
+            self._log.flush()
+
+    def _write_repeat(self, alert: Alert):
+        self._write({"op": "repeat", "alert_id": alert.alert_id, "occurrences": alert.occurrences,
+                     "last_seen": alert.last_seen.isoformat()})
+
+    def _replay(self):
+        """Rebuild state from the log, then rewrite it compacted to the retained alerts; call under the log lock"""
+        if not os.path.exists(self.log_path):
+            return
+        try:
+            with open(self.log_path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # A torn last line from a crash
+                    op = record.get("op")
+                    if op == "raise":
+                        self._insert(Alert.parse_obj(record["alert"]))
+                    elif op in ("repeat", "resolve") and record["alert_id"] in self._seq_by_id:
+                        alert = self._alerts[self._seq_by_id[record["alert_id"]]]
+                        if op == "repeat":
+                            alert.occurrences = record["occurrences"]
+                            alert.last_seen = datetime.fromisoformat(record["last_seen"])
+                        else:
+                            self._mark_resolved(self._seq_by_id[record["alert_id"]])
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Failed to replay alert log {self.log_path}: {e}")
+
+        tmp_path = f"{self.log_path}.tmp"
+        with open(tmp_path, "w") as f:
+            for seq in sorted(self._alerts):
+                f.write(json.dumps({"op": "raise", "alert": jsonable_encoder(self._alerts[seq])},
+                                   separators=(",", ":")) + "\n")
+        os.replace(tmp_path, self.log_path)
+
+    # Indexes
+
+    def _insert(self, alert: Alert) -> int:
+        seq = self._next_seq
+        self._next_seq += 1
+        self._alerts[seq] = alert
+        self._seq_by_id[alert.alert_id] = seq
+        self._all.append(seq)
+        self._by_component[alert.component].append(seq)
+        self._by_severity[alert.severity].append(seq)
+        if not alert.resolved:
+            self._open.append(seq)
+            self._open_by_fingerprint[alert_fingerprint(alert)] = seq
+        if len(self._alerts) > self.max_retained * 1.1:
+            self._evict()
+        return seq
+
+    def _mark_resolved(self, seq: int):
+        alert = self._alerts[seq]
+        if alert.resolved:
+            return
+        alert.resolved = True
+        index = bisect_left(self._open, seq)
+        if index < len(self._open) and self._open[index] == seq:
+            self._open.pop(index)
+        fingerprint = alert_fingerprint(alert)
+        if self._open_by_fingerprint.get(fingerprint) == seq:
+            del self._open_by_fingerprint[fingerprint]
+        self._repeat_logged.pop(seq, None)
+        self._unlogged_repeats.discard(seq)
+
+    def _evict(self):
+        """Drop the oldest resolved alerts (then the oldest open ones) and rebuild the indexes"""
+        excess = len(self._alerts) - self.max_retained
+        victims = [seq for seq in self._alerts if self._alerts[seq].resolved][:excess]
+        if len(victims) < excess:
+            victims += [seq for seq in self._alerts if not self._alerts[seq].resolved][:excess - len(victims)]
+        for seq in victims:
+            alert = self._alerts.pop(seq)
+            self._seq_by_id.pop(alert.alert_id, None)
+            self._repeat_logged.pop(seq, None)
+            self._unlogged_repeats.discard(seq)
+
+        self._all = sorted(self._alerts)
+        self._by_component = defaultdict(list)
+        self._by_severity = defaultdict(list)
+        self._open = []
+        self._open_by_fingerprint = {}
+        for seq in self._all:
+            alert = self._alerts[seq]
+            self._by_component[alert.component].append(seq)
+            self._by_severity[alert.severity].append(seq)
+            if not alert.resolved:
+                self._open.append(seq)
+                self._open_by_fingerprint[alert_fingerprint(alert)] = seq
+
+    # Public API
+
+    def raise_alert(self, alert: Alert) -> Tuple[Optional[Alert], str]:
+        """
+        Record an alert; returns the stored alert and what happened to it.
+
+        `deduplicated` means an open alert with the same fingerprint absorbed
+        it; `suppressed` means the component exceeded its rate limit and the
+        alert was only counted.
+        """
+        fingerprint = alert_fingerprint(alert)
+        with self._lock:
+            seq = self._open_by_fingerprint.get(fingerprint)
+            if seq is not None:
+                existing = self._alerts[seq]
+                existing.occurrences += 1
+                existing.last_seen = alert.timestamp
+                self.deduplicated += 1
+
+                now = time.monotonic()
+                if now - self._repeat_logged.get(seq, 0.0) >= REPEAT_LOG_INTERVAL:
+                    self._repeat_logged[seq] = now
+                    self._write_repeat(existing)
+                    self._unlogged_repeats.discard(seq)
+                else:
+                    self._unlogged_repeats.add(seq)
+                return existing, "deduplicated"
+
+            bucket = self._buckets.get(alert.component)
+            if bucket is None:
+                bucket = self._buckets[alert.component] = _TokenBucket(self.rate_per_second, self.burst)
+            if not bucket.take():
+                self.suppressed[alert.component] += 1
+                return None, "suppressed"
+
+            if alert.last_seen is None:
+                alert.last_seen = alert.timestamp
+            self._insert(alert)
+            self._write({"op": "raise", "alert": jsonable_encoder(alert)})
+            return alert, "raised"
+
+    def resolve(self, alert_id: str) -> bool:
+        with self._lock:
+            seq = self._seq_by_id.get(alert_id)
+            if seq is None:
+                return False
+            alert = self._alerts[seq]
+            if not alert.resolved:
+                if seq in self._unlogged_repeats:
+                    self._write_repeat(alert)
+                self._mark_resolved(seq)
+                self._write({"op": "resolve", "alert_id": alert_id})
+            return True
+
+    def get(self, alert_id: str) -> Optional[Alert]:
+        with self._lock:
+            seq = self._seq_by_id.get(alert_id)
+            return self._alerts.get(seq) if seq is not None else None
+
+    def query(self, component: Optional[str] = None, severity: Optional[str] = None,
+              resolved: Optional[bool] = None, cursor: Optional[int] = None,
+              limit: int = 50) -> Tuple[List[Alert], Optional[int]]:
+        """
+        Newest-first page of alerts matching every given filter.
+
+        Scans the most selective index from `cursor` (exclusive) downward and
+        returns the page with the cursor for the next one, or None at the end.
+        """
+        with self._lock:
+            candidates = [self._open if resolved is False else self._all]
+            if component is not None:
+                candidates.append(self._by_component.get(component, []))
+            if severity is not None:
+                candidates.append(self._by_severity.get(severity, []))
+            index = min(candidates, key=len)
+
+            position = bisect_left(index, cursor) if cursor is not None else len(index)
+            page: List[Alert] = []
+            while position > 0 and len(page) <= limit:
+                position -= 1
+                alert = self._alerts.get(index[position])
+                if alert is None:
+                    continue
+                if ((component is None or alert.component == component)
+                        and (severity is None or alert.severity == severity)
+                        and (resolved is None or alert.resolved == resolved)):
+                    page.append(alert)
+
+            if len(page) > limit:
+                page.pop()
+                return page, self._seq_by_id[page[-1].alert_id]
+            return page, None
+
+    @property
+    def open_count(self) -> int:
+        return len(self._open)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "retained": len(self._alerts),
+                "open": len(self._open),
+                "deduplicated": self.deduplicated,
+                "suppressed": dict(self.suppressed)
+            }
+
+    def close(self):
+        """Persist pending occurrence counts and close the log"""
+        with self._lock:
+            for seq in sorted(self._unlogged_repeats):
+                self._write_repeat(self._alerts[seq])
+            self._unlogged_repeats.clear()
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+        if self._log_lock is not None:
+            os.close(self._log_lock)
+            self._log_lock = None
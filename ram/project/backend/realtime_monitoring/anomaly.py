@@ -0,0 +1,140 @@
+"""
+Streaming anomaly detection over monitor series.
+
+Every series gets one row of NumPy state, and each update checks all rows
+at once with three O(1) detectors:
+
+- EWMA z-score: distance from a one-step forecast, in exponentially
+  weighted standard deviations of past forecast errors. The forecast
+  smooths level and trend (Holt) and corrects for how much each error
+  carries into the next, so steady trends and wandering series do not
+  alarm; breaks from them do.
+- CUSUM: accumulated standardized drift, which catches sustained level
+  shifts too small for a single z-score to flag.
+- Rate of change: relative jump from the previous observation, when it
+  also stands out from the series' noise.
+
+Counter series (running totals) are converted to per-second rates first.
+"""
+import numpy as np
+from typing import Any, Callable, Dict, List, Optional
+
+LEVEL_ALPHA = 0.1
+TREND_BETA = 0.05
+VARIANCE_ALPHA = 0.05
+MIN_RELATIVE_STD = 0.01  # Noise floor, so a series that sat flat for a while is not alarmed by its first wobble
+Z_WARNING = 4.0
+Z_CRITICAL = 8.0
+CUSUM_SLACK = 0.5  # Drift per sample, in standard deviations, that is ignored
+CUSUM_THRESHOLD = 8.0
+RATE_OF_CHANGE_THRESHOLD = 0.5  # Relative jump between consecutive observations
+RATE_OF_CHANGE_MIN_Z = 3.0  # ...that must also stand out from the series' noise
+WARMUP_SAMPLES = 20
+COOLDOWN_SECONDS = 60.0
+
+_STATE_FIELDS = ("level", "trend", "var", "error_cov", "last_error", "cusum_pos", "cusum_neg",
+                 "last_raw", "last_obs", "last_time",
+                 "samples", "observations", "cooldown_until")
+
+class AnomalyDetector:
+    def __init__(self, is_counter: Optional[Callable[[str], bool]] = None, capacity: int = 64):
+        self.is_counter = is_counter or (lambda name: False)
+        self.index: Dict[str, int] = {}
+        self.names: List[str] = []
+        self.counter = np.zeros(capacity, dtype=bool)
+        self.state = {field: np.zeros(capacity) for field in _STATE_FIELDS}
+
+    def _rows(self, names: List[str]) -> np.ndarray:
+        for name in names:
+            if name not in self.index:
+                row = len(self.names)
+                if row == len(self.counter):
+                    self.counter = np.concatenate([self.counter, np.zeros(row, dtype=bool)])
+                    self.state = {field: np.concatenate([column, np.zeros(row)]) for field, column in self.state.items()}
+                self.index[name] = row
+                self.names.append(name)
+                self.counter[row] = self.is_counter(name)
+        return np.fromiter((self.index[name] for name in names), dtype=np.int64, count=len(names))
+
+    def update(self, values: Dict[str, float], now: float) -> List[Dict[str, Any]]:
+        """Feed the latest value of each series; returns one detection per anomalous series"""
+        if not values:
+            return []
+        rows = self._rows(list(values))
+        raw = np.fromiter(values.values(), dtype=float, count=len(values))
+        s = self.state
+
+        counter = self.counter[rows]
+        primed = s["samples"][rows] > 0
+        elapsed = np.maximum(now - s["last_time"][rows], 1e-6)
+        observed = np.where(counter, (raw - s["last_raw"][rows]) / elapsed, raw)
+        s["last_raw"][rows] = raw
+        s["last_time"][rows] = now
+        s["samples"][rows] += 1
+
+        # A counter's first sample only primes its rate
+        valid = ~counter | primed
+        rows, observed, counter = rows[valid], observed[valid], counter[valid]
+        if not len(rows):
+            return []
+
+        level, trend, var = s["level"][rows], s["trend"][rows], s["var"][rows]
+        observations = s["observations"][rows]
+        first = observations == 0
+        warm = observations >= WARMUP_SAMPLES
+        smoothed = level + trend
+        error = np.where(first, 0.0, observed - smoothed)
+        # Lag-1 correlation of errors; CUSUM assumes independent samples
+        last_error = s["last_error"][rows]
+        carry = np.clip(s["error_cov"][rows] / np.maximum(var, 1e-12), 0.0, 0.95)
+        expected = smoothed + carry * last_error
+        residual = np.where(first, 0.0, observed - expected)
+        std = np.maximum(np.sqrt(var * (1 - carry ** 2)), np.maximum(MIN_RELATIVE_STD * np.abs(expected), 1e-6))
+        z = residual / std
+
+        bounded = np.clip(z, -10, 10)
+        # Drift only accumulates once the noise estimate has settled
+        cusum_pos = np.where(warm, np.maximum(0.0, s["cusum_pos"][rows] + bounded - CUSUM_SLACK), 0.0)
+        cusum_neg = np.where(warm, np.maximum(0.0, s["cusum_neg"][rows] - bounded - CUSUM_SLACK), 0.0)
+
+        previous = s["last_obs"][rows]
+        change = np.where(first, 0.0, (observed - previous) / np.maximum(np.abs(previous), 1e-6))
+
+        z_flag = warm & (np.abs(z) > Z_WARNING)
+        cusum_flag = warm & ((cusum_pos > CUSUM_THRESHOLD) | (cusum_neg > CUSUM_THRESHOLD))
+        change_flag = warm & (np.abs(change) > RATE_OF_CHANGE_THRESHOLD) & (np.abs(z) > RATE_OF_CHANGE_MIN_Z)
+        flagged = (z_flag | cusum_flag | change_flag) & (now >= s["cooldown_until"][rows])
+
+        new_level = np.where(first, observed, smoothed + LEVEL_ALPHA * error)
+        s["trend"][rows] = np.where(first, 0.0, trend + TREND_BETA * (new_level - level - trend))
+        s["level"][rows] = new_level
+        # Plain running means during warm-up, exponential afterwards
+        weight = np.maximum(VARIANCE_ALPHA, 1.0 / np.maximum(observations, 1.0))
+        s["var"][rows] = np.where(first, 0.0, var + weight * (error ** 2 - var))
+        s["error_cov"][rows] = np.where(first, 0.0, s["error_cov"][rows] + weight * (error * last_error - s["error_cov"][rows]))
+        s["last_error"][rows] = error
+        s["cusum_pos"][rows] = np.where(cusum_flag, 0.0, cusum_pos)
+        s["cusum_neg"][rows] = np.where(cusum_flag, 0.0, cusum_neg)
+        s["last_obs"][rows] = observed
+        s["observations"][rows] += 1
+        s["cooldown_until"][rows[flagged]] = now + COOLDOWN_SECONDS
+
+        detections = []
+        for k in np.flatnonzero(flagged):
+            if z_flag[k]:
+                detector, score = "z-score", z[k]
+            elif cusum_flag[k]:
+                detector, score = "cusum", cusum_pos[k] if cusum_pos[k] > cusum_neg[k] else -cusum_neg[k]
+            else:
+                detector, score = "rate-of-change", change[k]
+            critical = abs(z[k]) > Z_CRITICAL or abs(change[k]) > 2 * RATE_OF_CHANGE_THRESHOLD
+            detections.append({
+                "series": self.names[rows[k]],
+                "detector": detector,
+                "severity": "critical" if critical else "warning",
+                "value": float(observed[k]),
+                "expected": float(expected[k]),
+                "score": float(score),
+                "rate": bool(counter[k])
+            })
+        return detections
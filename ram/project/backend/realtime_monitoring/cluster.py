@@ -0,0 +1,190 @@
+"""
+Leader election and cross-worker fan-out for the monitoring service.
+
+Exactly one worker holds the leader lease and does the state work: ticking
+the monitor, alerting and folding telemetry. Each frame it publishes goes
+to every worker over pub/sub, and every worker (the leader included) fans
+it out to its own WebSocket clients. Adding workers therefore adds
+connection capacity without repeating the tick. Reads that need the
+leader's state and all mutations travel as commands on a shared channel,
+answered on a per-worker reply channel.
+A subscription that fails is re-established
+with backoff, so a pub/sub outage pauses the cluster instead of silently
+stopping it.
+"""
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import asyncio
+import inspect
+import json
+import os
+import socket
+import uuid
+import logging
+from .publisher import MonitoringPublisher, TickFrame
+
+logger = logging.getLogger(__name__)
+
+LEADER_KEY = "monitoring:leader"
+LATEST_FRAME_KEY = "monitoring:latest_frame"
+FRAMES_CHANNEL = "monitoring:frames"
+COMMANDS_CHANNEL = "monitoring:commands"
+LEASE_SECONDS = 10.0
+RPC_TIMEOUT_SECONDS = 5.0
+RESUBSCRIBE_MIN_SECONDS = 0.5  # Backoff after a subscription fails, doubling up to the max
+RESUBSCRIBE_MAX_SECONDS = 10.0
+
+class LeaderUnavailable(Exception):
+    pass
+
+class MonitoringCoordinator:
+    def __init__(self, backend, publisher: MonitoringPublisher,
+                 on_leadership: Callable[[bool], Awaitable[None]], worker_id: Optional[str] = None):
+        self.backend = backend
+        self.publisher = publisher
+        self.on_leadership = on_leadership
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.is_leader = False
+        self.handlers: Dict[str, Callable[..., Any]] = {}
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def acts_locally(self) -> bool:
+        """The leader, or a coordinator that was never started, serves commands itself"""
+        return self.is_leader or not self._tasks
+
+    @property
+    def reply_channel(self) -> str:
+        return f"monitoring:reply:{self.worker_id}"
+
+    def register(self, command: str, handler: Callable[..., Any]):
+        """Handler run on the leader; sync or async, returning JSON-compatible data"""
+        self.handlers[command] = handler
+
+    async def start(self):
+        self.publisher.forward = self._publish_frame
+        latest = await self.backend.get(LATEST_FRAME_KEY)
+        if latest:
+            self.publisher.adopt(TickFrame.from_wire(latest))
+
+        self._tasks = [
+            asyncio.create_task(self._listen(FRAMES_CHANNEL, self._on_frame)),
+            asyncio.create_task(self._listen(COMMANDS_CHANNEL, self._on_command)),
+            asyncio.create_task(self._listen(self.reply_channel, self._on_reply)),
+            asyncio.create_task(self._hold_lease())
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self.is_leader:
+            self.is_leader = False
+            await self.on_leadership(False)
+            await self.backend.release_lease(LEADER_KEY, self.worker_id)
+
+    # Leadership and frames
+
+    async def _hold_lease(self):
+        loop = asyncio.get_running_loop()
+        expires = 0.0
+        while True:
+            attempted = loop.time()
+            try:
+                acquired = await self.backend.acquire_lease(LEADER_KEY, self.worker_id, LEASE_SECONDS)
+                if acquired:
+                    expires = attempted + LEASE_SECONDS
+            except Exception as e:
+                logger.error(f"Monitoring lease check failed: {e}")
+                # No other worker can take the lease before it expires, so keep leading until the next
+                # check would come too late
+                acquired = self.is_leader and loop.time() + LEASE_SECONDS / 3 < expires
+            if acquired != self.is_leader:
+                self.is_leader = acquired
+                logger.info(f"Worker {self.worker_id} {'is now' if acquired else 'is no longer'} monitoring leader")
+                await self.on_leadership(acquired)
+            await asyncio.sleep(LEASE_SECONDS / 3)
+
+    async def _publish_frame(self, frame: TickFrame):
+        data = frame.to_wire()
+        await self.backend.set(LATEST_FRAME_KEY, data)
+        await self.backend.publish(FRAMES_CHANNEL, data)
+
+    async def _listen(self, channel: str, handle: Callable[[bytes], Awaitable[None]]):
+        """Feed a channel's messages to `handle`, resubscribing with backoff when the subscription fails"""
+        delay = RESUBSCRIBE_MIN_SECONDS
+        while True:
+            try:
+                async for data in self.backend.subscribe(channel):
+                    delay = RESUBSCRIBE_MIN_SECONDS
+                    try:
+                        await handle(data)
+                    except Exception as e:
+                        logger.error(f"Dropped monitoring message on {channel}: {e}")
+                logger.error(f"Subscription to {channel} ended, resubscribing in {delay:.1f}s")
+            except Exception as e:
+                logger.error(f"Subscription to {channel} failed, resubscribing in {delay:.1f}s: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RESUBSCRIBE_MAX_SECONDS)
+
+    async def _on_frame(self, data: bytes):
+        self.publisher.adopt(TickFrame.from_wire(data))
+
+    # Commands
+
+    async def _execute(self, command: str, args: Dict[str, Any]) -> Any:
+        result = self.handlers[command](**args)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+    async def call(self, command: str, **args) -> Any:
+        """Run a command on the leader and return its result"""
+        if self.acts_locally:
+            return await self._execute(command, args)
+
+        request_id = uuid.uuid4().hex
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            try:
+                await self.backend.publish(COMMANDS_CHANNEL, json.dumps({
+                    "id": request_id, "reply_to": self.reply_channel, "command": command, "args": args
+                }).encode())
+            except Exception as e:
+                raise LeaderUnavailable(f"Could not send '{command}' to the monitoring leader: {e}")
+            return await asyncio.wait_for(future, RPC_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            raise LeaderUnavailable(f"No monitoring leader answered '{command}'")
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def send(self, command: str, **args):
+        """Run a command on the leader without waiting for a result; it is lost if there is no leader"""
+        if self.acts_locally:
+            await self._execute(command, args)
+        else:
+            await self.backend.publish(COMMANDS_CHANNEL, json.dumps({"command": command, "args": args}).encode())
+
+    async def _on_command(self, data: bytes):
+        if not self.is_leader:
+            return
+        message = json.loads(data)
+        try:
+            reply = {"id": message.get("id"), "result": await self._execute(message["command"], message["args"])}
+        except Exception as e:
+            logger.error(f"Monitoring command '{message.get('command')}' failed: {e}")
+            reply = {"id": message.get("id"), "error": str(e)}
+        if message.get("reply_to"):
+            await self.backend.publish(message["reply_to"], json.dumps(reply).encode())
+
+    async def _on_reply(self, data: bytes):
+        reply = json.loads(data)
+        future = self._pending.get(reply["id"])
+        if future is None or future.done():
+            return
+        if "error" in reply:
+            future.set_exception(RuntimeError(reply["error"]))
+        else:
+            future.set_result(reply["result"])
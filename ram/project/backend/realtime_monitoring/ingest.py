@@ -0,0 +1,156 @@
+"""
+Batched telemetry ingestion for the monitoring service.
+
+Producers send columnar batches, one array per series:
+
+    {"series": {"component.route_optimizer.latency_ms": {"values": [41, 44], "timestamps": [1718000000.1, 1718000000.6]},
+                "region.north_texas.orders_processed": {"values": [15321]}}}
+
+Timestamps are Unix seconds and default to the receive time. Parsed batches
+are queued and a single consumer folds everything queued so far into the
+history store and the monitor's live state, one vectorized append per series.
+"""
+import numpy as np
+from collections import deque
+from typing import Callable, Dict, Optional, Tuple
+import asyncio
+import json
+import time
+import logging
+from .timeseries import TimeSeriesStore
+
+logger = logging.getLogger(__name__)
+
+INGEST_QUEUE_BATCHES = 1024
+RATE_WINDOW_SECONDS = 10.0
+
+# series name -> (timestamps, values)
+TelemetryBatch = Dict[str, Tuple[np.ndarray, np.ndarray]]
+
+def parse_telemetry(body: bytes, received_at: Optional[float] = None) -> TelemetryBatch:
+    """Parse and validate one columnar batch; raises ValueError on malformed input"""
+    try:
+        payload = json.loads(body)
+        series = payload["series"]
+    except (ValueError, TypeError, KeyError):
+        raise ValueError("expected a JSON object with a 'series' mapping")
+    if not isinstance(series, dict):
+        raise ValueError("'series' must map series names to value arrays")
+
+    received_at = received_at if received_at is not None else time.time()
+    batch: TelemetryBatch = {}
+    for name, points in series.items():
+        try:
+            values = np.asarray(points["values"], dtype=np.float64)
+            timestamps = (np.asarray(points["timestamps"], dtype=np.float64)
+                          if points.get("timestamps") is not None else np.full(len(values), received_at))
+        except (TypeError, KeyError, ValueError, AttributeError):
+            raise ValueError(f"series '{name}' needs a numeric 'values' array")
+        if values.ndim != 1 or timestamps.shape != values.shape:
+            raise ValueError(f"series '{name}' has {len(timestamps)} timestamps for {len(values)} values")
+        if len(values) and not (np.isfinite(values).all() and np.isfinite(timestamps).all()):
+            raise ValueError(f"series '{name}' contains non-finite numbers")
+        if len(values):
+            batch[name] = (timestamps, values)
+    return batch
+
+class TelemetryIngestor:
+    """
+    Bounded queue of parsed batches drained by one folding task.
+
+    `apply_latest` receives the newest value of every series touched by a
+    micro-batch, so the monitor's current state is updated once per series
+    rather than once per point.
+    """
+
+    def __init__(self, history: TimeSeriesStore, apply_latest: Callable[[Dict[str, float]], None],
+                 max_batches: int = INGEST_QUEUE_BATCHES):
+        self.history = history
+        self.apply_latest = apply_latest
+        self.queue: "asyncio.Queue[TelemetryBatch]" = asyncio.Queue(maxsize=max_batches)
+        self.points_total = 0
+        self.batches_total = 0
+        self.folds_total = 0
+        self.rejected_batches = 0
+        self._rate_window = deque()  # (monotonic time, points folded)
+        self._task: Optional[asyncio.Task] = None
+
+    def submit_nowait(self, batch: TelemetryBatch) -> int:
+        """Queue a batch without waiting; raises asyncio.QueueFull when the consumer is behind"""
+        try:
+            self.queue.put_nowait(batch)
+        except asyncio.QueueFull:
+            self.rejected_batches += 1
+            raise
+        return sum(len(values) for _, values in batch.values())
+
+    async def submit(self, batch: TelemetryBatch) -> int:
+        """Queue a batch, waiting for room; used by streaming producers for backpressure"""
+        await self.queue.put(batch)
+        return sum(len(values) for _, values in batch.values())
+
+    def fold(self, batches: list):
+        """Merge queued batches per series and apply them in one pass"""
+        merged: Dict[str, list] = {}
+        for batch in batches:
+            for name, columns in batch.items():
+                merged.setdefault(name, []).append(columns)
+
+        latest: Dict[str, float] = {}
+        points = 0
+        for name, parts in merged.items():
+            if len(parts) == 1:
+                timestamps, values = parts[0]
+            else:
+                timestamps = np.concatenate([t for t, _ in parts])
+                values = np.concatenate([v for _, v in parts])
+            self.history.append(name, timestamps, values)
+            latest[name] = float(values[np.argmax(timestamps)])
+            points += len(values)
+
+        self.apply_latest(latest)
+        self.points_total += points
+        self.batches_total += len(batches)
+        self.folds_total += 1
+        self._rate_window.append((time.monotonic(), points))
+
+    @property
+    def points_per_second(self) -> float:
+        cutoff = time.monotonic() - RATE_WINDOW_SECONDS
+        while self._rate_window and self._rate_window[0][0] < cutoff:
+            self._rate_window.popleft()
+        return sum(points for _, points in self._rate_window) / RATE_WINDOW_SECONDS
+
+    async def _run(self):
+        while True:
+            batches = [await self.queue.get()]
+            while not self.queue.empty():
+                batches.append(self.queue.get_nowait())
+            try:
+                self.fold(batches)
+            except Exception as e:
+                logger.error(f"Telemetry fold of {len(batches)} batches failed: {e}")
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "points_per_second": self.points_per_second,
+            "points_total": self.points_total,
+            "batches_total": self.batches_total,
+            "micro_batches": self.folds_total,
+            "queued_batches": self.queue.qsize(),
+            "rejected_batches": self.rejected_batches,
+            "late_samples": sum(series.late_samples for series in self.history.series.values())
+        }
@@ -0,0 +1,183 @@
+"""
+Request instrumentation for the API process itself.
+
+`RequestMetricsMiddleware` times every HTTP request. It records Prometheus
+series (latency histogram, request counter, in-flight gauge) labelled by
+route template, and keeps a short in-memory window per supply-chain
+component that RealTimeMonitor turns into live p50/p99, throughput and
+error-rate values for the dashboard.
+"""
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+from fastapi import Response
+from typing import Dict, List, Optional
+import numpy as np
+import threading
+import time
+
+WINDOW_SECONDS = 60.0
+WINDOW_CAPACITY = 4096  # Most recent requests kept per component for percentiles
+
+# URL prefix -> component_id shown on the monitoring dashboard
+ROUTE_COMPONENTS = (
+    ("/forecast", "demand_forecast"),
+    ("/inventory", "inventory_mgmt"),
+    ("/route", "route_optimizer"),
+)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ["method", "route", "status"]
+)
+REQUEST_ERRORS = Counter(
+    "http_request_errors_total", "HTTP requests answered with a 5xx status", ["method", "route"]
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "HTTP requests currently being handled", ["component"]
+)
+
+def component_for_path(path: str) -> Optional[str]:
+    for prefix, component_id in ROUTE_COMPONENTS:
+        if path == prefix or path.startswith(prefix + "/"):
+            return component_id
+    return None
+
+class ComponentWindow:
+    """Ring of recent (finish time, duration, error) samples for one component"""
+
+    def __init__(self, capacity: int = WINDOW_CAPACITY):
+        self.finished_at = np.zeros(capacity)
+        self.durations = np.zeros(capacity)
+        self.errors = np.zeros(capacity, dtype=bool)
+        self.capacity = capacity
+        self.head = 0
+        self.size = 0
+        self.in_flight = 0
+
+    def record(self, finished_at: float, duration: float, error: bool):
+        self.finished_at[self.head] = finished_at
+        self.durations[self.head] = duration
+        self.errors[self.head] = error
+        self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def summary(self, now: float) -> Optional[Dict[str, float]]:
+        """Window statistics, or None when the component has had no traffic in the window"""
+        recent = self.finished_at[:self.size] >= now - WINDOW_SECONDS
+        count = int(recent.sum())
+        if not count:
+            return None
+
+        finished_at = self.finished_at[:self.size][recent]
+        p50, p99 = np.percentile(self.durations[:self.size][recent], [50, 99]) * 1000
+        # Under heavy load a full ring holds less than the window; rate over what it holds
+        span = WINDOW_SECONDS if self.size < self.capacity else max(now - finished_at.min(), 1e-3)
+        return {
+            "latency_ms": float(p50),
+            "latency_p99_ms": float(p99),
+            "throughput": count / span,
+            "error_rate": float(self.errors[:self.size][recent].mean()),
+            "in_flight": self.in_flight
+        }
+
+class RequestTimings:
+    def __init__(self):
+        self.windows = {component_id: ComponentWindow() for _, component_id in ROUTE_COMPONENTS}
+        self._lock = threading.Lock()
+
+    def start(self, component_id: str):
+        with self._lock:
+            self.windows[component_id].in_flight += 1
+
+    def finish(self, component_id: str, duration: float, error: bool):
+        with self._lock:
+            window = self.windows[component_id]
+            window.in_flight -= 1
+            window.record(time.monotonic(), duration, error)
+
+    def component_values(self) -> Dict[str, float]:
+        """Live series values for components that served requests in the last window"""
+        now = time.monotonic()
+        values = {}
+        with self._lock:
+            for component_id, window in self.windows.items():
+                summary = window.summary(now)
+                if summary is None and window.in_flight:
+                    summary = {"in_flight": window.in_flight}
+                for field, value in (summary or {}).items():
+                    values[f"component.{component_id}.{field}"] = value
+        return values
+
+request_timings = RequestTimings()
+
+def merge_component_values(reports: List[Dict[str, float]]) -> Dict[str, float]:
+    """
+    Combine component values reported by several workers.
+
+    Throughput and in-flight counts add up, error rate and p50 are weighted by
+    each worker's throughput, and p99 takes the worst worker.
+    """
+    if len(reports) == 1:
+        return reports[0]
+
+    by_series: Dict[str, List[Dict[str, float]]] = {}
+    for report in reports:
+        per_component: Dict[str, Dict[str, float]] = {}
+        for name, value in report.items():
+            prefix, field = name.rsplit(".", 1)
+            per_component.setdefault(prefix, {})[field] = value
+        for prefix, fields in per_component.items():
+            by_series.setdefault(prefix, []).append(fields)
+
+    merged = {}
+    for prefix, parts in by_series.items():
+        weights = np.array([part.get("throughput", 0.0) for part in parts])
+        merged[f"{prefix}.in_flight"] = sum(part.get("in_flight", 0) for part in parts)
+        if weights.sum() <= 0:
+            continue
+        merged[f"{prefix}.throughput"] = float(weights.sum())
+        for field in ("latency_ms", "error_rate"):
+            values = np.array([part.get(field, 0.0) for part in parts])
+            merged[f"{prefix}.{field}"] = float(np.average(values, weights=weights))
+        merged[f"{prefix}.latency_p99_ms"] = max(part.get("latency_p99_ms", 0.0) for part in parts)
+    return merged
+
+class RequestMetricsMiddleware:
+    """Pure ASGI middleware, so timing adds no extra task or body buffering per request"""
+
+    def __init__(self, app, timings: RequestTimings = request_timings):
+        self.app = app
+        self.timings = timings
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        component_id = component_for_path(scope["path"])
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        if component_id:
+            self.timings.start(component_id)
+            REQUESTS_IN_FLIGHT.labels(component_id).inc()
+        start_time = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start_time
+            route = scope.get("route")
+            route_label = route.path if route is not None else "unmatched"
+            method = scope["method"]
+            REQUEST_LATENCY.labels(method, route_label, str(status_code)).observe(duration)
+            if status_code >= 500:
+                REQUEST_ERRORS.labels(method, route_label).inc()
+            if component_id:
+                REQUESTS_IN_FLIGHT.labels(component_id).dec()
+                self.timings.finish(component_id, duration, status_code >= 500)
+
+def metrics_response() -> Response:
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
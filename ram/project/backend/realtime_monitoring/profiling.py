@@ -0,0 +1,273 @@
+"""
+Per-request timing spans and opt-in sampling profiles.
+
+Every request gets a span record in a context variable. Code wraps its
+internal phases in `span("inference")` and similar; the durations are
+summed per name, returned in a `Server-Timing` header and observed in a
+Prometheus histogram. Routes built with `ProfiledRoute` additionally split
+each request into `parse` (body read and validation), `handler` and
+`serialize` (response model conversion and JSON encoding). Spans from the
+threadpool land in the same record because context is copied into worker
+threads. Nested spans are each timed in full, so their durations overlap.
+
+With ENABLE_PROFILING set, a request carrying `X-Profile: 1` or
+`?profile=1` is also sampled by a background thread. The profile is
+written to PROFILE_DIR as collapsed stacks (for flamegraph.pl) and as a
+speedscope document. Its id is returned in the `X-Profile-Id` header.
+"""
+from fastapi.routing import APIRoute
+from prometheus_client import Histogram
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import asyncio
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+
+PROFILING_ENABLED = os.getenv("ENABLE_PROFILING", "").lower() in ("1", "true", "yes")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "/tmp/api_profiles")
+SAMPLE_INTERVAL_SECONDS = 0.002
+
+REQUEST_PHASE_LATENCY = Histogram(
+    "http_request_phase_duration_seconds", "Time spent in named phases of a request", ["route", "phase"]
+)
+
+# Leaf frames of threads that are waiting rather than working
+_IDLE_MODULES = tuple(os.sep + name for name in ("threading.py", "selectors.py", "queue.py", "thread.py"))
+
+class RequestSpans:
+    __slots__ = ("durations", "handler_started", "handler_finished")
+
+    def __init__(self):
+        self.durations: Dict[str, float] = {}
+        self.handler_started: Optional[float] = None
+        self.handler_finished: Optional[float] = None
+
+    def add(self, name: str, seconds: float):
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+
+_current_spans: ContextVar[Optional[RequestSpans]] = ContextVar("request_spans", default=None)
+
+@contextmanager
+def span(name: str):
+    """Time a block into the current request's `name` span; a no-op outside requests"""
+    spans = _current_spans.get()
+    if spans is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        spans.add(name, time.perf_counter() - start)
+
+def _timed_endpoint(endpoint: Callable[..., Any]) -> Callable[..., Any]:
+    def mark(started: bool):
+        spans = _current_spans.get()
+        if spans is not None:
+            if started:
+                spans.handler_started = time.perf_counter()
+            else:
+                spans.handler_finished = time.perf_counter()
+
+    if asyncio.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            mark(True)
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                mark(False)
+    else:
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            mark(True)
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                mark(False)
+    return wrapper
+
+class ProfiledRoute(APIRoute):
+    """APIRoute that marks where the endpoint body starts and ends"""
+
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs):
+        super().__init__(path, _timed_endpoint(endpoint), **kwargs)
+
+class StackSampler:
+    """
+    Background thread that counts the Python stacks of every busy thread.
+
+    CPU-bound handlers hold the GIL, so samples arrive less often than
+    `interval`; each sample is weighted by the wall time since the previous
+    one, which keeps speedscope durations true to the request.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL_SECONDS):
+        self.interval = interval
+        self.stacks: Counter = Counter()  # (thread name, ((function, file, line), ...)) -> samples
+        self.seconds: Counter = Counter()  # same keys -> wall time attributed
+        self.samples = 0
+        self.started_at = 0.0
+        self.elapsed = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.elapsed = time.perf_counter() - self.started_at
+
+    def _run(self):
+        own_id = threading.get_ident()
+        last_sample = self.started_at
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            weight, last_sample = now - last_sample, now
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or frame.f_code.co_filename.endswith(_IDLE_MODULES):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_qualname, code.co_filename, code.co_firstlineno))
+                    frame = frame.f_back
+                key = (names.get(thread_id, str(thread_id)), tuple(reversed(stack)))
+                self.stacks[key] += 1
+                self.seconds[key] += weight
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        """One `thread;root;...;leaf count` line per distinct stack"""
+        lines = []
+        for (thread_name, stack), count in self.stacks.most_common():
+            frames = ";".join(f"{name} ({os.path.basename(filename)}:{line})" for name, filename, line in stack)
+            lines.append(f"{thread_name};{frames} {count}")
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self, name: str) -> Dict[str, Any]:
+        """Sampled profile per thread in speedscope's file format, weights in milliseconds"""
+        frame_index: Dict[Tuple[str, str, int], int] = {}
+        frames: List[Dict[str, Any]] = []
+        by_thread: Dict[str, Tuple[List[List[int]], List[float]]] = {}
+        for (thread_name, stack), seconds in self.seconds.items():
+            indices = []
+            for frame in stack:
+                if frame not in frame_index:
+                    frame_index[frame] = len(frames)
+                    frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+                indices.append(frame_index[frame])
+            samples, weights = by_thread.setdefault(thread_name, ([], []))
+            samples.append(indices)
+            weights.append(seconds * 1000)
+
+        total_ms = self.elapsed * 1000
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "realtime_monitoring.profiling",
+            "shared": {"frames": frames},
+            "profiles": [
+                {"type": "sampled", "name": thread_name, "unit": "milliseconds",
+                 "startValue": 0, "endValue": max(total_ms, sum(weights)), "samples": samples, "weights": weights}
+                for thread_name, (samples, weights) in by_thread.items()
+            ]
+        }
+
+def _profile_requested(scope) -> bool:
+    if any(key == b"x-profile" and value not in (b"", b"0") for key, value in scope["headers"]):
+        return True
+    query = scope.get("query_string", b"")
+    return any(part in (b"profile=1", b"profile=true") for part in query.split(b"&"))
+
+def _save_profile(sampler: StackSampler, profile_id: str, name: str):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with open(os.path.join(PROFILE_DIR, f"{profile_id}.collapsed"), "w") as f:
+        f.write(sampler.collapsed())
+    with open(os.path.join(PROFILE_DIR, f"{profile_id}.speedscope.json"), "w") as f:
+        json.dump(sampler.speedscope(name), f)
+
+def profile_path(profile_id: str, fmt: str) -> Optional[str]:
+    """File holding a stored profile, or None when it does not exist"""
+    if not profile_id.isalnum():
+        return None
+    path = os.path.join(PROFILE_DIR, f"{profile_id}.{'speedscope.json' if fmt == 'speedscope' else 'collapsed'}")
+    return path if os.path.exists(path) else None
+
+def _server_timing(durations: Dict[str, float]) -> bytes:
+    return ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in durations.items()).encode()
+
+class ProfilingMiddleware:
+    """
+    Pure ASGI middleware that opens the span record for each HTTP request.
+
+    Spans finished before the response starts go into `Server-Timing`;
+    spans of streamed responses still reach the histogram.
+    """
+
+    def __init__(self, app, profiling_enabled: bool = PROFILING_ENABLED):
+        self.app = app
+        self.profiling_enabled = profiling_enabled
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        spans = RequestSpans()
+        token = _current_spans.set(spans)
+        sampler = None
+        profile_id = None
+        if self.profiling_enabled and _profile_requested(scope):
+            sampler = StackSampler()
+            profile_id = uuid.uuid4().hex
+            sampler.start()
+        start_time = time.perf_counter()
+
+        def split_phases(now: float):
+            if spans.handler_started is not None:
+                spans.durations.setdefault("parse", spans.handler_started - start_time)
+                if spans.handler_finished is not None:
+                    spans.durations.setdefault("handler", spans.handler_finished - spans.handler_started)
+                    spans.durations.setdefault("serialize", now - spans.handler_finished)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                now = time.perf_counter()
+                split_phases(now)
+                timings = dict(spans.durations, total=now - start_time)
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", _server_timing(timings)))
+                if profile_id is not None:
+                    headers.append((b"x-profile-id", profile_id.encode()))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_spans.reset(token)
+            route = scope.get("route")
+            route_label = route.path if route is not None else "unmatched"
+            for phase, seconds in spans.durations.items():
+                REQUEST_PHASE_LATENCY.labels(route_label, phase).observe(seconds)
+            if sampler is not None:
+                sampler.stop()
+                try:
+                    _save_profile(sampler, profile_id, f"{scope['method']} {scope['path']}")
+                except Exception as e:
+                    logger.error(f"Failed to save profile {profile_id}: {e}")
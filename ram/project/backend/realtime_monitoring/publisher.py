@@ -0,0 +1,280 @@
+from fastapi import WebSocket
+from fastapi.encoders import jsonable_encoder
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+import asyncio
+import json
+import uuid
+import zlib
+import logging
+from common.serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+TICK_SECONDS = 2.0
+SEND_QUEUE_SIZE = 4  # Messages buffered per client before the oldest is dropped
+EVENT_STREAM_KEEPALIVE_SECONDS = 15.0  # Comment lines that keep idle proxies from closing SSE streams
+
+PROTOCOLS = ("full", "delta")
+ENCODINGS = ("json", "binary")
+ID_FIELDS = ("alert_id", "component_id", "region_id", "metric_name")
+
+def _same_ids(prev: List[Any], curr: List[Any]) -> bool:
+    """Whether two lists hold the same identified records in the same order"""
+    for a, b in zip(prev, curr):
+        if isinstance(a, dict) and isinstance(b, dict):
+            for field in ID_FIELDS:
+                if a.get(field) != b.get(field):
+                    return False
+    return True
+
+def diff_state(prev: Any, curr: Any, path: str = "", out: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Changed values between two JSON-compatible states, keyed by `/`-separated path.
+
+    Dicts with the same keys and lists with the same length and record ids are
+    diffed element-wise; anything else that changed is replaced whole at its
+    path. Applying every `path -> value` pair to `prev` yields `curr`.
+    """
+    if out is None:
+        out = {}
+    if isinstance(prev, dict) and isinstance(curr, dict) and prev.keys() == curr.keys():
+        for key, value in curr.items():
+            diff_state(prev[key], value, f"{path}/{key}", out)
+    elif (isinstance(prev, list) and isinstance(curr, list) and len(prev) == len(curr)
+          and _same_ids(prev, curr)):
+        for index, (a, b) in enumerate(zip(prev, curr)):
+            diff_state(a, b, f"{path}/{index}", out)
+    elif prev != curr:
+        out[path or "/"] = curr
+    return out
+
+class TickFrame:
+    """
+    Everything published for one tick, encoded lazily and at most once per format.
+
+    `full` is the plain dashboard document; `snapshot` and `patch` are the
+    versioned delta protocol messages. Binary encoding is zlib-compressed
+    compact JSON sent as a WebSocket binary frame. `body` holds the HTTP
+    response bodies, so polling endpoints serve the same bytes until the
+    next tick.
+
+    `epoch` names the run of publishers the version belongs to; it survives
+    leader changes but not a restart of every worker, so `etag` never
+    repeats for different state.
+    """
+
+    def __init__(self, version: int, state: Dict[str, Any], patch: Optional[Dict[str, Any]], epoch: str = ""):
+        self.version = version
+        self.state = state
+        self.patch = patch
+        self.epoch = epoch
+        self._encoded: Dict[Tuple[str, Optional[str]], Union[str, bytes]] = {}
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.epoch}-{self.version}"'
+
+    def encoded(self, kind: str, encoding: str = "json") -> Union[str, bytes]:
+        key = (kind, encoding)
+        if key not in self._encoded:
+            if kind == "full":
+                payload = self.state
+            elif kind == "snapshot":
+                payload = {"type": "snapshot", "version": self.version, "data": self.state}
+            else:
+                payload = {"type": "patch", "version": self.version, "base": self.version - 1, "set": self.patch}
+
+            data = dumps(payload)
+            self._encoded[key] = zlib.compress(data) if encoding == "binary" else data.decode()
+        return self._encoded[key]
+
+    def body(self, section: Optional[str] = None) -> bytes:
+        """JSON bytes of the whole state or one top-level section of it"""
+        key = ("body", section)
+        if key not in self._encoded:
+            if section is None:
+                self._encoded[key] = self.encoded("full").encode()
+            else:
+                self._encoded[key] = dumps(self.state[section])
+        return self._encoded[key]
+
+    def to_wire(self) -> bytes:
+        """Frame as sent between workers, so followers never re-diff the state"""
+        return dumps({"version": self.version, "epoch": self.epoch, "state": self.state, "patch": self.patch})
+
+    @classmethod
+    def from_wire(cls, data: bytes) -> "TickFrame":
+        message = json.loads(data)
+        return cls(message["version"], message["state"], message["patch"], message.get("epoch", ""))
+
+class ClientChannel:
+    """
+    One connected dashboard with its own bounded send queue.
+
+    `offer` never blocks the publisher: when the client falls behind, the
+    oldest queued frame is dropped so the client coalesces to the latest state.
+    Delta clients that missed a frame get a fresh snapshot instead of a patch.
+    """
+
+    def __init__(self, websocket: Optional[WebSocket], protocol: str = "full", encoding: str = "json",
+                 queue_size: int = SEND_QUEUE_SIZE):
+        self.websocket = websocket
+        self.protocol = protocol
+        self.encoding = encoding
+        self.queue: "asyncio.Queue[TickFrame]" = asyncio.Queue(maxsize=queue_size)
+        self.last_version: Optional[int] = None
+        self.dropped = 0
+
+    def offer(self, frame: TickFrame):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(frame)
+
+    def request_resync(self):
+        """Send a full snapshot with the next frame"""
+        self.last_version = None
+
+    def next_kind(self, frame: TickFrame) -> str:
+        """Message kind to send for `frame`, recording it as the client's latest version"""
+        if self.protocol == "full":
+            kind = "full"
+        elif self.last_version is not None and frame.patch is not None and frame.version == self.last_version + 1:
+            kind = "patch"
+        else:
+            kind = "snapshot"
+        self.last_version = frame.version
+        return kind
+
+    def message_for(self, frame: TickFrame) -> Union[str, bytes]:
+        return frame.encoded(self.next_kind(frame), self.encoding)
+
+    async def run_sender(self):
+        """Drain the queue to the socket until the connection fails or the task is cancelled"""
+        while True:
+            message = self.message_for(await self.queue.get())
+            if isinstance(message, bytes):
+                await self.websocket.send_bytes(message)
+            else:
+                await self.websocket.send_text(message)
+
+class EventStreamChannel(ClientChannel):
+    """
+    Server-Sent Events client, for dashboards that cannot open a WebSocket.
+
+    Uses the same queue and protocols as WebSocket clients; each message
+    becomes one event whose id is the frame's ETag, so a reconnecting client
+    that sends it back as `Last-Event-ID` skips the state it already has.
+    """
+
+    def __init__(self, protocol: str = "full", queue_size: int = SEND_QUEUE_SIZE):
+        super().__init__(None, protocol, "json", queue_size)
+
+    async def events(self, last_event_id: Optional[str] = None):
+        """Async iterator of encoded events until the response is closed"""
+        yield f"retry: {int(TICK_SECONDS * 1000)}\n\n"
+        while True:
+            try:
+                frame = await asyncio.wait_for(self.queue.get(), EVENT_STREAM_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if frame.etag == last_event_id:
+                self.last_version = frame.version
+                continue
+            kind = self.next_kind(frame)
+            event = "dashboard" if kind == "full" else kind
+            yield f"id: {frame.etag}\nevent: {event}\ndata: {frame.encoded(kind)}\n\n"
+
+class ConnectionManager:
+    def __init__(self):
+        self.active_connections: List[ClientChannel] = []
+
+    async def connect(self, websocket: WebSocket, protocol: str = "full", encoding: str = "json") -> ClientChannel:
+        await websocket.accept()
+        return self.add(ClientChannel(websocket, protocol, encoding))
+
+    def add(self, channel: ClientChannel) -> ClientChannel:
+        self.active_connections.append(channel)
+        return channel
+
+    def disconnect(self, channel: ClientChannel):
+        if channel in self.active_connections:
+            self.active_connections.remove(channel)
+
+    def broadcast(self, frame: TickFrame):
+        """Queue one tick's frame for every client; never awaits a socket"""
+        for channel in self.active_connections:
+            channel.offer(frame)
+
+class MonitoringPublisher:
+    """
+    Single background loop that advances monitor state once per tick.
+
+    Each tick updates metrics, converts the dashboard to plain data once,
+    diffs it against the previous tick and fans the same frame out to every
+    connected client, so the cost of a tick does not depend on how many
+    dashboards are open.
+
+    With `forward` set, frames are handed to it instead of the local
+    manager; the cluster coordinator uses this to fan frames out to every
+    worker, which then `adopt` them.
+    """
+
+    def __init__(self, monitor, manager: ConnectionManager, tick_seconds: float = TICK_SECONDS,
+                 forward: Optional[Callable[[TickFrame], Awaitable[None]]] = None):
+        self.monitor = monitor
+        self.manager = manager
+        self.tick_seconds = tick_seconds
+        self.forward = forward
+        self.version = 0
+        self.epoch = uuid.uuid4().hex[:8]
+        self.latest_frame: Optional[TickFrame] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def tick(self) -> TickFrame:
+        self.monitor.update_metrics()
+        self.monitor.detect_anomalies()
+        return self.publish(jsonable_encoder(self.monitor.get_dashboard_data()))
+
+    def publish(self, state: Dict[str, Any]) -> TickFrame:
+        previous = self.latest_frame
+        self.version += 1
+        patch = diff_state(previous.state, state) if previous is not None else None
+        self.latest_frame = TickFrame(self.version, state, patch, self.epoch)
+        if self.forward is None:
+            self.manager.broadcast(self.latest_frame)
+        return self.latest_frame
+
+    def adopt(self, frame: TickFrame):
+        """Take a frame published by another worker as the latest state and fan it out"""
+        self.version = frame.version
+        self.epoch = frame.epoch
+        self.latest_frame = frame
+        self.manager.broadcast(frame)
+
+    async def _run(self):
+        while True:
+            try:
+                frame = self.tick()
+                if self.forward is not None:
+                    await self.forward(frame)
+                await asyncio.sleep(self.tick_seconds)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Monitoring publisher error: {e}")
+                await asyncio.sleep(self.tick_seconds * 5)  # Wait longer on error
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -1,15 +1,38 @@
-from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
+import zlib
+import uuid
 import asyncio
 import json
+import time
 import logging
 from datetime import datetime, timedelta
 import numpy as np
+from .publisher import ConnectionManager, EventStreamChannel, MonitoringPublisher, PROTOCOLS, ENCODINGS
+from .timeseries import TimeSeriesStore, RESOLUTIONS
+from .alerts import Alert, AlertStore
+from .ingest import TelemetryIngestor, parse_telemetry
+from .instrumentation import request_timings, merge_component_values
+from .anomaly import AnomalyDetector
+from .cluster import MonitoringCoordinator, LeaderUnavailable
+from .state_backend import get_state_backend
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+LIVE_SERIES_SECONDS = 30.0  # Ingested series are not simulated until telemetry stops this long
+REMOTE_TIMINGS_SECONDS = 10.0  # Other workers' request timings older than this are ignored
+ANOMALY_EXCLUDED_SERIES = {"system.active_alerts"}  # Would feed alerts back into alerting
+ERROR_RATE_WARNING = 0.01
+ERROR_RATE_CRITICAL = 0.05
+INGEST_MAX_BYTES = 16 * 1024 * 1024  # Largest decompressed WebSocket batch
+INGEST_RETRY_SECONDS = 1.0  # Wait before re-forwarding a streamed batch the leader did not queue
+INGEST_FORWARD_TIMEOUT_SECONDS = 30.0  # Longest a streamed batch waits for a leader before the socket is closed
+WS_TRY_AGAIN_LATER = 1013  # Close code for producers to reconnect and resend
+
 class SystemMetric(BaseModel):
     metric_name: str
     current_value: float
@@ -18,15 +41,6 @@ class SystemMetric(BaseModel):
     status: str = Field(..., regex="^(healthy|warning|critical)$")
     last_updated: datetime
 
-class Alert(BaseModel):
-    alert_id: str
-    severity: str = Field(..., regex="^(info|warning|critical)$")
-    component: str
-    message: str
-    timestamp: datetime
-    location: Optional[str] = None
-    resolved: bool = False
-
 class SupplyChainComponent(BaseModel):
     component_id: str
     name: str
@@ -35,6 +49,9 @@ class SupplyChainComponent(BaseModel):
     latency_ms: int
     throughput: float
     last_health_check: datetime
+    latency_p99_ms: float = 0.0
+    error_rate: float = 0.0
+    in_flight: int = 0
 
 class RegionalMetrics(BaseModel):
     region_id: str
@@ -51,33 +68,21 @@ class MonitoringDashboard(BaseModel):
     regional_performance: List[RegionalMetrics]
     key_metrics: List[SystemMetric]
 
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except:
-                # Remove disconnected clients
-                self.active_connections.remove(connection)
-
 manager = ConnectionManager()
 
 class RealTimeMonitor:
     def __init__(self):
         self.system_metrics = self._initialize_metrics()
-        self.alerts = []
+        self.alert_store = AlertStore(log_path=None)  # Persistent once this worker leads
         self.components = self._initialize_components()
         self.regional_data = self._initialize_regional_data()
+        self.history = TimeSeriesStore()
+        self.ingestor = TelemetryIngestor(self.history, self.apply_live_values)
+        self._series = self._series_fields()
+        self._live_until: Dict[str, float] = {}
+        self.remote_timings: Dict[str, Tuple[float, Dict[str, float]]] = {}
+        self.detector = AnomalyDetector(is_counter=lambda name: name.endswith("orders_processed"))
+        self._pending_extra: Dict[str, float] = {}  # Custom ingested series seen since the last tick
         
     def _initialize_metrics(self) -> List[SystemMetric]:
         """Initialize system metrics with realistic values"""
@@ -220,9 +225,77 @@ class RealTimeMonitor:
             )
         ]
     
+    def open_alert_log(self):
+        """Switch to the persistent alert store, replaying the log"""
+        self.alert_store.close()
+        self.alert_store = AlertStore()
+    
+    def load_state(self, state: Dict[str, Any]):
+        """Continue from dashboard state published by the previous leader"""
+        self.system_metrics = [SystemMetric.parse_obj(m) for m in state["key_metrics"]]
+        self.components = [SupplyChainComponent.parse_obj(c) for c in state["component_health"]]
+        self.regional_data = [RegionalMetrics.parse_obj(r) for r in state["regional_performance"]]
+        self._series = self._series_fields()
+    
+    def _series_fields(self) -> Dict[str, Tuple[BaseModel, str, str]]:
+        """Series name -> (model, value field, timestamp field) for every tracked value"""
+        fields = {
+            f"system.{metric.metric_name.lower().replace(' ', '_')}": (metric, "current_value", "last_updated")
+            for metric in self.system_metrics
+        }
+        for component in self.components:
+            for field in ("latency_ms", "latency_p99_ms", "throughput", "uptime_percent", "error_rate", "in_flight"):
+                fields[f"component.{component.component_id}.{field}"] = (component, field, "last_health_check")
+        for region in self.regional_data:
+            for field in ("orders_processed", "efficiency_percent", "active_issues"):
+                fields[f"region.{region.region_id}.{field}"] = (region, field, "last_updated")
+        return fields
+    
+    def is_live(self, series: str) -> bool:
+        return self._live_until.get(series, 0.0) > time.monotonic()
+    
+    def apply_live_values(self, values: Dict[str, float]):
+        """Set current state from ingested telemetry; those series stop being simulated"""
+        live_until = time.monotonic() + LIVE_SERIES_SECONDS
+        now = datetime.now()
+        for name, value in values.items():
+            target = self._series.get(name)
+            if target is None:
+                self._pending_extra[name] = value  # Custom series: history and anomaly detection only
+                continue
+            model, field, stamp_field = target
+            if isinstance(getattr(model, field), (int, np.integer)):
+                value = int(round(value))
+            setattr(model, field, value)
+            setattr(model, stamp_field, now)
+            self._live_until[name] = live_until
+    
+    def _apply_request_timings(self):
+        """Real latency, throughput and error rate for components, across all workers"""
+        cutoff = time.monotonic() - REMOTE_TIMINGS_SECONDS
+        reports = [request_timings.component_values()] + [
+            values for received_at, values in self.remote_timings.values() if received_at >= cutoff
+        ]
+        values = merge_component_values(reports)
+        self.apply_live_values(values)
+        self.history.record(time.time(), values)
+        
+        for component in self.components:
+            if self.is_live(f"component.{component.component_id}.error_rate"):
+                if component.error_rate >= ERROR_RATE_CRITICAL:
+                    component.status = "critical"
+                elif component.error_rate >= ERROR_RATE_WARNING:
+                    component.status = "warning"
+                else:
+                    component.status = "healthy"
+    
     def update_metrics(self):
-        """Simulate real-time metric updates"""
+        """Simulate real-time metric updates for every series without live telemetry"""
+        self._apply_request_timings()
+        
         for metric in self.system_metrics:
+            if self.is_live(f"system.{metric.metric_name.lower().replace(' ', '_')}"):
+                continue
             if metric.metric_name == "Orders Processed":
                 metric.current_value += np.random.randint(10, 50)
             elif metric.metric_name == "Processing Rate":
@@ -230,47 +303,74 @@ class RealTimeMonitor:
             elif metric.metric_name == "System Uptime":
                 metric.current_value = max(99.0, min(100.0, 
                     metric.current_value + np.random.uniform(-0.01, 0.01)))
+            elif metric.metric_name == "Active Alerts":
+                metric.current_value = self.alert_store.open_count
             
             metric.last_updated = datetime.now()
         
         # Update component latencies
         for component in self.components:
-            component.latency_ms = max(20, min(150, 
-                component.latency_ms + np.random.randint(-10, 15)))
-            component.last_health_check = datetime.now()
+            if not self.is_live(f"component.{component.component_id}.latency_ms"):
+                component.latency_ms = max(20, min(150, 
+                    component.latency_ms + np.random.randint(-10, 15)))
+                component.last_health_check = datetime.now()
         
         # Update regional data
         for region in self.regional_data:
-            region.orders_processed += np.random.randint(5, 25)
-            region.efficiency_percent = max(85, min(100,
-                region.efficiency_percent + np.random.uniform(-0.5, 0.5)))
-            region.last_updated = datetime.now()
+            if not self.is_live(f"region.{region.region_id}.orders_processed"):
+                region.orders_processed += np.random.randint(5, 25)
+                region.last_updated = datetime.now()
+            if not self.is_live(f"region.{region.region_id}.efficiency_percent"):
+                region.efficiency_percent = max(85, min(100,
+                    region.efficiency_percent + np.random.uniform(-0.5, 0.5)))
+                region.last_updated = datetime.now()
+        
+        # Live series are recorded by the ingestor at their own timestamps
+        self.history.record(time.time(), {
+            name: value for name, value in self.series_values().items() if not self.is_live(name)
+        })
     
-    def generate_alert(self):
-        """Generate random alerts for demonstration"""
-        if np.random.random() < 0.1:  # 10% chance of new alert
-            alert_types = [
-                ("info", "System optimization completed successfully"),
-                ("warning", "High latency detected in Route Optimization service"),
-                ("critical", "Inventory stockout predicted for Electronics category"),
-                ("info", "Drone delivery corridor maintenance scheduled"),
-                ("warning", "Weather conditions affecting delivery times")
-            ]
-            
-            severity, message = np.random.choice(alert_types)
+    def series_values(self) -> Dict[str, float]:
+        """Current value of every tracked series, keyed by series name"""
+        return {name: float(getattr(model, field)) for name, (model, field, _) in self._series.items()}
+    
+    def _describe_series(self, series: str) -> Tuple[str, str, str]:
+        """(component, location, metric label) for an alert about `series`"""
+        kind, _, rest = series.partition(".")
+        key, _, field = rest.rpartition(".")
+        if kind == "component":
+            names = {c.component_id: c.name for c in self.components}
+            return names.get(key, key), "System Wide", field.replace("_", " ")
+        if kind == "region":
+            names = {r.region_id: r.region_name for r in self.regional_data}
+            return "Regional Operations", names.get(key, key), field.replace("_", " ")
+        if kind == "system":
+            return "System", "System Wide", rest.replace("_", " ")
+        return series, "System Wide", series
+    
+    def detect_anomalies(self):
+        """Run the streaming detectors over this tick's values and raise an alert per detection"""
+        values = {name: value for name, value in self.series_values().items() if name not in ANOMALY_EXCLUDED_SERIES}
+        values.update(self._pending_extra)
+        self._pending_extra = {}
+        
+        for detection in self.detector.update(values, time.monotonic()):
+            component, location, label = self._describe_series(detection["series"])
+            direction = "above" if detection["score"] > 0 else "below"
+            metric = f"{label} rate" if detection["rate"] else label
             
             alert = Alert(
-                alert_id=f"ALT-{datetime.now().strftime('%Y%m%d%H%M%S')}-{np.random.randint(1000, 9999)}",
-                severity=severity,
-                component=np.random.choice(["Forecasting", "Inventory", "Routes", "Warehouse", "Delivery"]),
-                message=message,
+                alert_id=f"ANM-{datetime.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:6]}",
+                severity=detection["severity"],
+                component=component,
+                message=f"{metric.capitalize()} {direction} expected range ({detection['detector']})",
                 timestamp=datetime.now(),
-                location=np.random.choice(["Dallas DC", "Houston Hub", "Austin Center", "System Wide"]),
-                resolved=False
+                location=location,
+                resolved=False,
+                details=detection
             )
             
-            self.alerts.insert(0, alert)  # Add to beginning
-            self.alerts = self.alerts[:10]  # Keep only latest 10 alerts
+            self.alert_store.raise_alert(alert)
     
     def get_dashboard_data(self) -> MonitoringDashboard:
         """Get complete dashboard data"""
@@ -280,105 +380,363 @@ class RealTimeMonitor:
             "system_uptime": round(self.system_metrics[1].current_value, 2),
             "active_alerts": int(self.system_metrics[3].current_value),
             "regions_monitored": len(self.regional_data),
-            "data_points_per_second": np.random.randint(14000, 16000)
+            "data_points_per_second": int(self.ingestor.points_per_second)
         }
         
         return MonitoringDashboard(
             system_overview=system_overview,
             component_health=self.components,
-            active_alerts=self.alerts,
+            active_alerts=self.alert_store.query(resolved=False, limit=10)[0],
             regional_performance=self.regional_data,
             key_metrics=self.system_metrics
         )
 
 # Global monitor instance
 _monitor = RealTimeMonitor()
+publisher = MonitoringPublisher(_monitor, manager)
+
+async def _on_leadership(is_leader: bool):
+    """Only the leader ticks, alerts and folds telemetry; followers just fan frames out"""
+    if is_leader:
+        if publisher.latest_frame is not None:
+            _monitor.load_state(publisher.latest_frame.state)
+        _monitor.open_alert_log()
+        publisher.start()
+        _monitor.ingestor.start()
+    else:
+        await publisher.stop()
+        await _monitor.ingestor.stop()
+        _monitor.alert_store.close()
+
+coordinator = MonitoringCoordinator(get_state_backend(), publisher, _on_leadership)
+
+# Commands executed on the leader, whichever worker received the request
+
+def _query_alerts(component: Optional[str], severity: Optional[str], resolved: Optional[bool],
+                  cursor: Optional[int], limit: int) -> Dict[str, Any]:
+    alerts, next_cursor = _monitor.alert_store.query(component, severity, resolved, cursor, limit)
+    return {"alerts": jsonable_encoder(alerts), "next_cursor": next_cursor}
+
+def _metric_history(names: Optional[List[str]], start: float, end: float, resolution: str) -> Dict[str, Any]:
+    names = names or sorted(_monitor.history.series)
+    unknown = [name for name in names if name not in _monitor.history.series]
+    if unknown:
+        return {"unknown": unknown}
+    if resolution == "auto":
+        resolution = _monitor.history.resolution_for(names, start)
+    return {"resolution": resolution, "series": _monitor.history.query(names, start, end, resolution)}
+
+def _ingest(body: str) -> Optional[int]:
+    """Queue a forwarded batch; None when the queue is full"""
+    try:
+        return _monitor.ingestor.submit_nowait(parse_telemetry(body.encode()))
+    except asyncio.QueueFull:
+        return None
+
+def _report_timings(worker_id: str, values: Dict[str, float]):
+    _monitor.remote_timings[worker_id] = (time.monotonic(), values)
+
+coordinator.register("query_alerts", _query_alerts)
+coordinator.register("alert_stats", lambda: _monitor.alert_store.stats())
+coordinator.register("resolve_alert", lambda alert_id: _monitor.alert_store.resolve(alert_id))
+coordinator.register("metric_history", _metric_history)
+coordinator.register("ingest", _ingest)
+coordinator.register("ingest_stats", lambda: _monitor.ingestor.stats())
+coordinator.register("report_timings", _report_timings)
+
+async def _leader_call(command: str, **args) -> Any:
+    try:
+        return await coordinator.call(command, **args)
+    except LeaderUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
+async def _report_request_timings():
+    """Followers send their request timings so the leader shows the whole deployment"""
+    while True:
+        await asyncio.sleep(publisher.tick_seconds)
+        if not coordinator.is_leader:
+            try:
+                await coordinator.send("report_timings", worker_id=coordinator.worker_id,
+                                       values=request_timings.component_values())
+            except Exception as e:
+                logger.error(f"Failed to report request timings: {e}")
+
+_reporter: Optional[asyncio.Task] = None
+
+async def start_monitoring():
+    """Join the monitoring cluster; the leader worker starts the publisher loop"""
+    global _reporter
+    await coordinator.start()
+    _reporter = asyncio.create_task(_report_request_timings())
+
+async def stop_monitoring():
+    if _reporter is not None:
+        _reporter.cancel()
+    await coordinator.stop()
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+def _shared_state(request: Request, section: Optional[str], local: Any) -> Any:
+    """
+    A dashboard section from the latest published frame, identical on every worker.
+    
+    Bodies are serialized once per tick and tagged with the frame's version,
+    so a poll that already has the current state is answered with a bare 304.
+    """
+    frame = publisher.latest_frame
+    if frame is None:
+        return local() if callable(local) else local
+    
+    headers = {"ETag": frame.etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), frame.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(frame.body(section), media_type="application/json", headers=headers)
 
 @router.get("/dashboard", response_model=MonitoringDashboard)
-async def get_monitoring_dashboard():
+async def get_monitoring_dashboard(request: Request):
     """
     Get comprehensive real-time monitoring dashboard data.
     
     Returns current system status, component health, active alerts,
-    and regional performance metrics.
+    and regional performance metrics. Send the `ETag` back as
+    `If-None-Match` to get a 304 until the next tick.
     """
     try:
-        return _monitor.get_dashboard_data()
+        return _shared_state(request, None, _monitor.get_dashboard_data)
     except Exception as e:
         logger.error(f"Failed to get dashboard data: {e}")
         raise HTTPException(status_code=500, detail="Dashboard data unavailable")
 
 @router.get("/alerts", response_model=List[Alert])
-async def get_active_alerts():
-    """Get all active alerts in the system"""
-    return _monitor.alerts
+async def get_active_alerts(
+    response: Response,
+    component: Optional[str] = None,
+    severity: Optional[str] = Query(None, regex="^(info|warning|critical)$"),
+    resolved: Optional[bool] = None,
+    cursor: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=1000)
+):
+    """
+    Get alerts in the system, newest first.
+    
+    Filters combine; pass the `X-Next-Cursor` response header back as
+    `cursor` to fetch the next page. The header is absent on the last page.
+    """
+    page = await _leader_call("query_alerts", component=component, severity=severity,
+                              resolved=resolved, cursor=cursor, limit=limit)
+    if page["next_cursor"] is not None:
+        response.headers["X-Next-Cursor"] = str(page["next_cursor"])
+    return page["alerts"]
+
+@router.get("/alerts/stats")
+async def get_alert_stats():
+    """Retained, open, deduplicated and rate-limited alert counts"""
+    return await _leader_call("alert_stats")
 
 @router.post("/alerts/{alert_id}/resolve")
 async def resolve_alert(alert_id: str):
     """Mark an alert as resolved"""
-    for alert in _monitor.alerts:
-        if alert.alert_id == alert_id:
-            alert.resolved = True
-            return {"message": f"Alert {alert_id} resolved successfully"}
+    if await _leader_call("resolve_alert", alert_id=alert_id):
+        return {"message": f"Alert {alert_id} resolved successfully"}
     
     raise HTTPException(status_code=404, detail="Alert not found")
 
 @router.get("/components", response_model=List[SupplyChainComponent])
-async def get_component_health():
+async def get_component_health(request: Request):
     """Get health status of all supply chain components"""
-    return _monitor.components
+    return _shared_state(request, "component_health", _monitor.components)
 
 @router.get("/metrics", response_model=List[SystemMetric])
-async def get_system_metrics():
+async def get_system_metrics(request: Request):
     """Get current system performance metrics"""
-    return _monitor.system_metrics
+    return _shared_state(request, "key_metrics", _monitor.system_metrics)
+
+@router.get("/metrics/history")
+async def get_metric_history(
+    series: Optional[List[str]] = Query(None),
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    resolution: str = Query("auto", regex=f"^(auto|{'|'.join(RESOLUTIONS)})$")
+):
+    """
+    Metric history as compact arrays.
+    
+    `start`/`end` are Unix timestamps (default: the last hour). Raw series
+    return `timestamps` and `values`; `1m` and `1h` rollups return
+    `timestamps` (bucket starts) with `min`, `max`, `mean` and `count`.
+    `auto` picks the finest resolution still retained for the whole range.
+    Omitting `series` returns every series.
+    """
+    end = end if end is not None else time.time()
+    start = start if start is not None else end - 3600
+    result = await _leader_call("metric_history", names=series, start=start, end=end, resolution=resolution)
+    if "unknown" in result:
+        raise HTTPException(status_code=404, detail=f"Unknown series: {', '.join(result['unknown'])}")
+    
+    return {"start": start, "end": end, **result}
+
+@router.post("/ingest", status_code=202)
+async def ingest_telemetry(request: Request):
+    """
+    Accept a batch of telemetry points for asynchronous folding.
+    
+    Body: `{"series": {name: {"values": [...], "timestamps": [...]}}}` with
+    optional Unix-second timestamps. Known series (`system.*`, `component.<id>.*`,
+    `region.<id>.*`) replace the simulated values; any other name is kept as
+    history only. Returns 503 with Retry-After when the queue is full or no
+    leader answers.
+    """
+    body = await request.body()
+    try:
+        batch = parse_telemetry(body)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    
+    if not coordinator.acts_locally:
+        # Validated here, folded by the leader
+        accepted = await _leader_call("ingest", body=body.decode())
+        if accepted is None:
+            raise HTTPException(status_code=503, detail="Telemetry queue full", headers={"Retry-After": "1"})
+        return {"accepted_points": accepted, "series": len(batch)}
+    
+    try:
+        accepted = _monitor.ingestor.submit_nowait(batch)
+    except asyncio.QueueFull:
+        raise HTTPException(status_code=503, detail="Telemetry queue full", headers={"Retry-After": "1"})
+    
+    return {"accepted_points": accepted, "series": len(batch)}
+
+@router.get("/ingest/stats")
+async def get_ingest_stats():
+    """Measured ingestion rate, totals and queue depth"""
+    return await _leader_call("ingest_stats")
+
+def _inflate(data: bytes) -> bytes:
+    """Decompress a zlib batch, refusing to expand it past INGEST_MAX_BYTES"""
+    inflater = zlib.decompressobj()
+    body = inflater.decompress(data, INGEST_MAX_BYTES)
+    if inflater.unconsumed_tail:
+        raise ValueError(f"Decompressed batch exceeds {INGEST_MAX_BYTES} bytes")
+    if not inflater.eof:
+        raise ValueError("Truncated zlib stream")
+    return body
+
+async def _forward_ingest(body: str) -> bool:
+    """Forward a streamed batch to the leader, retrying until it is queued; False once the timeout passes"""
+    deadline = time.monotonic() + INGEST_FORWARD_TIMEOUT_SECONDS
+    while True:
+        try:
+            if await coordinator.call("ingest", body=body) is not None:
+                return True
+        except LeaderUnavailable as e:
+            logger.warning(f"Retrying telemetry forward: {e}")
+        if time.monotonic() + INGEST_RETRY_SECONDS > deadline:
+            return False
+        await asyncio.sleep(INGEST_RETRY_SECONDS)
+
+@router.websocket("/ingest/ws")
+async def ingest_websocket(websocket: WebSocket):
+    """
+    Streaming telemetry ingestion.
+    
+    Each message is one batch in the `/ingest` format, as text or as
+    zlib-compressed binary. Sends are acknowledged only on error; a full
+    queue, or a follower waiting for a leader, slows the producer down
+    instead of dropping batches. A follower that finds no leader within
+    INGEST_FORWARD_TIMEOUT_SECONDS closes with 1013 (try again later);
+    the batch in flight was not queued.
+    """
+    await websocket.accept()
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            try:
+                body = _inflate(message["bytes"]) if message.get("bytes") else message.get("text", "")
+                batch = parse_telemetry(body)
+            except (ValueError, zlib.error) as e:
+                await websocket.send_text(json.dumps({"error": str(e)}))
+                continue
+            if coordinator.acts_locally:
+                await _monitor.ingestor.submit(batch)
+            elif not await _forward_ingest(body.decode() if isinstance(body, bytes) else body):
+                logger.error("No monitoring leader queued a streamed telemetry batch; closing the ingest WebSocket")
+                await websocket.close(code=WS_TRY_AGAIN_LATER, reason="No monitoring leader available")
+                break
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"Ingest WebSocket error: {e}")
 
 @router.get("/regions", response_model=List[RegionalMetrics])
-async def get_regional_performance():
+async def get_regional_performance(request: Request):
     """Get performance metrics by region"""
-    return _monitor.regional_data
+    return _shared_state(request, "regional_performance", _monitor.regional_data)
+
+@router.get("/stream")
+async def stream_dashboard(request: Request, protocol: str = Query("full", regex=f"^({'|'.join(PROTOCOLS)})$")):
+    """
+    Server-Sent Events stream of dashboard updates, for clients without WebSockets.
+    
+    `?protocol=full` sends a `dashboard` event with the whole dashboard every
+    tick; `?protocol=delta` sends `snapshot` and `patch` events in the
+    WebSocket delta format. Event ids are the `/dashboard` ETags, so a
+    reconnecting EventSource resumes without resending the state it has.
+    """
+    async def events():
+        channel = manager.add(EventStreamChannel(protocol))
+        if publisher.latest_frame is not None:
+            channel.offer(publisher.latest_frame)
+        try:
+            async for event in channel.events(request.headers.get("last-event-id")):
+                yield event
+        finally:
+            manager.disconnect(channel)
+    
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @router.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
+async def websocket_endpoint(websocket: WebSocket, protocol: str = "full", encoding: str = "json"):
     """
     WebSocket endpoint for real-time monitoring updates.
     
     Sends live updates of system metrics, alerts, and component health
-    to connected clients every 2 seconds.
+    to connected clients every 2 seconds. Updates come from the shared
+    publisher; this handler only drains the client's own send queue.
+    
+    `?protocol=full` (default) sends the whole dashboard every tick.
+    `?protocol=delta` sends `{"type": "snapshot", "version", "data"}` first,
+    then `{"type": "patch", "version", "base", "set": {path: value}}` with only
+    the changed fields; apply a patch only when `base` matches the last version
+    received, or send `resync` to get a new snapshot. `?encoding=binary` sends
+    zlib-compressed JSON in binary frames.
     """
-    await manager.connect(websocket)
+    if protocol not in PROTOCOLS or encoding not in ENCODINGS:
+        await websocket.close(code=1008)
+        return
+    
+    channel = await manager.connect(websocket, protocol, encoding)
+    if publisher.latest_frame is not None:
+        channel.offer(publisher.latest_frame)
+    sender = asyncio.create_task(channel.run_sender())
+    
     try:
+        # Receiving surfaces disconnects promptly; the only command is a resync request
         while True:
-            # Update metrics and generate alerts
-            _monitor.update_metrics()
-            _monitor.generate_alert()
-            
-            # Get latest dashboard data
-            dashboard_data = _monitor.get_dashboard_data()
-            
-            # Send to all connected clients
-            await manager.broadcast(dashboard_data.json())
-            
-            # Wait 2 seconds before next update
-            await asyncio.sleep(2)
+            if await websocket.receive_text() == "resync":
+                channel.request_resync()
             
     except WebSocketDisconnect:
-        manager.disconnect(websocket)
+        pass
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
-        manager.disconnect(websocket)
-
-# Background task to continuously update metrics
-async def background_monitoring():
-    """Background task for continuous monitoring"""
-    while True:
-        try:
-            _monitor.update_metrics()
-            _monitor.generate_alert()
-            await asyncio.sleep(5)  # Update every 5 seconds
-        except Exception as e:
-            logger.error(f"Background monitoring error: {e}")
-            await asyncio.sleep(10)  # Wait longer on error
-
-# Start background monitoring (would be called from main.py in production)
-# asyncio.create_task(background_monitoring())
\ No newline at end of file
+    finally:
+        sender.cancel()
+        manager.disconnect(channel)
\ No newline at end of file
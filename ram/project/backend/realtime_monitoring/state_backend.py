@@ -0,0 +1,124 @@
+"""
+Shared-state backends that let several API workers act as one monitor.
+
+Both backends offer the same small API: a leader lease, pub/sub channels
+and key-value slots (the latest frame, stored route solutions) with an
+optional expiry. `RedisBackend` coordinates
+separate uvicorn workers. `LocalBackend` is the single-process default and
+the stand-in for tests, where several coordinators share one instance.
+"""
+from typing import AsyncIterator, Dict, List, Optional
+import asyncio
+import os
+import time
+
+REDIS_URL = os.getenv("REDIS_URL")
+
+class LocalBackend:
+    def __init__(self):
+        self._leases: Dict[str, tuple] = {}  # key -> (owner, expires_at)
+        self._values: Dict[str, tuple] = {}  # key -> (value, expires_at or None)
+        self._subscribers: Dict[str, List[asyncio.Queue]] = {}
+
+    async def acquire_lease(self, key: str, owner: str, ttl_seconds: float) -> bool:
+        """Take or renew `key` for `owner`; false while another owner holds it"""
+        holder = self._leases.get(key)
+        now = time.monotonic()
+        if holder is None or holder[0] == owner or holder[1] <= now:
+            self._leases[key] = (owner, now + ttl_seconds)
+            return True
+        return False
+
+    async def release_lease(self, key: str, owner: str):
+        if self._leases.get(key, (None,))[0] == owner:
+            del self._leases[key]
+
+    async def publish(self, channel: str, message: bytes):
+        for queue in self._subscribers.get(channel, []):
+            queue.put_nowait(message)
+
+    async def subscribe(self, channel: str) -> AsyncIterator[bytes]:
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(channel, []).append(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._subscribers[channel].remove(queue)
+
+    async def set(self, key: str, value: bytes, ttl_seconds: Optional[float] = None):
+        now = time.monotonic()
+        if ttl_seconds is not None:
+            # Expired keys are dropped on write so expiring slots cannot accumulate
+            expired = [k for k, (_, expires_at) in self._values.items() if expires_at is not None and expires_at <= now]
+            for stale in expired:
+                del self._values[stale]
+        self._values[key] = (value, now + ttl_seconds if ttl_seconds is not None else None)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        value, expires_at = self._values.get(key, (None, None))
+        if expires_at is not None and expires_at <= time.monotonic():
+            return None
+        return value
+
+    async def close(self):
+        pass
+
+# Renew when we already own the lease, otherwise take it only if it is free
+_LEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+if redis.call('set', KEYS[1], ARGV[1], 'NX', 'PX', ARGV[2]) then
+    return 1
+end
+return 0
+"""
+
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+class RedisBackend:
+    def __init__(self, url: str):
+        import redis.asyncio as redis  # Only needed when REDIS_URL is configured
+
+        self.client = redis.from_url(url)
+        self._lease = self.client.register_script(_LEASE_SCRIPT)
+        self._release = self.client.register_script(_RELEASE_SCRIPT)
+
+    async def acquire_lease(self, key: str, owner: str, ttl_seconds: float) -> bool:
+        return bool(await self._lease(keys=[key], args=[owner, int(ttl_seconds * 1000)]))
+
+    async def release_lease(self, key: str, owner: str):
+        await self._release(keys=[key], args=[owner])
+
+    async def publish(self, channel: str, message: bytes):
+        await self.client.publish(channel, message)
+
+    async def subscribe(self, channel: str) -> AsyncIterator[bytes]:
+        pubsub = self.client.pubsub()
+        await pubsub.subscribe(channel)
+        try:
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    yield message["data"]
+        finally:
+            await pubsub.unsubscribe(channel)
+            await pubsub.close()
+
+    async def set(self, key: str, value: bytes, ttl_seconds: Optional[float] = None):
+        await self.client.set(key, value, px=int(ttl_seconds * 1000) if ttl_seconds is not None else None)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(key)
+
+    async def close(self):
+        await self.client.close()
+
+def get_state_backend():
+    """Redis when REDIS_URL is set, otherwise process-local state"""
+    return RedisBackend(REDIS_URL) if REDIS_URL else LocalBackend()
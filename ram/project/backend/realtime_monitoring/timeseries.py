@@ -0,0 +1,207 @@
+"""
+Fixed-memory metric history for the monitoring service.
+
+Each series keeps a raw ring buffer plus incrementally maintained 1-minute and
+1-hour rollups (min, max, mean, count per bucket). Inserts are O(1) per sample
+and never allocate; memory is fixed by the capacities below, about 300 KB
+per series for two hours raw, three days at 1m and ninety days at 1h. Values
+are float64 so counters stay exact past 2**24.
+"""
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+import threading
+
+RAW_CAPACITY = 3600  # Two hours at the 2 s publisher tick
+ROLLUPS: Tuple[Tuple[str, int, int], ...] = (
+    ("1m", 60, 3 * 24 * 60),
+    ("1h", 3600, 90 * 24),
+)
+RESOLUTIONS = ("raw",) + tuple(name for name, _, _ in ROLLUPS)
+
+class RingBuffer:
+    """Columnar ring of timestamped rows, oldest overwritten first"""
+
+    def __init__(self, capacity: int, columns: Dict[str, np.dtype]):
+        self.capacity = capacity
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.columns = {name: np.zeros(capacity, dtype=dtype) for name, dtype in columns.items()}
+        self.head = 0  # Next slot to write
+        self.size = 0
+
+    def push(self, timestamp: float, **values: float):
+        self.timestamps[self.head] = timestamp
+        for name, value in values.items():
+            self.columns[name][self.head] = value
+        self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def push_many(self, timestamps: np.ndarray, **values: np.ndarray):
+        if len(timestamps) > self.capacity:
+            timestamps = timestamps[-self.capacity:]
+            values = {name: column[-self.capacity:] for name, column in values.items()}
+        slots = (self.head + np.arange(len(timestamps))) % self.capacity
+        self.timestamps[slots] = timestamps
+        for name, column in values.items():
+            self.columns[name][slots] = column
+        self.head = (self.head + len(timestamps)) % self.capacity
+        self.size = min(self.size + len(timestamps), self.capacity)
+
+    @property
+    def last_timestamp(self) -> Optional[float]:
+        return float(self.timestamps[self.head - 1]) if self.size else None
+
+    def covers(self, start: float) -> bool:
+        """Whether nothing at or after `start` has been overwritten yet"""
+        return self.size < self.capacity or self.timestamps[self.head] <= start
+
+    def _order(self) -> np.ndarray:
+        start = (self.head - self.size) % self.capacity
+        return (start + np.arange(self.size)) % self.capacity
+
+    def query(self, start: float, end: float) -> Dict[str, np.ndarray]:
+        """Rows with start <= timestamp <= end, oldest first"""
+        order = self._order()
+        timestamps = self.timestamps[order]
+        rows = order[np.searchsorted(timestamps, start, side="left"):np.searchsorted(timestamps, end, side="right")]
+        result = {"timestamps": self.timestamps[rows]}
+        result.update({name: column[rows] for name, column in self.columns.items()})
+        return result
+
+    @property
+    def nbytes(self) -> int:
+        return self.timestamps.nbytes + sum(column.nbytes for column in self.columns.values())
+
+class Rollup:
+    """Fixed-width buckets, with the current bucket accumulated until time moves past it"""
+
+    def __init__(self, seconds: int, capacity: int):
+        self.seconds = seconds
+        self.buckets = RingBuffer(capacity, {
+            "min": np.float64, "max": np.float64, "mean": np.float64, "count": np.int32
+        })
+        self._bucket: Optional[float] = None
+        self._min = self._max = self._sum = 0.0
+        self._count = 0
+
+    def _flush(self):
+        if self._count:
+            self.buckets.push(self._bucket * self.seconds, min=self._min, max=self._max,
+                              mean=self._sum / self._count, count=self._count)
+
+    def add(self, timestamps: np.ndarray, values: np.ndarray):
+        """Fold time-ordered samples into their buckets; usually one or two groups per call"""
+        bucket_ids = np.floor(timestamps / self.seconds)
+        starts = np.flatnonzero(np.r_[True, bucket_ids[1:] != bucket_ids[:-1]])
+        mins = np.minimum.reduceat(values, starts)
+        maxs = np.maximum.reduceat(values, starts)
+        sums = np.add.reduceat(values, starts)
+        counts = np.diff(np.r_[starts, len(values)])
+
+        for bucket, lo, hi, total, count in zip(bucket_ids[starts], mins, maxs, sums, counts):
+            if bucket != self._bucket:
+                self._flush()
+                self._bucket = bucket
+                self._min, self._max, self._sum, self._count = lo, hi, total, count
+            else:
+                self._min, self._max = min(self._min, lo), max(self._max, hi)
+                self._sum += total
+                self._count += count
+
+    def query(self, start: float, end: float) -> Dict[str, np.ndarray]:
+        """Closed buckets in range, plus the open one if it overlaps, so the latest data is visible"""
+        result = self.buckets.query(start, end)
+        open_start = self._bucket * self.seconds if self._count else None
+        if open_start is not None and open_start <= end and open_start + self.seconds > start:
+            result["timestamps"] = np.append(result["timestamps"], open_start)
+            result["min"] = np.append(result["min"], self._min)
+            result["max"] = np.append(result["max"], self._max)
+            result["mean"] = np.append(result["mean"], self._sum / self._count)
+            result["count"] = np.append(result["count"], self._count)
+        return result
+
+class MetricSeries:
+    def __init__(self, raw_capacity: int = RAW_CAPACITY):
+        self.raw = RingBuffer(raw_capacity, {"value": np.float64})
+        self.rollups = {name: Rollup(seconds, capacity) for name, seconds, capacity in ROLLUPS}
+        self.late_samples = 0
+
+    def append(self, timestamps: np.ndarray, values: np.ndarray):
+        """
+        Append samples; ones older than the latest stored sample are dropped.
+
+        Keeping every series time-ordered is what makes range queries a binary search.
+        """
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        if len(timestamps) > 1 and (np.diff(timestamps) < 0).any():
+            order = np.argsort(timestamps, kind="stable")
+            timestamps, values = timestamps[order], values[order]
+
+        last = self.raw.last_timestamp
+        if last is not None:
+            fresh = timestamps >= last
+            self.late_samples += int(len(timestamps) - fresh.sum())
+            timestamps, values = timestamps[fresh], values[fresh]
+        if not len(timestamps):
+            return
+
+        self.raw.push_many(timestamps, value=values)
+        for rollup in self.rollups.values():
+            rollup.add(timestamps, values)
+
+    def query(self, start: float, end: float, resolution: str) -> Dict[str, np.ndarray]:
+        if resolution == "raw":
+            return self.raw.query(start, end)
+        return self.rollups[resolution].query(start, end)
+
+    @property
+    def nbytes(self) -> int:
+        return self.raw.nbytes + sum(r.buckets.nbytes for r in self.rollups.values())
+
+class TimeSeriesStore:
+    """Named metric series, created on first write"""
+
+    def __init__(self, raw_capacity: int = RAW_CAPACITY):
+        self.raw_capacity = raw_capacity
+        self.series: Dict[str, MetricSeries] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, name: str) -> MetricSeries:
+        series = self.series.get(name)
+        if series is None:
+            series = self.series[name] = MetricSeries(self.raw_capacity)
+        return series
+
+    def record(self, timestamp: float, values: Dict[str, float]):
+        """One sample for each of many series at the same instant"""
+        stamp = np.array([timestamp])
+        with self._lock:
+            for name, value in values.items():
+                self._get(name).append(stamp, np.array([value], dtype=np.float64))
+
+    def append(self, name: str, timestamps: np.ndarray, values: np.ndarray):
+        """Many samples for one series"""
+        with self._lock:
+            self._get(name).append(timestamps, values)
+
+    def resolution_for(self, names: List[str], start: float) -> str:
+        """Finest resolution whose retention still reaches back to `start` for every series"""
+        with self._lock:
+            series = [self.series[name] for name in names]
+            if all(s.raw.covers(start) for s in series):
+                return "raw"
+            for name, _, _ in ROLLUPS[:-1]:
+                if all(s.rollups[name].buckets.covers(start) for s in series):
+                    return name
+        return ROLLUPS[-1][0]
+
+    def query(self, names: List[str], start: float, end: float, resolution: str) -> Dict[str, Dict[str, List]]:
+        with self._lock:
+            return {
+                name: {key: column.tolist() for key, column in self.series[name].query(start, end, resolution).items()}
+                for name in names
+            }
+
+    @property
+    def nbytes(self) -> int:
+        return sum(series.nbytes for series in self.series.values())
@@ -0,0 +1,297 @@
+"""
+Regret-k insertion construction with constant-time feasibility checks.
+
+Every route keeps, per stop, its departure time and the latest time the
+vehicle may arrive there: late enough to still serve it inside its window,
+reach every later stop inside its window and return to the depot before
+the shift ends. Vehicles that arrive early wait for the window to open.
+Inserting stop u between consecutive points i and j is then feasible when
+u can be served inside its own window after leaving i, and the vehicle
+reaches j no later than j's latest arrival. It fits when the route's load
+plus u's demand is within capacity. That is O(1) per candidate position.
+Positions are evaluated for many stops at once as arrays.
+
+Each step inserts the stop with the largest regret, the sum of how much
+more its 2nd..k-th best routes cost than its best one. Stops with few good
+options are placed before those options fill up. Higher priority stops go
+first, so lower priorities are the ones left unassigned when capacity or
+time runs out. A stop is only evaluated against empty routes and routes
+that already serve one of its nearest neighbours, so a step costs the size
+of a route's neighbourhood rather than of the instance. Stops that no
+neighbouring route can take are retried against every route before any
+lower-priority stop is inserted, and at the end.
+"""
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+import numpy as np
+from scipy.spatial import cKDTree
+from .distance import BASE_SPEED_KMH, HAVERSINE, DistanceBackend, unit_vectors
+
+REGRET_K = 3
+NEIGHBOUR_COUNT = 16  # Nearest stops a stop may be inserted next to
+PRIORITY_RANK = {"urgent": 0, "high": 1, "medium": 2, "low": 3}
+SHIFT_START_MINUTE = 480  # Vehicles leave the depot at 8 AM
+
+_INFEASIBLE_COST = 1e9  # Stand-in for missing options in regret sums
+_PRIORITY_WEIGHT = 1e12  # Above any regret, so priority tiers are inserted in order
+
+@dataclass
+class RoutingProblem:
+    """Stops and vehicles as arrays, in request order"""
+    lats: np.ndarray
+    lons: np.ndarray
+    demand: np.ndarray
+    service_minutes: np.ndarray
+    window_start: np.ndarray
+    window_end: np.ndarray
+    priority_rank: np.ndarray
+    depot_lats: np.ndarray
+    depot_lons: np.ndarray
+    capacity: np.ndarray
+    shift_end: np.ndarray  # Minutes from midnight by which each vehicle is back at its depot
+    cost_per_km: np.ndarray
+    objective: str = "minimize_cost"
+    speed_kmh: float = BASE_SPEED_KMH
+    distance: DistanceBackend = HAVERSINE  # Bound to the stops and depots by `DistanceBackend.table`
+
+    @property
+    def minutes_per_km(self) -> float:
+        return 60 / self.speed_kmh
+
+    @property
+    def time_scale(self) -> float:
+        """Travel time per free-flow minute at this plan's speed"""
+        return BASE_SPEED_KMH / self.speed_kmh
+
+@dataclass
+class PlannedRoute:
+    """One vehicle's stops in visiting order, with leg distances (ending at the depot) and arrival minutes"""
+    vehicle: int
+    stops: List[int]
+    legs_km: np.ndarray
+    travel_minutes: np.ndarray
+    arrivals: np.ndarray
+    return_minute: float
+
+class RouteState:
+    """
+    A route being built or repaired, with its timing arrays.
+
+    Points are the origin (the depot unless the vehicle is already out),
+    the stops, then the depot. `load` counts demand already on board for
+    stops outside `stops`, such as ones a vehicle has served.
+    """
+
+    def __init__(self, problem: RoutingProblem, vehicle: int, stops: Optional[List[int]] = None,
+                 origin: Optional[Tuple[float, float]] = None, start_minute: float = SHIFT_START_MINUTE,
+                 load: int = 0):
+        self.problem = problem
+        self.vehicle = vehicle
+        self.origin = origin or (problem.depot_lats[vehicle], problem.depot_lons[vehicle])
+        self.start_minute = start_minute
+        self.base_load = load
+        self.set_stops(stops or [])
+
+    def insert(self, position: int, stop: int):
+        self.stops.insert(position, stop)
+        self.load += int(self.problem.demand[stop])
+        self._refresh()
+
+    def set_stops(self, stops: List[int]):
+        self.stops = list(stops)
+        self.load = self.base_load + int(self.problem.demand[self.stops].sum())
+        self._refresh()
+
+    def remove(self, position: int) -> int:
+        stop = self.stops.pop(position)
+        self.load -= int(self.problem.demand[stop])
+        self._refresh()
+        return stop
+
+    def removal_saving(self, position: int) -> float:
+        """What taking out the stop at `position` saves, in the units `evaluate` charges for inserting it"""
+        p, stop = self.problem, self.stops[position]
+        shortcut, shortcut_minutes = p.distance.legs(self.lats[[position, position + 2]],
+                                                     self.lons[[position, position + 2]])
+        km = self.legs[position] + self.legs[position + 1] - shortcut[0]
+        if p.objective == "minimize_time":
+            minutes = self.travel[position] + self.travel[position + 1] - shortcut_minutes[0] * p.time_scale
+            return minutes + p.service_minutes[stop]
+        return km if p.objective == "minimize_distance" else km * p.cost_per_km[self.vehicle]
+
+    def first_violation(self) -> Optional[int]:
+        """A stop to pull to make the route feasible: the first late one, else the last if the shift overruns"""
+        p = self.problem
+        late = np.flatnonzero(self.arrivals > p.window_end[self.stops])
+        if len(late):
+            return int(late[0])
+        if self.stops and self.return_minute > p.shift_end[self.vehicle]:
+            return len(self.stops) - 1
+        return None
+
+    def _refresh(self):
+        p, stops = self.problem, self.stops
+        depot_lat, depot_lon = p.depot_lats[self.vehicle], p.depot_lons[self.vehicle]
+        self.lats = np.concatenate(([self.origin[0]], p.lats[stops], [depot_lat]))
+        self.lons = np.concatenate(([self.origin[1]], p.lons[stops], [depot_lon]))
+        self.legs, minutes = p.distance.legs(self.lats, self.lons)
+        self.travel = minutes * p.time_scale
+
+        # departures[k]: leaving point k; arrivals[k]: reaching stop k
+        departures = np.empty(len(stops) + 1)
+        arrivals = np.empty(len(stops))
+        departures[0] = self.start_minute
+        for k, stop in enumerate(stops):
+            arrivals[k] = departures[k] + self.travel[k]
+            departures[k + 1] = max(arrivals[k], p.window_start[stop]) + p.service_minutes[stop]
+        # latest[k]: latest arrival at point k + 1 (the stop after position k, or the depot)
+        latest = np.empty(len(stops) + 1)
+        latest[-1] = p.shift_end[self.vehicle]
+        for k in range(len(stops) - 1, -1, -1):
+            stop = stops[k]
+            latest[k] = min(p.window_end[stop], latest[k + 1] - self.travel[k + 1] - p.service_minutes[stop])
+        self.departures, self.arrivals, self.latest = departures, arrivals, latest
+        self.return_minute = departures[-1] + self.travel[-1]
+
+    def evaluate(self, candidates: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Cheapest feasible insertion cost and position for each candidate stop; inf where none fits"""
+        p = self.problem
+        costs = np.full(len(candidates), np.inf)
+        positions = np.zeros(len(candidates), dtype=np.int64)
+        fits = self.load + p.demand[candidates] <= p.capacity[self.vehicle]
+        candidates = candidates[fits]
+        if len(candidates) == 0:
+            return costs, positions
+
+        # (positions, candidates): from the point before each position, and back to the point after it
+        lats, lons = p.lats[candidates], p.lons[candidates]
+        if p.distance.symmetric:
+            km, minutes = p.distance.matrix(self.lats, self.lons, lats, lons)
+            into, out_of, into_minutes, out_minutes = km[:-1], km[1:], minutes[:-1], minutes[1:]
+        else:
+            into, into_minutes = p.distance.matrix(self.lats[:-1], self.lons[:-1], lats, lons)
+            out_of, out_minutes = (m.T for m in p.distance.matrix(lats, lons, self.lats[1:], self.lons[1:]))
+        start = np.maximum(p.window_start[candidates], self.departures[:, None] + into_minutes * p.time_scale)
+        next_arrival = start + p.service_minutes[candidates] + out_minutes * p.time_scale
+        feasible = (start <= p.window_end[candidates]) & (next_arrival <= self.latest[:, None])
+
+        if p.objective == "minimize_time":
+            # How much later the vehicle reaches the next point, waiting included
+            cost = next_arrival - (self.departures + self.travel)[:, None]
+        else:
+            cost = into + out_of - self.legs[:, None]
+            if p.objective != "minimize_distance":
+                cost = cost * p.cost_per_km[self.vehicle]
+        cost[~feasible] = np.inf
+
+        best = np.argmin(cost, axis=0)
+        costs[fits] = cost[best, np.arange(len(candidates))]
+        positions[fits] = best
+        return costs, positions
+
+    def plan(self) -> PlannedRoute:
+        return PlannedRoute(self.vehicle, list(self.stops), self.legs, self.travel, self.arrivals, self.return_minute)
+
+def nearest_neighbours(lats: np.ndarray, lons: np.ndarray, count: int) -> np.ndarray:
+    """Indices of each stop's `count` nearest other stops, by chord distance on the unit sphere"""
+    points = unit_vectors(lats, lons)
+    count = min(count, len(lats) - 1)
+    if count <= 0:
+        return np.zeros((len(lats), 0), dtype=np.int64)
+    _, neighbours = cKDTree(points).query(points, k=count + 1)
+    return neighbours[:, 1:]
+
+def _scores(costs: np.ndarray, open_costs: np.ndarray, priority_rank: np.ndarray, k: int) -> np.ndarray:
+    """
+    Selection score per stop: priority tier first, then regret; -inf when no route can take it.
+
+    Opening a route counts as one option however many vehicles are still
+    idle, so identical idle vehicles do not cancel each other's regret.
+    """
+    options = np.minimum(np.column_stack((costs, open_costs)), _INFEASIBLE_COST)
+    k = min(k, options.shape[1])
+    best = np.sort(np.partition(options, k - 1, axis=1)[:, :k], axis=1)
+    # With one option per stop regret is always zero: fall back to cheapest insertion
+    regret = (best[:, 1:] - best[:, :1]).sum(axis=1) if k > 1 else -best[:, 0]
+    scores = regret - priority_rank * _PRIORITY_WEIGHT
+    scores[best[:, 0] >= _INFEASIBLE_COST] = -np.inf
+    return scores
+
+def regret_insertion(problem: RoutingProblem, k: int = REGRET_K,
+                     neighbour_count: int = NEIGHBOUR_COUNT) -> Tuple[List[PlannedRoute], List[int]]:
+    """Build routes by regret-k insertion; returns the non-empty routes and the stops no route can take"""
+    n, num_vehicles = len(problem.lats), len(problem.capacity)
+    routes = [RouteState(problem, v) for v in range(num_vehicles)]
+    if n == 0 or num_vehicles == 0:
+        return [], list(range(n))
+
+    neighbours = nearest_neighbours(problem.lats, problem.lons, neighbour_count)
+    # Reverse lists: the stops that count each stop among their neighbours
+    order = np.argsort(neighbours.ravel(), kind="stable")
+    owners = np.repeat(np.arange(n), neighbours.shape[1])[order]
+    bounds = np.searchsorted(neighbours.ravel()[order], np.arange(n + 1))
+
+    # Insertion into routes that have stops, and the cheapest idle vehicle to open a route with
+    everyone = np.arange(n)
+    costs = np.full((n, num_vehicles), np.inf)
+    positions = np.zeros((n, num_vehicles), dtype=np.int64)
+    opening = np.column_stack([route.evaluate(everyone)[0] for route in routes])
+    open_vehicle = np.argmin(opening, axis=1)
+    open_costs = opening[everyone, open_vehicle]
+
+    candidate = np.zeros((n, num_vehicles), dtype=bool, order="F")  # Read a route's column per step
+    unrouted = np.ones(n, dtype=bool)
+    scores = _scores(costs, open_costs, problem.priority_rank, k)
+    widened = np.zeros(n, dtype=bool)  # Stops every route may bid for
+
+    def widen(left: np.ndarray):
+        """Let every route bid for `left`, not only neighbouring ones"""
+        widened[left] = True
+        candidate[left] = True
+        for v, route in enumerate(routes):
+            if route.stops:
+                costs[left, v], positions[left, v] = route.evaluate(left)
+        scores[left] = _scores(costs[left], open_costs[left], problem.priority_rank[left], k)
+
+    while True:
+        stop = int(np.argmax(scores))
+        if scores[stop] == -np.inf:
+            left = np.flatnonzero(unrouted & ~widened)
+            if len(left) == 0:
+                break
+            widen(left)  # Leftovers
+            continue
+        # A higher-priority stop no neighbouring route can take may still fit a distant route; offer it
+        # every route before this tier goes ahead of it
+        blocked = np.flatnonzero(unrouted & ~widened & (scores == -np.inf)
+                                 & (problem.priority_rank < problem.priority_rank[stop]))
+        if len(blocked):
+            widen(blocked)
+            continue
+
+        unrouted[stop] = False
+        scores[stop] = -np.inf
+        v = int(np.argmin(costs[stop]))
+        stale = None
+        if open_costs[stop] < costs[stop, v]:
+            v = int(open_vehicle[stop])
+            positions[stop, v] = 0
+            # The vehicle is no longer idle: stops that would have opened with it pick the next one
+            opening[:, v] = np.inf
+            stale = np.flatnonzero(unrouted & (open_vehicle == v))
+            open_vehicle[stale] = np.argmin(opening[stale], axis=1)
+            open_costs[stale] = opening[stale, open_vehicle[stale]]
+        route = routes[v]
+        route.insert(int(positions[stop, v]), stop)
+        costs[stop] = np.inf
+        candidate[neighbours[stop], v] = True
+        candidate[owners[bounds[stop]:bounds[stop + 1]], v] = True
+
+        # Only this route's column changed. Candidacy only grows, so the stops that could use the route
+        # before are among those re-evaluated now.
+        bidders = np.flatnonzero(unrouted & candidate[:, v])
+        costs[bidders, v], positions[bidders, v] = route.evaluate(bidders)
+        rows = bidders if stale is None else np.union1d(bidders, stale)
+        scores[rows] = _scores(costs[rows], open_costs[rows], problem.priority_rank[rows], k)
+
+    return [route.plan() for route in routes if route.stops], np.flatnonzero(unrouted).tolist()
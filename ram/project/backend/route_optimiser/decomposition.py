@@ -0,0 +1,209 @@
+"""
+Cluster-first construction for instances too large to build as one.
+
+1. Partition: k-means on stop positions (on the unit sphere) into clusters
+   of about CLUSTER_STOPS stops. Clusters twice that size are split again.
+2. Allocate vehicles: the fleet is shared out in proportion to each
+   cluster's estimated need (demand over capacity, or working time over shift
+   length, whichever binds). Each cluster then takes the unallocated vehicles
+   whose depots are nearest its centre.
+3. Solve: regret insertion (construction.py) builds each cluster's routes
+   independently, in parallel on the shared process pool.
+4. Repair boundaries: stops a cluster could not place are offered to the
+   routes serving their nearest neighbours in any cluster, and to the
+   nearest vehicles that were left without stops. Stops next to
+   another cluster then move to a route serving one of their neighbours
+   when that saves more than it costs.
+
+With a fixed cluster size every step is linear (or n log n) in the number
+of stops, so solve time grows near-linearly with instance size.
+"""
+from typing import List, Tuple
+import math
+import numpy as np
+from scipy.spatial import cKDTree
+from common.pool import get_process_pool
+from .construction import NEIGHBOUR_COUNT, PlannedRoute, RouteState, RoutingProblem, nearest_neighbours, regret_insertion
+from .distance import EARTH_RADIUS_KM, haversine_distances, haversine_matrix, unit_vectors
+
+CLUSTER_STOPS = 500  # Target stops per cluster
+KMEANS_ITERATIONS = 10
+DECOMPOSE_ABOVE_STOPS = 1000  # Larger instances are decomposed when the request leaves it to the service
+REPAIR_EMPTY_VEHICLES = 8  # Nearest empty vehicles offered each stop during repair
+
+def _kmeans(points: np.ndarray, k: int, rng: np.random.Generator) -> np.ndarray:
+    """Cluster label per point; clusters left empty are reseeded on a random point"""
+    centroids = points[rng.choice(len(points), k, replace=False)]
+    labels = np.zeros(len(points), dtype=np.int64)
+    for _ in range(KMEANS_ITERATIONS):
+        _, labels = cKDTree(centroids).query(points)
+        sums = np.zeros((k, 3))
+        np.add.at(sums, labels, points)
+        counts = np.bincount(labels, minlength=k)
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        centroids[empty] = points[rng.choice(len(points), int(empty.sum()), replace=False)]
+    return labels
+
+def _groups(indices: np.ndarray, labels: np.ndarray) -> List[np.ndarray]:
+    order = np.argsort(labels, kind="stable")
+    return [g for g in np.split(indices[order], np.cumsum(np.bincount(labels))[:-1]) if len(g)]
+
+def partition(lats: np.ndarray, lons: np.ndarray, num_clusters: int, max_clusters: int,
+              cluster_stops: int = CLUSTER_STOPS, seed: int = 0) -> List[np.ndarray]:
+    """Stop indices per geographic cluster; clusters over twice `cluster_stops` are split while `max_clusters` allows"""
+    rng = np.random.default_rng(seed)
+    points = unit_vectors(lats, lons)
+    labels = _kmeans(points, num_clusters, rng) if num_clusters > 1 else np.zeros(len(lats), dtype=np.int64)
+    groups = _groups(np.arange(len(lats)), labels)
+    # k-means balances poorly around dense cities: split the largest clusters again
+    budget = max_clusters - len(groups)
+    clusters = []
+    for members in sorted(groups, key=len, reverse=True):
+        pieces = min(math.ceil(len(members) / cluster_stops), budget + 1)
+        if len(members) <= 2 * cluster_stops or pieces < 2:
+            clusters.append(members)
+            continue
+        budget -= pieces - 1
+        clusters.extend(_groups(members, _kmeans(points[members], pieces, rng)))
+    return clusters
+
+def allocate_vehicles(problem: RoutingProblem, clusters: List[np.ndarray], neighbour_km: np.ndarray) -> List[np.ndarray]:
+    """
+    Vehicle indices per cluster: at least one each, the rest by largest
+    remainder of estimated need, taking the nearest depots first.
+    """
+    num_vehicles = len(problem.capacity)
+    shift_minutes = float(np.mean(problem.shift_end)) - float(np.min(problem.window_start, initial=0))
+    demand_need = np.array([problem.demand[c].sum() for c in clusters]) / max(float(np.mean(problem.capacity)), 1.0)
+    # Working time: serving each stop plus driving about as far as its nearest neighbour
+    work = np.array([(problem.service_minutes[c] + neighbour_km[c] * problem.minutes_per_km).sum() for c in clusters])
+    need = np.maximum(np.maximum(demand_need, work / max(shift_minutes, 1.0)), 1e-9)
+
+    quota = need / need.sum() * num_vehicles
+    counts = np.maximum(np.floor(quota).astype(np.int64), 1)
+    while counts.sum() > num_vehicles:  # The one-vehicle floor overshot: take back from the most over quota
+        over = np.where(counts > 1, counts - quota, -np.inf)
+        counts[np.argmax(over)] -= 1
+    spare = num_vehicles - counts.sum()
+    if spare > 0:
+        counts[np.argsort(counts - quota, kind="stable")[:spare]] += 1
+
+    centre_lats = np.array([problem.lats[c].mean() for c in clusters])
+    centre_lons = np.array([problem.lons[c].mean() for c in clusters])
+    distances = haversine_matrix(centre_lats, centre_lons, problem.depot_lats, problem.depot_lons)
+    owner = np.full(num_vehicles, -1)
+    for pair in np.argsort(distances, axis=None, kind="stable"):
+        cluster, vehicle = divmod(int(pair), num_vehicles)
+        if owner[vehicle] < 0 and counts[cluster] > 0:
+            owner[vehicle] = cluster
+            counts[cluster] -= 1
+    return [np.flatnonzero(owner == c) for c in range(len(clusters))]
+
+def _subproblem(problem: RoutingProblem, stops: np.ndarray, vehicles: np.ndarray) -> RoutingProblem:
+    return RoutingProblem(
+        lats=problem.lats[stops],
+        lons=problem.lons[stops],
+        demand=problem.demand[stops],
+        service_minutes=problem.service_minutes[stops],
+        window_start=problem.window_start[stops],
+        window_end=problem.window_end[stops],
+        priority_rank=problem.priority_rank[stops],
+        depot_lats=problem.depot_lats[vehicles],
+        depot_lons=problem.depot_lons[vehicles],
+        capacity=problem.capacity[vehicles],
+        shift_end=problem.shift_end[vehicles],
+        cost_per_km=problem.cost_per_km[vehicles],
+        objective=problem.objective,
+        speed_kmh=problem.speed_kmh,
+        distance=problem.distance.table(np.concatenate((problem.lats[stops], problem.depot_lats[vehicles])),
+                                        np.concatenate((problem.lons[stops], problem.depot_lons[vehicles])))
+    )
+
+def _repair(problem: RoutingProblem, routes: List[RouteState], unassigned: List[int],
+            cluster_of: np.ndarray, neighbours: np.ndarray) -> List[int]:
+    """Boundary repair across clusters; returns the stops that are still unassigned"""
+    route_of = np.full(len(problem.lats), -1)
+    for r, route in enumerate(routes):
+        route_of[route.stops] = r
+    vehicles = np.array([route.vehicle for route in routes])
+    empty = np.array([not route.stops for route in routes])
+
+    def cheapest(stop: int, exclude: int) -> Tuple[float, int, int]:
+        candidates = set(route_of[neighbours[stop]].tolist())
+        # Plus the nearest vehicles without stops, such as ones their cluster did not need
+        idle = np.flatnonzero(empty)
+        if len(idle):
+            km = haversine_distances(problem.lats[stop], problem.lons[stop],
+                                     problem.depot_lats[vehicles[idle]], problem.depot_lons[vehicles[idle]])
+            candidates.update(idle[np.argsort(km, kind="stable")[:REPAIR_EMPTY_VEHICLES]].tolist())
+        best = (np.inf, -1, 0)
+        for r in candidates - {-1, exclude}:
+            costs, positions = routes[r].evaluate(np.array([stop]))
+            if costs[0] < best[0]:
+                best = (float(costs[0]), r, int(positions[0]))
+        return best
+
+    # Stops their own cluster could not place, highest priority first
+    still_unassigned = []
+    for stop in sorted(unassigned, key=lambda s: problem.priority_rank[s]):
+        cost, r, position = cheapest(stop, -1)
+        if r < 0:
+            still_unassigned.append(stop)
+            continue
+        routes[r].insert(position, stop)
+        route_of[stop] = r
+        empty[r] = False
+
+    # Relocate stops next to another cluster when a route there takes them for less than removing them saves
+    boundary = np.flatnonzero((cluster_of[neighbours] != cluster_of[:, None]).any(axis=1) & (route_of >= 0))
+    for stop in boundary.tolist():
+        o = int(route_of[stop])
+        own = routes[o]
+        cost, r, position = cheapest(stop, o)
+        if r < 0 or cost >= own.removal_saving(own.stops.index(stop)) - 1e-9:
+            continue
+        own.remove(own.stops.index(stop))
+        routes[r].insert(position, stop)
+        route_of[stop] = r
+        empty[r], empty[o] = False, not own.stops
+    return still_unassigned
+
+def decomposed_insertion(problem: RoutingProblem, cluster_stops: int = CLUSTER_STOPS,
+                         seed: int = 0) -> Tuple[List[PlannedRoute], List[int]]:
+    """Build routes cluster by cluster; returns the non-empty routes and the stops no route can take"""
+    n, num_vehicles = len(problem.lats), len(problem.capacity)
+    if n == 0 or num_vehicles == 0:
+        return [], list(range(n))
+
+    neighbours = nearest_neighbours(problem.lats, problem.lons, NEIGHBOUR_COUNT)
+    clusters = partition(problem.lats, problem.lons, min(math.ceil(n / cluster_stops), num_vehicles),
+                         num_vehicles, cluster_stops, seed)
+    points = unit_vectors(problem.lats, problem.lons)
+    # Chord to the nearest stop, close enough to the great circle at street scale
+    neighbour_km = (np.linalg.norm(points - points[neighbours[:, 0]], axis=1) * EARTH_RADIUS_KM
+                    if neighbours.shape[1] else np.zeros(n))
+    fleets = allocate_vehicles(problem, clusters, neighbour_km)
+
+    jobs = [(stops, vehicles) for stops, vehicles in zip(clusters, fleets)]
+    subproblems = [_subproblem(problem, stops, vehicles) for stops, vehicles in jobs]
+    if len(subproblems) == 1:
+        results = [regret_insertion(subproblems[0])]
+    else:
+        executor = get_process_pool()
+        futures = [executor.submit(regret_insertion, sub) for sub in subproblems]
+        results = [future.result() for future in futures]
+
+    # Back to instance indices
+    stops_of = [[] for _ in range(num_vehicles)]
+    unassigned = []
+    cluster_of = np.empty(n, dtype=np.int64)
+    for c, ((stops, vehicles), (planned, left)) in enumerate(zip(jobs, results)):
+        cluster_of[stops] = c
+        for plan in planned:
+            stops_of[vehicles[plan.vehicle]] = stops[plan.stops].tolist()
+        unassigned.extend(stops[left].tolist())
+
+    routes = [RouteState(problem, v, stops_of[v]) for v in range(num_vehicles)]
+    unassigned = _repair(problem, routes, unassigned, cluster_of, neighbours)
+    return [route.plan() for route in routes if route.stops], sorted(unassigned)
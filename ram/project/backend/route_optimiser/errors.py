@@ -0,0 +1,2 @@
+class RoutingInputError(ValueError):
+    """A routing request the service cannot serve as given; handlers answer 422 with the message"""
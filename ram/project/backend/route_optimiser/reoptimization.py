@@ -0,0 +1,355 @@
+"""
+Incremental re-optimization of a stored route solution.
+
+`/route/optimize` stores a solution (vehicles, deliveries and each
+vehicle's stop order with planned arrivals) under a `solution_id` when the
+request sets `store_solution`; every re-optimized solution is stored. A
+re-optimization applies a delta to it instead of solving from scratch:
+
+1. Stops a vehicle has already served are locked and their segments kept
+   as driven; the rest of the route starts from the vehicle's position.
+2. Cancelled stops are dropped. Updated stops, stops of unavailable
+   vehicles and stops a changed route now reaches late are pulled out.
+3. Pulled and added stops go back by cheapest feasible insertion into
+   the unlocked part of any available route, with the construction's
+   timing model (`construction.RouteState`). Stops that were already
+   unassigned are only offered to routes this delta changed, since
+   untouched routes could not take them before either.
+4. Routes that changed get a 2-opt pass over their unlocked part.
+
+Routes the delta does not touch are returned exactly as stored. Repaired
+legs use the speed and distance backend the solution was planned with, so
+they match the stored routes around them.
+"""
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+import os
+import time
+import uuid
+import logging
+import numpy as np
+from .construction import PRIORITY_RANK, SHIFT_START_MINUTE, RouteState, RoutingProblem
+from .distance import BASE_SPEED_KMH, HAVERSINE, DistanceBackend
+from .errors import RoutingInputError
+from common.serialization import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+ROUTE_SOLUTION_TTL_SECONDS = float(os.getenv("ROUTE_SOLUTION_TTL_SECONDS", "86400"))
+ROUTE_SOLUTION_MAX_BYTES = int(os.getenv("ROUTE_SOLUTION_MAX_BYTES", str(16 * 1024 * 1024)))
+SOLUTION_KEY_PREFIX = "route:solution:"
+TWO_OPT_BUDGET_MS = 20.0  # Per re-optimization, across all changed routes
+
+class SolutionStore:
+    """Route solutions by id in the shared state backend, so any worker can re-optimize them"""
+
+    def __init__(self, backend, ttl_seconds: float = ROUTE_SOLUTION_TTL_SECONDS,
+                 max_bytes: int = ROUTE_SOLUTION_MAX_BYTES):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+
+    async def save(self, solution: Dict[str, Any]) -> Optional[str]:
+        """The solution's id, or None when it is over `max_bytes` and was not stored"""
+        solution_id = solution.get("solution_id") or uuid.uuid4().hex
+        data = dumps({**solution, "solution_id": solution_id})
+        if len(data) > self.max_bytes:
+            logger.warning(f"Route solution of {len(data)} bytes not stored (limit {self.max_bytes})")
+            return None
+        solution["solution_id"] = solution_id
+        await self.backend.set(SOLUTION_KEY_PREFIX + solution_id, data, self.ttl_seconds)
+        return solution_id
+
+    async def load(self, solution_id: str) -> Optional[Dict[str, Any]]:
+        data = await self.backend.get(SOLUTION_KEY_PREFIX + solution_id)
+        return loads(data) if data is not None else None
+
+def _minutes(clock: str) -> int:
+    hours, minutes = clock.split(":")
+    return int(hours) * 60 + int(minutes)
+
+def _clock(minutes_from_midnight: int) -> str:
+    return f"{minutes_from_midnight // 60:02d}:{minutes_from_midnight % 60:02d}"
+
+def solution_from_response(request: Dict[str, Any], response: Dict[str, Any]) -> Dict[str, Any]:
+    """The stored form of an optimization: request and response as plain dicts, routes as stop lists"""
+    routes = []
+    for route in response["optimized_routes"]:
+        served = [s for s in route["route_segments"] if s["delivery_node_id"] is not None]
+        routes.append({
+            "vehicle_id": route["vehicle_id"],
+            "stops": [s["delivery_node_id"] for s in served],
+            "arrivals": [_minutes(s["arrival_time"]) for s in served],
+            "served": 0,
+            "route": route
+        })
+    return {
+        "parent_solution_id": None,
+        "created_at": time.time(),
+        "options": {**{key: request[key] for key in ("optimization_objective", "include_traffic",
+                                                    "drone_delivery_enabled", "distance_backend")},
+                    "speed_kmh": response.get("speed_kmh") or BASE_SPEED_KMH},
+        "vehicles": request["vehicles"],
+        "unavailable_vehicles": [],
+        "deliveries": request["deliveries"],
+        "routes": routes,
+        "drone_deliveries": response["drone_deliveries"],
+        "unassigned": response["unassigned_deliveries"],
+        "cost_savings_percent": response["cost_savings_percent"],
+        "efficiency_improvement_percent": response["efficiency_improvement_percent"]
+    }
+
+@dataclass
+class _Route:
+    vehicle: Dict[str, Any]
+    index: int  # Position in the solution's vehicles
+    origin: Dict[str, Any]  # Location the unlocked part starts from
+    start_minute: float
+    locked_stops: List[int] = field(default_factory=list)
+    locked_arrivals: List[float] = field(default_factory=list)
+    locked_segments: List[Dict[str, Any]] = field(default_factory=list)
+    stops: List[int] = field(default_factory=list)  # Unlocked stops, in order
+    stored: Optional[Dict[str, Any]] = None  # Stored route, returned as-is while unchanged
+    changed: bool = False
+    state: Optional[RouteState] = None  # Unlocked part as problem indices, once the delta is applied
+
+def _problem(deliveries: List[Dict[str, Any]], vehicles: List[Dict[str, Any]], objective: str, speed_kmh: float,
+             distance: DistanceBackend, origins: List[Dict[str, Any]]) -> RoutingProblem:
+    """The construction model of a solution, at its planned speed, with distances bound to its points"""
+    points = [d["location"] for d in deliveries] + [v["start_location"] for v in vehicles] + origins
+    return RoutingProblem(
+        lats=np.array([d["location"]["lat"] for d in deliveries]),
+        lons=np.array([d["location"]["lon"] for d in deliveries]),
+        demand=np.array([d["demand"] for d in deliveries], dtype=np.int64),
+        service_minutes=np.array([d["service_time_minutes"] for d in deliveries], dtype=np.float64),
+        window_start=np.array([d["time_window_start"] for d in deliveries], dtype=np.float64),
+        window_end=np.array([d["time_window_end"] for d in deliveries], dtype=np.float64),
+        priority_rank=np.array([PRIORITY_RANK[d["priority"]] for d in deliveries], dtype=np.int64),
+        depot_lats=np.array([v["start_location"]["lat"] for v in vehicles]),
+        depot_lons=np.array([v["start_location"]["lon"] for v in vehicles]),
+        capacity=np.array([v["capacity"] for v in vehicles], dtype=np.int64),
+        shift_end=np.array([SHIFT_START_MINUTE + v["max_working_hours"] * 60 for v in vehicles], dtype=np.float64),
+        cost_per_km=np.array([v["cost_per_km"] for v in vehicles]),
+        objective=objective,
+        speed_kmh=speed_kmh,
+        distance=distance.table(np.array([p["lat"] for p in points]), np.array([p["lon"] for p in points]))
+    )
+
+def _two_opt(state: RouteState, deadline: float):
+    """Reverse stretches of stops while that shortens the route and keeps it feasible"""
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for i in range(len(state.stops) - 1):
+            for j in range(i + 1, len(state.stops)):
+                best, stops = float(state.legs.sum()), state.stops
+                state.set_stops(stops[:i] + stops[i:j + 1][::-1] + stops[j + 1:])
+                if state.legs.sum() < best - 1e-9 and state.first_violation() is None:
+                    improved = True
+                else:
+                    state.set_stops(stops)
+            if time.perf_counter() >= deadline:
+                return
+
+def _segments(route: _Route, node_ids: List[int], deliveries: Dict[int, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Response segments for the unlocked part, ending at the depot"""
+    state = route.state
+    points = [route.origin] + [deliveries[node_id]["location"] for node_id in node_ids] + \
+        [route.vehicle["start_location"]]
+    arrivals = state.arrivals.tolist() + [state.return_minute]
+    return [
+        {"from_location": points[k], "to_location": points[k + 1], "distance_km": distance,
+         "travel_time_minutes": int(round(minutes)), "arrival_time": _clock(int(arrival)), "delivery_node_id": node_id}
+        for k, (distance, minutes, arrival, node_id) in enumerate(
+            zip(state.legs.tolist(), state.travel.tolist(), arrivals, node_ids + [None]))
+    ]
+
+def _open_route(stored: Optional[Dict[str, Any]], vehicle: Dict[str, Any], index: int,
+                deliveries: Dict[int, Dict[str, Any]], position: Optional[Dict[str, Any]], current_time: int) -> _Route:
+    """A vehicle's route split at the stops it has already served"""
+    if stored is None:
+        origin = position["location"] if position and position.get("location") else vehicle["start_location"]
+        return _Route(vehicle, index, origin, max(current_time, SHIFT_START_MINUTE), changed=position is not None)
+
+    stops, arrivals = stored["stops"], stored["arrivals"]
+    served = sum(1 for arrival in arrivals if arrival <= current_time)  # Inferred from the plan
+    if position and position.get("completed_stops") is not None:
+        served = position["completed_stops"]
+    served = min(len(stops), max(served, stored["served"]))
+
+    if served:
+        last = deliveries[stops[served - 1]]
+        leave = max(arrivals[served - 1], last["time_window_start"]) + last["service_time_minutes"]
+        origin, start = last["location"], max(current_time, leave)
+    else:
+        origin, start = vehicle["start_location"], max(current_time, SHIFT_START_MINUTE)
+    if position and position.get("location"):
+        origin, start = position["location"], max(current_time, SHIFT_START_MINUTE)
+
+    segments = stored["route"]["route_segments"]
+    return _Route(vehicle, index, origin, start, locked_stops=stops[:served], locked_arrivals=arrivals[:served],
+                  locked_segments=[s for s in segments if s["delivery_node_id"] is not None][:served],
+                  stops=stops[served:], stored=stored, changed=position is not None)
+
+def reoptimize_solution(solution: Dict[str, Any], current_time: int, added: List[Dict[str, Any]],
+                        removed: List[int], updated: List[Dict[str, Any]], positions: Dict[int, Dict[str, Any]],
+                        unavailable: List[int], drone_plans: List[Dict[str, Any]],
+                        distance: DistanceBackend = HAVERSINE) -> Dict[str, Any]:
+    """
+    Apply a delta to a stored solution and return the new solution.
+
+    The returned solution carries a `response` dict shaped like
+    `RouteReoptimizationResponse` (without ids and timing). Raises
+    `RoutingInputError` for deltas that reference unknown or duplicate
+    stops or vehicles. `drone_plans` are the added stops already given to drones;
+    `distance` is the backend the solution was built with.
+    """
+    deliveries = {d["node_id"]: d for d in solution["deliveries"]}
+    vehicles = {v["vehicle_id"]: v for v in solution["vehicles"]}
+    for delivery in added:
+        if delivery["node_id"] in deliveries:
+            raise RoutingInputError(f"Delivery {delivery['node_id']} already exists; use update_deliveries")
+    for delivery in updated:
+        if delivery["node_id"] not in deliveries:
+            raise RoutingInputError(f"Cannot update unknown delivery {delivery['node_id']}")
+    for vehicle_id in list(positions) + unavailable:
+        if vehicle_id not in vehicles:
+            raise RoutingInputError(f"Unknown vehicle {vehicle_id}")
+    unknown = sorted(set(removed) - set(deliveries))
+    if unknown:
+        raise RoutingInputError(f"Cannot remove unknown deliveries {unknown}")
+
+    stored_routes = {r["vehicle_id"]: r for r in solution["routes"]}
+    routes = {vid: _open_route(stored_routes.get(vid), vehicle, index, deliveries, positions.get(vid), current_time)
+              for index, (vid, vehicle) in enumerate(vehicles.items())}
+    unavailable = set(solution["unavailable_vehicles"]) | set(unavailable)
+    locked = {stop for route in routes.values() for stop in route.locked_stops}
+
+    # Cancellations: served stops cannot be undone
+    removed = set(removed)
+    rejected_removals = sorted(removed & locked)
+    removed -= locked
+    for delivery in updated:
+        if delivery["node_id"] not in locked:
+            deliveries[delivery["node_id"]] = delivery
+    for delivery in added:
+        deliveries[delivery["node_id"]] = delivery
+
+    node_ids = list(deliveries)
+    index = {node_id: i for i, node_id in enumerate(node_ids)}
+    problem = _problem(list(deliveries.values()), list(vehicles.values()),
+                       solution["options"]["optimization_objective"],
+                       solution["options"].get("speed_kmh", BASE_SPEED_KMH), distance,
+                       [route.origin for route in routes.values()])
+    drone_ids = {plan["delivery_node_id"] for plan in drone_plans}
+    pool = [d["node_id"] for d in added if d["node_id"] not in drone_ids]
+    pulled_updates = {d["node_id"] for d in updated} - locked
+    # Updated windows or demand may now fit anywhere; other leftovers only where this delta made room
+    pool += [stop for stop in solution["unassigned"] if stop in pulled_updates]
+    leftovers = [stop for stop in solution["unassigned"] if stop not in removed and stop not in pulled_updates]
+
+    for vid, route in routes.items():
+        keep = [s for s in route.stops if s not in removed and s not in pulled_updates]
+        if vid in unavailable:
+            pool += keep
+            keep = []
+        else:
+            pool += [s for s in route.stops if s in pulled_updates]
+        if keep != route.stops:
+            route.changed = True
+        route.state = RouteState(problem, route.index, [index[s] for s in keep],
+                                 origin=(route.origin["lat"], route.origin["lon"]), start_minute=route.start_minute,
+                                 load=sum(deliveries[s]["demand"] for s in route.locked_stops))
+        # A new origin, start time or stop list can make stops late: pull them until the route is feasible.
+        # Untouched routes keep their stored plan.
+        while route.changed and route.state.stops:
+            position = route.state.first_violation()
+            if position is None:
+                break
+            stops = route.state.stops
+            pool.append(node_ids[stops[position]])
+            route.state.set_stops(stops[:position] + stops[position + 1:])
+
+    available = [route for vid, route in routes.items() if vid not in unavailable]
+    inserted, unassigned = [], []
+
+    def insert(stops: List[int], candidates: List[_Route]):
+        """Cheapest insertion, most urgent and earliest-closing stops first"""
+        for stop in sorted(stops, key=lambda s: (PRIORITY_RANK[deliveries[s]["priority"]],
+                                                  deliveries[s]["time_window_end"], s)):
+            candidate = np.array([index[stop]])
+            options = [(costs[0], vid, int(positions[0])) for vid, (costs, positions) in
+                       ((route.vehicle["vehicle_id"], route.state.evaluate(candidate)) for route in candidates)]
+            cost, vid, position = min(options, default=(np.inf, None, 0))
+            if not np.isfinite(cost):
+                unassigned.append(stop)
+                continue
+            routes[vid].state.insert(position, index[stop])
+            routes[vid].changed = True
+            inserted.append(stop)
+
+    insert(list(set(pool) - removed), available)
+    insert(leftovers, [route for route in available if route.changed])
+
+    deadline = time.perf_counter() + TWO_OPT_BUDGET_MS / 1000
+    for route in routes.values():
+        if route.changed and len(route.state.stops) > 2:
+            _two_opt(route.state, deadline)
+
+    new_routes, optimized_routes = [], []
+    for vid, route in routes.items():
+        if not route.changed:
+            if route.stored is not None:
+                new_routes.append({**route.stored, "served": len(route.locked_stops)})
+                optimized_routes.append(route.stored["route"])
+            continue
+        stops = [node_ids[i] for i in route.state.stops]
+        if not route.locked_stops and not stops:
+            continue
+        segments = route.locked_segments + _segments(route, stops, deliveries)
+        total_distance = sum(s["distance_km"] for s in segments)
+        deliveries_count = len(route.locked_stops) + len(stops)
+        optimized = {
+            "vehicle_id": vid,
+            "route_segments": segments,
+            "total_distance_km": total_distance,
+            "total_time_minutes": sum(s["travel_time_minutes"] for s in segments),
+            "total_cost": total_distance * route.vehicle["cost_per_km"],
+            "efficiency_score": float(min(95, 60 + deliveries_count * 5)),
+            "deliveries_count": deliveries_count
+        }
+        new_routes.append({"vehicle_id": vid, "stops": route.locked_stops + stops,
+                           "arrivals": route.locked_arrivals + route.state.arrivals.tolist(),
+                           "served": len(route.locked_stops), "route": optimized})
+        optimized_routes.append(optimized)
+
+    drone_deliveries = [plan for plan in solution["drone_deliveries"] if plan["delivery_node_id"] not in removed]
+    drone_deliveries += drone_plans
+    return {
+        "parent_solution_id": solution["solution_id"],
+        "created_at": time.time(),
+        "options": solution["options"],
+        "vehicles": solution["vehicles"],
+        "unavailable_vehicles": sorted(unavailable),
+        "deliveries": [d for node_id, d in deliveries.items() if node_id not in removed],
+        "routes": new_routes,
+        "drone_deliveries": drone_deliveries,
+        "unassigned": unassigned,
+        "cost_savings_percent": solution["cost_savings_percent"],
+        "efficiency_improvement_percent": solution["efficiency_improvement_percent"],
+        "response": {
+            "optimized_routes": optimized_routes,
+            "drone_deliveries": drone_deliveries,
+            "total_cost": sum(r["total_cost"] for r in optimized_routes),
+            "total_distance_km": sum(r["total_distance_km"] for r in optimized_routes),
+            "total_time_hours": sum(r["total_time_minutes"] for r in optimized_routes) / 60,
+            "cost_savings_percent": solution["cost_savings_percent"],
+            "efficiency_improvement_percent": solution["efficiency_improvement_percent"],
+            "unassigned_deliveries": unassigned,
+            "speed_kmh": solution["options"].get("speed_kmh", BASE_SPEED_KMH),
+            "changed_vehicles": sorted(vid for vid, route in routes.items() if route.changed),
+            "inserted_deliveries": inserted,
+            "rejected_removals": rejected_removals,
+            "locked_stops": len(locked)
+        }
+    }
@@ -0,0 +1,455 @@
+"""
+Road-network distances from a local graph, for cities where straight lines
+cross rivers and ignore highways.
+
+A graph is a directed list of road segments with lengths and free-flow
+travel times. It is loaded from an .npz file (`load_road_network`) or
+generated offline (`synthetic_road_network`: a street grid with
+arterials, a highway and a river crossed only at bridges).
+
+Loading contracts the graph into a contraction hierarchy. Nodes are ranked
+and removed in rank order. Removing a node adds shortcut edges between its
+neighbours wherever it lay on their only shortest path. Every fastest path
+then climbs the ranks and comes back down. A query searches only upward
+from both ends, which settles a few hundred nodes instead of the whole
+city.
+
+Many-to-many matrices use the same idea in bulk. There is one upward
+search per source and one per target, joined on the nodes where they meet.
+Searches are cached per node and matrices per location set, so repeated
+requests over the same depots and stops are lookups. A point off the graph
+reaches its nearest node by a straight leg at ACCESS_SPEED_KMH.
+
+`RoadNetwork` is a `distance.DistanceBackend`. Its `table` precomputes
+the matrix between an instance's stops and depots, so route construction
+reads each distance from an array.
+
+    python -m route_optimiser.road_network roads.npz --synthetic --center 32.78 -96.80
+    ROAD_GRAPH_PATH=roads.npz uvicorn main:app
+"""
+from collections import OrderedDict
+from dataclasses import dataclass, fields
+from typing import Dict, List, Optional, Tuple
+import argparse
+import hashlib
+import heapq
+import logging
+import math
+import os
+import threading
+import time
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial import cKDTree
+from .distance import EARTH_RADIUS_KM, DistanceBackend, unit_vectors
+from .errors import RoutingInputError
+
+logger = logging.getLogger(__name__)
+
+ROAD_GRAPH_PATH = os.getenv("ROAD_GRAPH_PATH", "")  # Road distances are off unless set
+ROAD_MATRIX_MAX_POINTS = int(os.getenv("ROAD_MATRIX_MAX_POINTS", "2000"))  # Distinct points per precomputed table
+ACCESS_SPEED_KMH = 20  # Between a point and its nearest graph node
+WITNESS_SETTLE_LIMIT = 50  # Nodes a witness search settles before a shortcut is added anyway
+SEARCH_CACHE_SIZE = 50000  # Upward searches kept per direction
+MATRIX_CACHE_SIZE = 32  # Matrices kept, keyed by location set
+MAX_JOIN_PAIRS = 4_000_000  # Meeting pairs joined at once when combining searches
+
+@dataclass
+class RoadGraph:
+    """Directed road segments between intersections"""
+    node_lats: np.ndarray
+    node_lons: np.ndarray
+    tails: np.ndarray
+    heads: np.ndarray
+    km: np.ndarray
+    minutes: np.ndarray  # Free-flow travel time
+
+@dataclass
+class ContractionHierarchy:
+    """Node ranks, and the graph's edges plus shortcuts with the time and length of the path each stands for"""
+    rank: np.ndarray
+    tails: np.ndarray
+    heads: np.ndarray
+    km: np.ndarray
+    minutes: np.ndarray
+
+def _witness(out: List[Dict[int, Tuple[float, float]]], source: int, skip: int, limit: float,
+             targets: Dict[int, Tuple[float, float]]) -> Dict[int, float]:
+    """Times of paths from `source` that avoid `skip`, searched up to `limit` minutes"""
+    best = {source: 0.0}
+    heap = [(0.0, source)]
+    settled, remaining = 0, len(targets)
+    while heap and settled < WITNESS_SETTLE_LIMIT:
+        d, x = heapq.heappop(heap)
+        if d > best[x]:
+            continue
+        if d > limit:
+            break
+        settled += 1
+        if x in targets:
+            remaining -= 1
+            if remaining == 0:
+                break
+        for y, (m, _) in out[x].items():
+            if y != skip and d + m < best.get(y, math.inf):
+                best[y] = d + m
+                heapq.heappush(heap, (d + m, y))
+    return best
+
+def contract(graph: RoadGraph) -> ContractionHierarchy:
+    """
+    Rank nodes by edge difference (shortcuts added minus edges removed)
+    plus contracted neighbours, updated lazily, and contract them in that
+    order. Edges are weighted by travel time.
+    """
+    n = len(graph.node_lats)
+    out: List[Dict[int, Tuple[float, float]]] = [{} for _ in range(n)]
+    inc: List[Dict[int, Tuple[float, float]]] = [{} for _ in range(n)]
+    for t, h, k, m in zip(graph.tails.tolist(), graph.heads.tolist(), graph.km.tolist(), graph.minutes.tolist()):
+        if t != h and m < out[t].get(h, (math.inf,))[0]:
+            out[t][h] = inc[h][t] = (m, k)
+    edges = [(t, h, m, k) for t in range(n) for h, (m, k) in out[t].items()]
+    neighbours_done = [0] * n
+
+    def shortcuts(v: int) -> List[Tuple[int, int, float, float]]:
+        found = []
+        for u, (mu, ku) in inc[v].items():
+            via = {w: (mu + mw, ku + kw) for w, (mw, kw) in out[v].items() if w != u}
+            if not via:
+                continue
+            reached = _witness(out, u, v, max(m for m, _ in via.values()), via)
+            found.extend((u, w, m, k) for w, (m, k) in via.items() if reached.get(w, math.inf) > m)
+        return found
+
+    def priority(v: int, found: List[Tuple[int, int, float, float]]) -> int:
+        return len(found) - len(inc[v]) - len(out[v]) + neighbours_done[v]
+
+    queue = [(priority(v, shortcuts(v)), v) for v in range(n)]
+    heapq.heapify(queue)
+    rank = np.empty(n, dtype=np.int64)
+    order = 0
+    while queue:
+        _, v = heapq.heappop(queue)
+        found = shortcuts(v)
+        current = priority(v, found)
+        if queue and current > queue[0][0]:
+            heapq.heappush(queue, (current, v))
+            continue
+        rank[v] = order
+        order += 1
+        for u, w, m, k in found:
+            if m < out[u].get(w, (math.inf,))[0]:
+                out[u][w] = inc[w][u] = (m, k)
+                edges.append((u, w, m, k))
+        for u in inc[v]:
+            del out[u][v]
+            neighbours_done[u] += 1
+        for w in out[v]:
+            del inc[w][v]
+            neighbours_done[w] += 1
+        out[v], inc[v] = {}, {}
+
+    tails, heads, minutes, km = (np.array(column) for column in zip(*edges)) if edges else [np.zeros(0)] * 4
+    return ContractionHierarchy(rank, tails.astype(np.int64), heads.astype(np.int64), km, minutes)
+
+def _adjacency(tails: np.ndarray, heads: np.ndarray, minutes: np.ndarray, km: np.ndarray,
+               n: int) -> List[List[Tuple[int, float, float]]]:
+    adjacency = [[] for _ in range(n)]
+    for t, h, m, k in zip(tails.tolist(), heads.tolist(), minutes.tolist(), km.tolist()):
+        adjacency[t].append((h, m, k))
+    return adjacency
+
+def _cache_key(*arrays: np.ndarray) -> bytes:
+    digest = hashlib.sha1()
+    for array in arrays:
+        digest.update(np.ascontiguousarray(array, dtype=np.float64).tobytes())
+        digest.update(b"|")
+    return digest.digest()
+
+class RoadNetwork(DistanceBackend):
+    """Fastest-path distances and times over a road graph, answered through its contraction hierarchy"""
+
+    def __init__(self, graph: RoadGraph, hierarchy: Optional[ContractionHierarchy] = None):
+        n = len(graph.node_lats)
+        self.graph = graph
+        self.hierarchy = hierarchy if hierarchy is not None else contract(graph)
+        h = self.hierarchy
+        up = h.rank[h.heads] > h.rank[h.tails]
+        self._upward = _adjacency(h.tails[up], h.heads[up], h.minutes[up], h.km[up], n)
+        self._downward = _adjacency(h.heads[~up], h.tails[~up], h.minutes[~up], h.km[~up], n)  # Reversed
+
+        # Points snap to the largest strongly connected component, so every pair of them is connected
+        adjacency = csr_matrix((np.ones(len(graph.tails)), (graph.tails, graph.heads)), shape=(n, n))
+        _, labels = connected_components(adjacency, connection="strong")
+        self._snap_nodes = np.flatnonzero(labels == np.bincount(labels).argmax())
+        self._snap_tree = cKDTree(unit_vectors(graph.node_lats[self._snap_nodes], graph.node_lons[self._snap_nodes]))
+
+        self._lock = threading.Lock()
+        self._searches = {True: OrderedDict(), False: OrderedDict()}
+        self._matrices = OrderedDict()
+
+    def _search(self, node: int, forward: bool) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Nodes an upward search from (or, backward, to) `node` settles, with times and lengths"""
+        cache = self._searches[forward]
+        with self._lock:
+            if node in cache:
+                cache.move_to_end(node)
+                return cache[node]
+        adjacency, stall = (self._upward, self._downward) if forward else (self._downward, self._upward)
+        best, length, settled = {node: 0.0}, {node: 0.0}, {}
+        heap = [(0.0, node)]
+        while heap:
+            d, x = heapq.heappop(heap)
+            if x in settled or d > best[x]:
+                continue
+            # Stall-on-demand: a higher node reaching x sooner means no fastest path goes up through x
+            if any(best.get(y, math.inf) + m < d for y, m, _ in stall[x]):
+                continue
+            settled[x] = (d, length[x])
+            for y, m, k in adjacency[x]:
+                if d + m < best.get(y, math.inf):
+                    best[y], length[y] = d + m, length[x] + k
+                    heapq.heappush(heap, (d + m, y))
+        result = (np.fromiter(settled, dtype=np.int64, count=len(settled)),
+                  np.array([v[0] for v in settled.values()]), np.array([v[1] for v in settled.values()]))
+        with self._lock:
+            cache[node] = result
+            if len(cache) > SEARCH_CACHE_SIZE:
+                cache.popitem(last=False)
+        return result
+
+    def _node_matrix(self, sources: np.ndarray, targets: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Fastest-path times and lengths between graph nodes: upward searches joined where they meet"""
+        if len(sources) == 0 or len(targets) == 0:
+            return np.zeros((len(sources), len(targets))), np.zeros((len(sources), len(targets)))
+        backward = [self._search(int(t), False) for t in targets]
+        meet = np.concatenate([b[0] for b in backward])
+        order = np.argsort(meet, kind="stable")
+        meet = meet[order]
+        target_of = np.repeat(np.arange(len(targets)), [len(b[0]) for b in backward])[order]
+        target_minutes = np.concatenate([b[1] for b in backward])[order]
+        target_km = np.concatenate([b[2] for b in backward])[order]
+
+        minutes = np.full((len(sources), len(targets)), np.inf)
+        km = np.full((len(sources), len(targets)), np.inf)
+        forward = [self._search(int(s), True) for s in sources]
+        pairs = [int((np.searchsorted(meet, f[0], "right") - np.searchsorted(meet, f[0], "left")).sum())
+                 for f in forward]
+        block_start, block_pairs = 0, 0
+        for i, count in enumerate(pairs + [MAX_JOIN_PAIRS]):
+            if i < len(pairs) and (block_pairs + count <= MAX_JOIN_PAIRS or i == block_start):
+                block_pairs += count
+                continue
+            block = range(block_start, i)
+            nodes = np.concatenate([forward[s][0] for s in block])
+            source_of = np.repeat(np.fromiter(block, dtype=np.int64), [len(forward[s][0]) for s in block])
+            lo, hi = np.searchsorted(meet, nodes, "left"), np.searchsorted(meet, nodes, "right")
+            counts = hi - lo
+            f = np.repeat(np.arange(len(nodes)), counts)
+            b = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts - lo, counts)
+            total = np.concatenate([forward[s][1] for s in block])[f] + target_minutes[b]
+            cell = source_of[f] * len(targets) + target_of[b]
+            np.minimum.at(minutes.ravel(), cell, total)
+            won = total <= minutes.ravel()[cell]
+            km.ravel()[cell[won]] = np.concatenate([forward[s][2] for s in block])[f[won]] + target_km[b[won]]
+            block_start, block_pairs = i, count
+        return minutes, km
+
+    def _snap(self, lats: np.ndarray, lons: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Nearest connected node of each point and the straight-line km to it"""
+        points = unit_vectors(lats, lons)
+        chord, index = self._snap_tree.query(points)
+        return self._snap_nodes[index], chord * EARTH_RADIUS_KM
+
+    def _points_matrix(self, lats1, lons1, lats2, lons2) -> Tuple[np.ndarray, np.ndarray]:
+        nodes1, access1 = self._snap(lats1, lons1)
+        nodes2, access2 = self._snap(lats2, lons2)
+        sources, rows = np.unique(nodes1, return_inverse=True)
+        targets, cols = np.unique(nodes2, return_inverse=True)
+        minutes, km = self._node_matrix(sources, targets)
+        access = access1[:, None] + access2[None, :]
+        km = km[np.ix_(rows, cols)] + access
+        minutes = minutes[np.ix_(rows, cols)] + access * (60 / ACCESS_SPEED_KMH)
+        # Points sharing a node are a street apart: go straight
+        i, j = np.nonzero(nodes1[:, None] == nodes2[None, :])
+        if len(i):
+            direct = np.linalg.norm(unit_vectors(lats1[i], lons1[i]) - unit_vectors(lats2[j], lons2[j]), axis=1)
+            km[i, j] = direct * EARTH_RADIUS_KM
+            minutes[i, j] = km[i, j] * (60 / ACCESS_SPEED_KMH)
+        return km, minutes
+
+    def matrix(self, lats1, lons1, lats2, lons2):
+        key = _cache_key(lats1, lons1, lats2, lons2)
+        with self._lock:
+            if key in self._matrices:
+                self._matrices.move_to_end(key)
+                return self._matrices[key]
+        km, minutes = self._points_matrix(np.asarray(lats1), np.asarray(lons1), np.asarray(lats2), np.asarray(lons2))
+        km.flags.writeable = minutes.flags.writeable = False  # Shared by every caller of this location set
+        with self._lock:
+            self._matrices[key] = (km, minutes)
+            if len(self._matrices) > MATRIX_CACHE_SIZE:
+                self._matrices.popitem(last=False)
+        return km, minutes
+
+    def legs(self, lats, lons):
+        lats, lons = np.asarray(lats), np.asarray(lons)
+        km, minutes = self._points_matrix(lats[:-1], lons[:-1], lats[1:], lons[1:])
+        return np.diagonal(km).copy(), np.diagonal(minutes).copy()
+
+    def table(self, lats, lons) -> "RoadDistanceTable":
+        """All distances between the distinct points given; RoutingInputError beyond ROAD_MATRIX_MAX_POINTS"""
+        points = np.unique(np.column_stack((lats, lons)), axis=0)
+        if len(points) > ROAD_MATRIX_MAX_POINTS:
+            raise RoutingInputError(f"Road distances cover at most {ROAD_MATRIX_MAX_POINTS} distinct stop and depot "
+                                    f"locations, got {len(points)}")
+        km, minutes = self.matrix(points[:, 0], points[:, 1], points[:, 0], points[:, 1])
+        return RoadDistanceTable(points[:, 0], points[:, 1], km, minutes, self)
+
+class RoadDistanceTable(DistanceBackend):
+    """
+    Precomputed road distances between a fixed set of points, looked up by
+    coordinates. Other points go to `network`. Tables cut out for process
+    pool workers carry no network, so they stay small to send.
+    """
+
+    def __init__(self, lats: np.ndarray, lons: np.ndarray, km: np.ndarray, minutes: np.ndarray,
+                 network: Optional[RoadNetwork] = None):
+        self.lats, self.lons, self.km, self.minutes, self.network = lats, lons, km, minutes, network
+        self._tree = cKDTree(unit_vectors(lats, lons))
+
+    def _rows(self, lats: np.ndarray, lons: np.ndarray) -> Optional[np.ndarray]:
+        chord, rows = self._tree.query(unit_vectors(lats, lons))
+        return rows if np.all(chord < 1e-9) else None
+
+    def _fallback(self) -> RoadNetwork:
+        if self.network is None:
+            raise ValueError("Location outside the road distance table")
+        return self.network
+
+    def matrix(self, lats1, lons1, lats2, lons2):
+        rows, cols = self._rows(lats1, lons1), self._rows(lats2, lons2)
+        if rows is None or cols is None:
+            return self._fallback().matrix(lats1, lons1, lats2, lons2)
+        index = np.ix_(rows, cols)
+        return self.km[index], self.minutes[index]
+
+    def legs(self, lats, lons):
+        rows = self._rows(lats, lons)
+        if rows is None:
+            return self._fallback().legs(lats, lons)
+        return self.km[rows[:-1], rows[1:]], self.minutes[rows[:-1], rows[1:]]
+
+    def table(self, lats, lons) -> "RoadDistanceTable":
+        rows = self._rows(lats, lons)
+        if rows is None:
+            return self._fallback().table(lats, lons)
+        rows = np.unique(rows)
+        index = np.ix_(rows, rows)
+        return RoadDistanceTable(self.lats[rows], self.lons[rows], self.km[index], self.minutes[index])
+
+def synthetic_road_network(center_lat: float, center_lon: float, radius_km: float = 30.0,
+                           spacing_km: float = 0.5, seed: int = 0) -> RoadGraph:
+    """
+    A city for tests and benchmarks, built without any data: two-way grid
+    streets at ~30 km/h with a tenth missing, 60 km/h arterials every
+    4 km, a 100 km/h highway through the centre each way, and a river east
+    of the centre crossed only by bridges every 8 km and the highway.
+    """
+    rng = np.random.default_rng(seed)
+    size = 2 * int(radius_km / spacing_km) + 1
+    mid = size // 2
+    offsets = (np.arange(size) - mid) * spacing_km
+    rows, cols = np.divmod(np.arange(size * size), size)
+    node_lats = center_lat + offsets[rows] / 111.32
+    node_lons = center_lon + offsets[cols] / (111.32 * math.cos(math.radians(center_lat)))
+
+    arterial = max(1, round(4 / spacing_km))
+    bridge = max(1, round(8 / spacing_km))
+    river = mid + size // 6 + np.round(size / 25 * np.sin(np.arange(size) / size * 4 * math.pi)).astype(np.int64)
+    east = cols > river[rows]  # Which bank of the river each node is on
+
+    tails, heads, speeds = [], [], []
+    for step, line in ((1, rows), (size, cols)):  # East-west segments run along a row, north-south along a column
+        start = np.flatnonzero((cols < size - 1) if step == 1 else (rows < size - 1))
+        end = start + step
+        speed = 30 * rng.uniform(0.8, 1.2, len(start))
+        speed = np.where(line[start] % arterial == 0, 60, speed)
+        speed = np.where(line[start] == mid, 100, speed)
+        keep = (speed > 30 * 1.2) | (rng.random(len(start)) > 0.1)
+        crossing = east[start] != east[end]
+        keep &= ~crossing | (speed == 100) | (rows[start] % bridge == 0)
+        start, end, speed = start[keep], end[keep], speed[keep]
+        tails += [start, end]
+        heads += [end, start]
+        speeds += [speed, speed]
+
+    tails, heads, speeds = np.concatenate(tails), np.concatenate(heads), np.concatenate(speeds)
+    points = unit_vectors(node_lats, node_lons)
+    km = np.linalg.norm(points[tails] - points[heads], axis=1) * EARTH_RADIUS_KM
+    return RoadGraph(node_lats, node_lons, tails, heads, km, km / speeds * 60)
+
+def save_road_network(network: RoadNetwork, path: str):
+    """The graph and its hierarchy in one .npz, so loading it skips contraction"""
+    arrays = {f.name: getattr(network.graph, f.name) for f in fields(RoadGraph)}
+    arrays.update({f"ch_{f.name}": getattr(network.hierarchy, f.name) for f in fields(ContractionHierarchy)})
+    np.savez(path, **arrays)
+
+def load_road_network(path: str) -> RoadNetwork:
+    """A graph saved as .npz (RoadGraph arrays), contracted unless the file already holds its hierarchy"""
+    with np.load(path) as data:
+        graph = RoadGraph(**{f.name: data[f.name] for f in fields(RoadGraph)})
+        hierarchy = None
+        if "ch_rank" in data:
+            hierarchy = ContractionHierarchy(**{f.name: data[f"ch_{f.name}"] for f in fields(ContractionHierarchy)})
+    if hierarchy is None:
+        start_time = time.perf_counter()
+        network = RoadNetwork(graph)
+        logger.warning(f"Contracted road graph {path} in {time.perf_counter() - start_time:.1f}s; "
+                       f"save it with python -m route_optimiser.road_network to skip this on startup")
+        return network
+    return RoadNetwork(graph, hierarchy)
+
+_network: Optional[RoadNetwork] = None
+
+def load_configured_road_network() -> Optional[RoadNetwork]:
+    """Load the network at ROAD_GRAPH_PATH; called once at startup, before requests are served"""
+    global _network
+    if _network is None and ROAD_GRAPH_PATH:
+        _network = load_road_network(ROAD_GRAPH_PATH)
+        logger.info(f"Loaded road network {ROAD_GRAPH_PATH}: {len(_network.graph.node_lats)} nodes")
+    return _network
+
+def get_road_network() -> Optional[RoadNetwork]:
+    """The network loaded at startup; None when no graph is configured"""
+    return _network
+
+def main():
+    parser = argparse.ArgumentParser(description="Contract a road graph (or generate a synthetic one) and save it")
+    parser.add_argument("output", help=".npz with the graph and its contraction hierarchy")
+    parser.add_argument("--graph", help=".npz road graph to contract")
+    parser.add_argument("--synthetic", action="store_true", help="Generate a synthetic city instead")
+    parser.add_argument("--center", type=float, nargs=2, default=(32.7767, -96.7970), metavar=("LAT", "LON"))
+    parser.add_argument("--radius-km", type=float, default=30.0)
+    parser.add_argument("--spacing-km", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if not args.synthetic and not args.graph:
+        parser.error("give --graph or --synthetic")
+
+    if args.synthetic:
+        graph = synthetic_road_network(*args.center, args.radius_km, args.spacing_km, args.seed)
+    else:
+        with np.load(args.graph) as data:
+            graph = RoadGraph(**{f.name: data[f.name] for f in fields(RoadGraph)})
+    start_time = time.perf_counter()
+    network = RoadNetwork(graph)
+    elapsed = time.perf_counter() - start_time
+    save_road_network(network, args.output)
+    print(f"{len(graph.node_lats)} nodes, {len(graph.tails)} edges, "
+          f"{len(network.hierarchy.tails) - len(graph.tails)} shortcuts; contracted in {elapsed:.1f}s "
+          f"and saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
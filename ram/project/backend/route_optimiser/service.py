@@ -1,13 +1,25 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
 from typing import List, Tuple, Optional, Dict, Any
 import numpy as np
-import math
 import logging
+import time
 from datetime import datetime, timedelta
+from .construction import PRIORITY_RANK, SHIFT_START_MINUTE, RoutingProblem, regret_insertion
+from .decomposition import DECOMPOSE_ABOVE_STOPS, decomposed_insertion
+from .distance import BASE_SPEED_KMH, HAVERSINE, DistanceBackend, calculate_travel_time, haversine_distance, haversine_distances
+from .errors import RoutingInputError
+from .reoptimization import SolutionStore, reoptimize_solution, solution_from_response
+from .road_network import get_road_network
+from common.serialization import FastJSONResponse, construct, dumps, loads
+from realtime_monitoring.profiling import ProfiledRoute, span
+from realtime_monitoring.state_backend import get_state_backend
 
 logger = logging.getLogger(__name__)
-router = APIRouter()
+router = APIRouter(route_class=ProfiledRoute)
+
+NEAREST_NEIGHBOR_MAX_DELIVERIES = 200  # The baseline is quadratic in Python
 
 class Location(BaseModel):
     lat: float = Field(..., description="Latitude", ge=-90, le=90)
@@ -31,12 +43,19 @@ class Vehicle(BaseModel):
     cost_per_km: float = Field(0.5, description="Cost per kilometer")
 
 class RouteOptimizationRequest(BaseModel):
-    vehicles: List[Vehicle] = Field(..., description="Available vehicles", max_items=20)
-    deliveries: List[DeliveryNode] = Field(..., description="Delivery locations", max_items=200)
+    vehicles: List[Vehicle] = Field(..., description="Available vehicles", max_items=1000)
+    deliveries: List[DeliveryNode] = Field(..., description="Delivery locations", max_items=50000)
     optimization_objective: str = Field("minimize_cost", description="Optimization objective", 
                                       regex="^(minimize_cost|minimize_time|minimize_distance|balanced)$")
     include_traffic: bool = Field(True, description="Include real-time traffic data")
     drone_delivery_enabled: bool = Field(False, description="Enable drone delivery for suitable locations")
+    construction: str = Field("regret", description="Route construction heuristic",
+                              regex="^(regret|nearest_neighbor)$")
+    solve_mode: str = Field("auto", description="Regret construction over the whole instance or cluster by cluster",
+                            regex="^(auto|global|decomposed)$")
+    distance_backend: str = Field("haversine", description="Straight-line distances or the configured road graph",
+                                  regex="^(haversine|road)$")
+    store_solution: bool = Field(False, description="Keep the solution so /route/reoptimize can repair it")
 
 class RouteSegment(BaseModel):
     from_location: Location
@@ -72,28 +91,44 @@ class RouteOptimizationResponse(BaseModel):
     efficiency_improvement_percent: float
     optimization_time_ms: int
     unassigned_deliveries: List[int]
+    speed_kmh: Optional[float] = None  # Travel speed regret routes were planned at
+    solution_id: Optional[str] = None
 
-def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    """Calculate the great circle distance between two points on Earth"""
-    R = 6371  # Earth's radius in kilometers
-    
-    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    
-    a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-    c = 2 * math.asin(math.sqrt(a))
-    
-    return R * c
+class VehiclePosition(BaseModel):
+    vehicle_id: int = Field(..., description="Vehicle identifier")
+    location: Optional[Location] = Field(None, description="Current location; defaults to the last served stop")
+    completed_stops: Optional[int] = Field(None, description="Stops already served on the current route", ge=0)
 
-def calculate_travel_time(distance_km: float, include_traffic: bool = True) -> int:
-    """Calculate travel time considering traffic"""
-    base_speed = 40  # km/h average city speed
+class RouteReoptimizationRequest(BaseModel):
+    solution_id: str = Field(..., description="Solution returned by /optimize or a previous /reoptimize")
+    current_time: int = Field(..., description="Current time in minutes from midnight", ge=0, le=1440)
+    add_deliveries: List[DeliveryNode] = Field([], description="New deliveries", max_items=200)
+    remove_deliveries: List[int] = Field([], description="Cancelled delivery ids")
+    update_deliveries: List[DeliveryNode] = Field([], description="Deliveries with changed details, e.g. delayed windows")
+    vehicle_positions: List[VehiclePosition] = Field([], description="Reported vehicle progress")
+    unavailable_vehicles: List[int] = Field([], description="Vehicles taken out of service")
+
+class RouteReoptimizationResponse(RouteOptimizationResponse):
+    parent_solution_id: str
+    changed_vehicles: List[int]
+    inserted_deliveries: List[int]
+    rejected_removals: List[int]
+    locked_stops: int
+
+def distance_backend(name: str) -> DistanceBackend:
+    """The backend a request names; RoutingInputError for road distances without a road graph"""
+    if name == "haversine":
+        return HAVERSINE
+    network = get_road_network()
+    if network is None:
+        raise RoutingInputError("Road distances need a road graph; set ROAD_GRAPH_PATH")
+    return network
+
+def plan_speed(include_traffic: bool) -> float:
+    """Travel speed for one plan; traffic varies it once per plan so time windows hold along every route"""
     if include_traffic:
-        traffic_factor = np.random.uniform(0.7, 1.3)  # Traffic variation
-        base_speed *= traffic_factor
-    
-    return int((distance_km / base_speed) * 60)  # Convert to minutes
+        return BASE_SPEED_KMH * np.random.uniform(0.7, 1.3)
+    return BASE_SPEED_KMH
 
 def is_drone_suitable(delivery: DeliveryNode) -> bool:
     """Determine if delivery is suitable for drone"""
@@ -109,8 +144,15 @@ class RouteOptimizer:
     
     def optimize_routes(self, request: RouteOptimizationRequest) -> RouteOptimizationResponse:
         """Main route optimization logic"""
-        import time
         start_time = time.time()
+        if request.construction == "nearest_neighbor" and len(request.deliveries) > NEAREST_NEIGHBOR_MAX_DELIVERIES:
+            raise RoutingInputError(f"nearest_neighbor construction takes at most {NEAREST_NEIGHBOR_MAX_DELIVERIES} deliveries")
+        if request.construction == "nearest_neighbor" and request.distance_backend != "haversine":
+            raise RoutingInputError("nearest_neighbor construction uses straight-line distances only")
+        if request.solve_mode == "global" and len(request.deliveries) > DECOMPOSE_ABOVE_STOPS:
+            # Global construction keeps stops x vehicles cost arrays
+            raise RoutingInputError(f"solve_mode=global takes at most {DECOMPOSE_ABOVE_STOPS} deliveries; "
+                                    f"use auto or decomposed")
         
         # Separate drone-suitable deliveries
         drone_deliveries = []
@@ -123,10 +165,17 @@ class RouteOptimizer:
                 vehicle_deliveries.append(delivery)
         
         # Optimize vehicle routes
-        optimized_routes = self._optimize_vehicle_routes(request.vehicles, vehicle_deliveries, request)
+        speed = None
+        with span("construction"):
+            if request.construction == "regret":
+                speed = plan_speed(request.include_traffic)
+                optimized_routes = self._construct_regret_routes(request.vehicles, vehicle_deliveries, request, speed)
+            else:
+                optimized_routes = self._optimize_vehicle_routes(request.vehicles, vehicle_deliveries, request)
         
         # Plan drone deliveries
-        drone_plans = self._plan_drone_deliveries(drone_deliveries)
+        with span("drone_planning"):
+            drone_plans = self._plan_drone_deliveries(drone_deliveries)
         
         # Calculate metrics
         total_cost = sum(route.total_cost for route in optimized_routes)
@@ -148,17 +197,20 @@ class RouteOptimizer:
         
         unassigned = [d.node_id for d in vehicle_deliveries if d.node_id not in assigned_delivery_ids]
         
-        return RouteOptimizationResponse(
-            optimized_routes=optimized_routes,
-            drone_deliveries=drone_plans,
-            total_cost=total_cost,
-            total_distance_km=total_distance,
-            total_time_hours=total_time,
-            cost_savings_percent=cost_savings,
-            efficiency_improvement_percent=efficiency_improvement,
-            optimization_time_ms=optimization_time,
-            unassigned_deliveries=unassigned
-        )
+        with span("response_conversion"):
+            return construct(
+                RouteOptimizationResponse,
+                optimized_routes=optimized_routes,
+                drone_deliveries=drone_plans,
+                total_cost=total_cost,
+                total_distance_km=total_distance,
+                total_time_hours=total_time,
+                cost_savings_percent=float(cost_savings),
+                efficiency_improvement_percent=float(efficiency_improvement),
+                optimization_time_ms=optimization_time,
+                unassigned_deliveries=unassigned,
+                speed_kmh=speed
+            )
     
     def _optimize_vehicle_routes(self, vehicles: List[Vehicle], deliveries: List[DeliveryNode], 
                                 request: RouteOptimizationRequest) -> List[OptimizedRoute]:
@@ -181,13 +233,15 @@ class RouteOptimizer:
                 best_delivery = None
                 best_distance = float('inf')
                 
-                for delivery in deliveries:
+                with span("distance"):
+                    distances = haversine_distances(
+                        current_location.lat, current_location.lon,
+                        np.array([d.location.lat for d in deliveries]),
+                        np.array([d.location.lon for d in deliveries])
+                    ).tolist()
+                
+                for delivery, distance in zip(deliveries, distances):
                     if current_capacity + delivery.demand <= vehicle.capacity:
-                        distance = haversine_distance(
-                            current_location.lat, current_location.lon,
-                            delivery.location.lat, delivery.location.lon
-                        )
-                        
                         travel_time = calculate_travel_time(distance, request.include_traffic)
                         arrival_time = current_time + travel_time
                         
@@ -204,7 +258,8 @@ class RouteOptimizer:
                 travel_time = calculate_travel_time(best_distance, request.include_traffic)
                 arrival_time = current_time + travel_time
                 
-                segment = RouteSegment(
+                segment = construct(
+                    RouteSegment,
                     from_location=current_location,
                     to_location=best_delivery.location,
                     distance_km=best_distance,
@@ -230,12 +285,14 @@ class RouteOptimizer:
                 )
                 return_time = calculate_travel_time(return_distance, request.include_traffic)
                 
-                return_segment = RouteSegment(
+                return_segment = construct(
+                    RouteSegment,
                     from_location=current_location,
                     to_location=vehicle.start_location,
                     distance_km=return_distance,
                     travel_time_minutes=return_time,
-                    arrival_time=self._format_time(current_time + return_time)
+                    arrival_time=self._format_time(current_time + return_time),
+                    delivery_node_id=None
                 )
                 route_segments.append(return_segment)
                 
@@ -243,9 +300,10 @@ class RouteOptimizer:
                 total_distance = sum(s.distance_km for s in route_segments)
                 total_time = sum(s.travel_time_minutes for s in route_segments)
                 total_cost = total_distance * vehicle.cost_per_km
-                efficiency_score = min(95, 60 + (len(assigned_deliveries) * 5))
+                efficiency_score = float(min(95, 60 + (len(assigned_deliveries) * 5)))
                 
-                route = OptimizedRoute(
+                route = construct(
+                    OptimizedRoute,
                     vehicle_id=vehicle.vehicle_id,
                     route_segments=route_segments,
                     total_distance_km=total_distance,
@@ -258,16 +316,92 @@ class RouteOptimizer:
         
         return routes
     
-    def _plan_drone_deliveries(self, deliveries: List[DeliveryNode]) -> List[DroneDelivery]:
-        """Plan drone deliveries for suitable locations"""
+    def _routing_problem(self, vehicles: List[Vehicle], deliveries: List[DeliveryNode],
+                         request: RouteOptimizationRequest, distance: DistanceBackend,
+                         speed_kmh: Optional[float] = None) -> RoutingProblem:
+        """The construction model of a request, with `distance` bound to its stops and depots"""
+        speed = speed_kmh if speed_kmh is not None else plan_speed(request.include_traffic)
+        lats = np.array([d.location.lat for d in deliveries] + [v.start_location.lat for v in vehicles])
+        lons = np.array([d.location.lon for d in deliveries] + [v.start_location.lon for v in vehicles])
+        with span("distance"):
+            distance = distance.table(lats, lons)
+        return RoutingProblem(
+            lats=lats[:len(deliveries)],
+            lons=lons[:len(deliveries)],
+            demand=np.array([d.demand for d in deliveries], dtype=np.int64),
+            service_minutes=np.array([d.service_time_minutes for d in deliveries], dtype=np.float64),
+            window_start=np.array([d.time_window_start for d in deliveries], dtype=np.float64),
+            window_end=np.array([d.time_window_end for d in deliveries], dtype=np.float64),
+            priority_rank=np.array([PRIORITY_RANK[d.priority] for d in deliveries], dtype=np.int64),
+            depot_lats=lats[len(deliveries):],
+            depot_lons=lons[len(deliveries):],
+            capacity=np.array([v.capacity for v in vehicles], dtype=np.int64),
+            shift_end=np.array([SHIFT_START_MINUTE + v.max_working_hours * 60 for v in vehicles], dtype=np.float64),
+            cost_per_km=np.array([v.cost_per_km for v in vehicles]),
+            objective=request.optimization_objective,
+            speed_kmh=speed,
+            distance=distance
+        )
+
+    def _construct_regret_routes(self, vehicles: List[Vehicle], deliveries: List[DeliveryNode],
+                                 request: RouteOptimizationRequest, speed_kmh: Optional[float] = None) -> List[OptimizedRoute]:
+        """
+        Routes by regret-k insertion, honouring time windows, shift length and priorities.
+
+        Large instances (or `solve_mode="decomposed"`) are clustered and
+        solved cluster by cluster in parallel, then repaired along cluster
+        boundaries; see decomposition.py.
+        """
+        problem = self._routing_problem(vehicles, deliveries, request, distance_backend(request.distance_backend),
+                                        speed_kmh)
+        decompose = request.solve_mode == "decomposed" or (
+            request.solve_mode == "auto" and len(deliveries) > DECOMPOSE_ABOVE_STOPS)
+        with span("insertion"):
+            planned, _ = decomposed_insertion(problem) if decompose else regret_insertion(problem)
+
+        routes = []
+        for plan in planned:
+            vehicle = vehicles[plan.vehicle]
+            points = [vehicle.start_location] + [deliveries[i].location for i in plan.stops] + [vehicle.start_location]
+            arrivals = plan.arrivals.tolist() + [plan.return_minute]
+            node_ids = [deliveries[i].node_id for i in plan.stops] + [None]
+            route_segments = [
+                construct(
+                    RouteSegment,
+                    from_location=points[k],
+                    to_location=points[k + 1],
+                    distance_km=distance,
+                    travel_time_minutes=int(round(minutes)),
+                    arrival_time=self._format_time(int(arrival)),
+                    delivery_node_id=node_id
+                )
+                for k, (distance, minutes, arrival, node_id) in enumerate(
+                    zip(plan.legs_km.tolist(), plan.travel_minutes.tolist(), arrivals, node_ids))
+            ]
+            total_distance = float(plan.legs_km.sum())
+            routes.append(construct(
+                OptimizedRoute,
+                vehicle_id=vehicle.vehicle_id,
+                route_segments=route_segments,
+                total_distance_km=total_distance,
+                total_time_minutes=sum(s.travel_time_minutes for s in route_segments),
+                total_cost=total_distance * vehicle.cost_per_km,
+                efficiency_score=float(min(95, 60 + (len(plan.stops) * 5))),
+                deliveries_count=len(plan.stops)
+            ))
+        return routes
+
+    def _plan_drone_deliveries(self, deliveries: List[DeliveryNode], first_index: int = 0) -> List[DroneDelivery]:
+        """Plan drone deliveries for suitable locations, numbering drones from `first_index`"""
         drone_plans = []
         
-        for i, delivery in enumerate(deliveries):
-            flight_time = np.random.randint(8, 20)  # 8-20 minutes flight time
+        for i, delivery in enumerate(deliveries, first_index):
+            flight_time = int(np.random.randint(8, 20))  # 8-20 minutes flight time
             battery_usage = min(85, flight_time * 4)  # Battery usage estimation
-            weather_suitable = np.random.choice([True, False], p=[0.8, 0.2])  # 80% good weather
+            weather_suitable = bool(np.random.choice([True, False], p=[0.8, 0.2]))  # 80% good weather
             
-            drone_plan = DroneDelivery(
+            drone_plan = construct(
+                DroneDelivery,
                 delivery_node_id=delivery.node_id,
                 drone_id=f"DRONE-{i+1:03d}",
                 estimated_flight_time_minutes=flight_time,
@@ -284,8 +418,24 @@ class RouteOptimizer:
         minutes = minutes_from_midnight % 60
         return f"{hours:02d}:{minutes:02d}"
 
+def _reoptimize(solution: Dict[str, Any], request: RouteReoptimizationRequest,
+                drone_plans: List[DroneDelivery]) -> Dict[str, Any]:
+    """Apply a re-optimization request to a stored solution"""
+    return reoptimize_solution(
+        solution,
+        request.current_time,
+        added=loads(dumps(request.add_deliveries)),
+        removed=request.remove_deliveries,
+        updated=loads(dumps(request.update_deliveries)),
+        positions={p.vehicle_id: loads(dumps(p)) for p in request.vehicle_positions},
+        unavailable=request.unavailable_vehicles,
+        drone_plans=loads(dumps(drone_plans)),
+        distance=distance_backend(solution["options"].get("distance_backend", "haversine"))
+    )
+
 # Global optimizer instance
 _route_optimizer = RouteOptimizer()
+_solution_store = SolutionStore(get_state_backend())
 
 @router.post("/optimize", response_model=RouteOptimizationResponse)
 async def optimize_routes(request: RouteOptimizationRequest):
@@ -301,13 +451,66 @@ async def optimize_routes(request: RouteOptimizationRequest):
     - Cost and efficiency optimization
     """
     try:
-        result = _route_optimizer.optimize_routes(request)
-        return result
-        
+        result = await run_in_threadpool(_route_optimizer.optimize_routes, request)
+    except RoutingInputError as e:
+        raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
         logger.error(f"Route optimization failed: {e}")
         raise HTTPException(status_code=500, detail="Route optimization failed")
 
+    if request.store_solution:
+        try:
+            # A store outage only costs the option to re-optimize
+            solution = solution_from_response(loads(dumps(request)), loads(dumps(result)))
+            result.solution_id = await _solution_store.save(solution)
+        except Exception as e:
+            logger.error(f"Failed to store route solution: {e}")
+    return FastJSONResponse(result)
+
+@router.post("/reoptimize", response_model=RouteReoptimizationResponse)
+async def reoptimize_routes(request: RouteReoptimizationRequest):
+    """
+    Repair a stored solution for mid-day changes instead of re-solving.
+
+    Takes a delta against `solution_id`: added, cancelled and updated
+    deliveries, vehicle positions and unavailable vehicles. Stops already
+    served stay locked, only affected routes are repaired (cheapest
+    insertion, then 2-opt) and untouched routes are returned unchanged.
+    The result is stored under a new `solution_id`.
+    """
+    start_time = time.time()
+
+    solution = await _solution_store.load(request.solution_id)
+    if solution is None:
+        raise HTTPException(status_code=404, detail=f"Route solution {request.solution_id} not found or expired")
+
+    # New deliveries follow the drone rule of the original request
+    drone_added = []
+    if solution["options"]["drone_delivery_enabled"]:
+        drone_added = [d for d in request.add_deliveries if is_drone_suitable(d)]
+    drone_plans = _route_optimizer._plan_drone_deliveries(drone_added, first_index=len(solution["drone_deliveries"]))
+
+    try:
+        new_solution = await run_in_threadpool(_reoptimize, solution, request, drone_plans)
+    except RoutingInputError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        logger.error(f"Route re-optimization failed: {e}")
+        raise HTTPException(status_code=500, detail="Route re-optimization failed")
+
+    response = new_solution.pop("response")
+    try:
+        solution_id = await _solution_store.save(new_solution)
+    except Exception as e:
+        logger.error(f"Failed to store route solution: {e}")
+        solution_id = None
+    return FastJSONResponse({
+        **response,
+        "optimization_time_ms": int((time.time() - start_time) * 1000),
+        "solution_id": solution_id,
+        "parent_solution_id": request.solution_id
+    })
+
 @router.get("/metrics")
 async def get_route_metrics():
     """Get current route optimization performance metrics"""
@@ -331,7 +534,7 @@ async def simulate_routes(request: RouteOptimizationRequest):
     """
     try:
         # Run optimization
-        result = _route_optimizer.optimize_routes(request)
+        result = await run_in_threadpool(_route_optimizer.optimize_routes, request)
         
         # Add simulation-specific metrics
         simulation_data = {
@@ -343,8 +546,10 @@ async def simulate_routes(request: RouteOptimizationRequest):
             "customer_satisfaction_score": min(95, 85 + len(result.optimized_routes) * 2)
         }
         
-        return simulation_data
+        return FastJSONResponse(simulation_data)
         
+    except RoutingInputError as e:
+        raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
         logger.error(f"Route simulation failed: {e}")
         raise HTTPException(status_code=500, detail="Route simulation failed")
\ No newline at end of file
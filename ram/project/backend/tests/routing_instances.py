@@ -0,0 +1,40 @@
+"""Random routing instances and a feasibility check shared by the routing tests"""
+import numpy as np
+from route_optimiser.construction import PRIORITY_RANK, SHIFT_START_MINUTE, RouteState, RoutingProblem
+
+def random_problem(seed: int, stops: int, vehicles: int, capacity: int = 40, shift_hours: float = 8,
+                   objective: str = "minimize_cost", tight_windows: bool = True) -> RoutingProblem:
+    rng = np.random.default_rng(seed)
+    if tight_windows:
+        window_start = rng.uniform(SHIFT_START_MINUTE, SHIFT_START_MINUTE + 6 * 60, stops)
+        window_end = window_start + rng.uniform(30, 120, stops)
+    else:
+        window_start = np.full(stops, float(SHIFT_START_MINUTE))
+        window_end = np.full(stops, SHIFT_START_MINUTE + 24 * 60.0)
+    return RoutingProblem(
+        lats=31.5 + rng.normal(0, 0.15, stops),
+        lons=-97.0 + rng.normal(0, 0.15, stops),
+        demand=rng.integers(1, 6, stops),
+        service_minutes=rng.uniform(3, 10, stops),
+        window_start=window_start,
+        window_end=window_end,
+        priority_rank=rng.integers(0, len(PRIORITY_RANK), stops),
+        depot_lats=np.full(vehicles, 31.5),
+        depot_lons=np.full(vehicles, -97.0),
+        capacity=np.full(vehicles, capacity),
+        shift_end=np.full(vehicles, SHIFT_START_MINUTE + shift_hours * 60),
+        cost_per_km=rng.uniform(0.5, 1.5, vehicles),
+        objective=objective
+    )
+
+def assert_feasible(problem: RoutingProblem, routes, unassigned):
+    served = [stop for route in routes for stop in route.stops]
+    assert sorted(served + list(unassigned)) == list(range(len(problem.lats)))  # Each stop exactly once
+    assert len({route.vehicle for route in routes}) == len(routes)
+    for route in routes:
+        state = RouteState(problem, route.vehicle, route.stops)
+        assert state.first_violation() is None
+        assert np.all(state.arrivals <= problem.window_end[route.stops] + 1e-6)
+        assert state.return_minute <= problem.shift_end[route.vehicle] + 1e-6
+        assert problem.demand[route.stops].sum() <= problem.capacity[route.vehicle]
+        np.testing.assert_allclose(route.arrivals, state.arrivals)
@@ -0,0 +1,95 @@
+"""Alert log persistence across workers, deduplication, rate limiting and pagination"""
+from datetime import datetime, timedelta
+import pytest
+from realtime_monitoring.alerts import Alert, AlertStore
+
+START = datetime(2026, 1, 1)
+
+def alert(n: int, component: str = "warehouse", severity: str = "warning", message: str = None) -> Alert:
+    return Alert(alert_id=f"a{n}", severity=severity, component=component,
+                 message=message or f"problem {n}", timestamp=START + timedelta(seconds=n))
+
+@pytest.fixture
+def log_path(tmp_path) -> str:
+    return str(tmp_path / "alerts.jsonl")
+
+def store(log_path: str = None, **kwargs) -> AlertStore:
+    return AlertStore(log_path=log_path, rate_per_second=kwargs.pop("rate_per_second", 0.0),
+                      burst=kwargs.pop("burst", 1000), **kwargs)
+
+def test_appends_survive_another_workers_compaction(log_path):
+    first = store(log_path)
+    first.raise_alert(alert(1))
+    second = store(log_path)  # Replays and compacts the log under the first store
+    first.raise_alert(alert(2))
+    second.raise_alert(alert(3))
+    first.resolve("a1")
+    first.close()
+    second.close()
+
+    replayed = store(log_path)
+    assert sorted(a.alert_id for a in replayed.query()[0]) == ["a1", "a2", "a3"]
+    assert replayed.get("a1").resolved
+    replayed.close()
+
+def test_repeats_are_deduplicated_and_persisted(log_path):
+    alerts = store(log_path)
+    stored, outcome = alerts.raise_alert(alert(1, message="disk full"))
+    assert outcome == "raised"
+    for n in range(2, 6):
+        repeat, outcome = alerts.raise_alert(alert(n, message="disk full"))
+        assert outcome == "deduplicated" and repeat is stored
+    assert stored.occurrences == 5 and stored.last_seen == START + timedelta(seconds=5)
+    assert alerts.stats()["deduplicated"] == 4
+
+    alerts.resolve("a1")
+    assert alerts.raise_alert(alert(6, message="disk full"))[1] == "raised"  # A resolved alert absorbs nothing
+    alerts.close()
+
+    replayed = store(log_path)
+    assert replayed.get("a1").occurrences == 5
+    assert replayed.get("a1").resolved
+    replayed.close()
+
+def test_rate_limit_suppresses_per_component():
+    alerts = store(burst=3)
+    outcomes = [alerts.raise_alert(alert(n))[1] for n in range(5)]
+    assert outcomes == ["raised"] * 3 + ["suppressed"] * 2
+    assert alerts.raise_alert(alert(5, component="carrier"))[1] == "raised"
+    assert alerts.stats()["suppressed"] == {"warehouse": 2}
+
+def test_pagination_is_newest_first_and_complete():
+    alerts = store()
+    for n in range(23):
+        alerts.raise_alert(alert(n, component="warehouse" if n % 2 else "carrier",
+                                 severity="critical" if n % 3 == 0 else "warning"))
+    alerts.resolve("a3")
+
+    for filters in ({}, {"component": "warehouse"}, {"severity": "critical"}, {"resolved": False},
+                    {"component": "warehouse", "severity": "critical", "resolved": False}):
+        seen, cursor = [], None
+        while True:
+            page, cursor = alerts.query(cursor=cursor, limit=4, **filters)
+            assert len(page) <= 4
+            seen += [a.alert_id for a in page]
+            if cursor is None:
+                break
+        expected = [f"a{n}" for n in reversed(range(23))
+                    if ("component" not in filters or filters["component"] == ("warehouse" if n % 2 else "carrier"))
+                    and ("severity" not in filters or filters["severity"] == ("critical" if n % 3 == 0 else "warning"))
+                    and ("resolved" not in filters or n != 3)]
+        assert seen == expected, filters
+
+def test_eviction_drops_resolved_then_oldest_alerts(log_path):
+    alerts = store(log_path, max_retained=10)
+    for n in range(11):  # Eviction waits for 10% headroom over max_retained
+        alerts.raise_alert(alert(n))
+    alerts.resolve("a5")
+    alerts.raise_alert(alert(11))
+    alerts.close()
+    retained = [a.alert_id for a in alerts.query(limit=100)[0]]
+    assert retained == [f"a{n}" for n in reversed(range(1, 12)) if n != 5]
+
+    replayed = store(log_path, max_retained=10)
+    assert [a.alert_id for a in replayed.query(limit=100)[0]] == retained
+    replayed.close()
@@ -0,0 +1,45 @@
+"""Regret insertion: every returned route replayed for windows, capacity and shift end; priority tiers"""
+import numpy as np
+import pytest
+from route_optimiser.construction import RouteState, regret_insertion
+from routing_instances import assert_feasible, random_problem
+
+@pytest.mark.parametrize("objective", ["minimize_cost", "minimize_distance", "minimize_time"])
+@pytest.mark.parametrize("seed", range(4))
+def test_returned_routes_are_feasible(objective, seed):
+    problem = random_problem(seed, stops=300, vehicles=12, objective=objective)
+    routes, unassigned = regret_insertion(problem)
+    assert_feasible(problem, routes, unassigned)
+    assert len(unassigned) < len(problem.lats) / 2
+
+def test_short_shifts_leave_stops_unassigned_not_late():
+    problem = random_problem(7, stops=200, vehicles=4, shift_hours=3)
+    routes, unassigned = regret_insertion(problem)
+    assert unassigned
+    assert_feasible(problem, routes, unassigned)
+
+def test_evaluate_agrees_with_replaying_the_insertion():
+    problem = random_problem(11, stops=80, vehicles=1, capacity=1000, tight_windows=True)
+    route = RouteState(problem, 0)
+    rng = np.random.default_rng(0)
+    for stop in rng.permutation(80)[:40]:
+        costs, positions = route.evaluate(np.array([stop]))
+        feasible_positions = []
+        for position in range(len(route.stops) + 1):
+            trial = RouteState(problem, 0, route.stops[:position] + [stop] + route.stops[position:])
+            if trial.first_violation() is None:
+                feasible_positions.append(position)
+        assert np.isfinite(costs[0]) == bool(feasible_positions)
+        if feasible_positions:
+            assert positions[0] in feasible_positions
+            route.insert(int(positions[0]), int(stop))
+
+def test_priority_tiers_fill_tight_capacity_first():
+    problem = random_problem(3, stops=120, vehicles=4, capacity=15, shift_hours=16, tight_windows=False)
+    problem.demand[:] = 1
+    problem.priority_rank[:] = np.repeat(np.arange(4), 30)  # 30 stops per tier, 60 units of capacity
+    routes, unassigned = regret_insertion(problem)
+    assert_feasible(problem, routes, unassigned)
+    served = np.array([stop for route in routes for stop in route.stops])
+    assert len(served) == 60
+    assert sorted(problem.priority_rank[served]) == [0] * 30 + [1] * 30
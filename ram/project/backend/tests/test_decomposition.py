@@ -0,0 +1,55 @@
+"""Cluster-first decomposition: partition, vehicle allocation and boundary repair"""
+import numpy as np
+import pytest
+from route_optimiser.construction import RouteState, nearest_neighbours
+from route_optimiser.decomposition import _repair, allocate_vehicles, decomposed_insertion, partition
+from routing_instances import assert_feasible, random_problem
+
+def test_partition_covers_every_stop_once():
+    problem = random_problem(0, stops=1000, vehicles=40)
+    clusters = partition(problem.lats, problem.lons, num_clusters=4, max_clusters=40, cluster_stops=100)
+    members = np.concatenate(clusters)
+    assert sorted(members.tolist()) == list(range(1000))
+    assert len(clusters) <= 40
+    assert max(len(c) for c in clusters) <= 2 * 100  # Oversized k-means clusters were split
+
+def test_allocation_gives_each_cluster_its_own_vehicles():
+    problem = random_problem(1, stops=600, vehicles=30)
+    clusters = partition(problem.lats, problem.lons, num_clusters=5, max_clusters=30, cluster_stops=120)
+    fleets = allocate_vehicles(problem, clusters, np.zeros(600))
+    assert len(fleets) == len(clusters)
+    assert all(len(fleet) >= 1 for fleet in fleets)
+    assert sorted(np.concatenate(fleets).tolist()) == list(range(30))
+
+@pytest.mark.parametrize("seed", range(3))
+def test_decomposed_routes_are_feasible_after_repair(seed):
+    problem = random_problem(seed, stops=600, vehicles=24)
+    routes, unassigned = decomposed_insertion(problem, cluster_stops=150, seed=seed)
+    assert_feasible(problem, routes, unassigned)
+    assert len(unassigned) < len(problem.lats) / 2
+
+def test_repair_relocates_boundary_stops_and_places_leftovers_feasibly():
+    problem = random_problem(5, stops=200, vehicles=8, capacity=1000, shift_hours=14, tight_windows=False)
+    problem.lats = 31.5 + (problem.lats - 31.5) * 0.2
+    problem.lons = -97.0 + (problem.lons + 97.0) * 0.2
+    problem.lons[100:] += 0.6  # Two towns, each with four depots
+    problem.depot_lons[4:] += 0.6
+    # A poor cut put stops 100 and 150 in town A's cluster, and town B's cluster left 190-199 unplaced
+    strays = [100, 150]
+    cluster_of = (np.arange(200) >= 100).astype(np.int64)
+    cluster_of[strays] = 0
+    plan = {v: [s for s in range(100) if s % 4 == v] for v in range(4)}
+    plan[0].append(100)
+    plan[1].append(150)
+    plan.update({v: [s for s in range(100, 190) if s % 3 == v - 4 and s not in strays] for v in range(4, 7)})
+    routes = [RouteState(problem, v) for v in range(8)]  # Vehicle 7 stays idle
+    for v, stops in plan.items():
+        for stop in stops:
+            costs, positions = routes[v].evaluate(np.array([stop]))
+            assert np.isfinite(costs[0])
+            routes[v].insert(int(positions[0]), stop)
+
+    left = _repair(problem, routes, list(range(190, 200)), cluster_of, nearest_neighbours(problem.lats, problem.lons, 8))
+    assert left == []
+    assert_feasible(problem, [route.plan() for route in routes if route.stops], left)
+    assert 100 not in routes[0].stops and 150 not in routes[1].stops  # Moved to town B's routes
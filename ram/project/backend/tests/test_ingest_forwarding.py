@@ -0,0 +1,47 @@
+"""A follower's ingest WebSocket gives up on an absent leader instead of retrying forever"""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+from realtime_monitoring import service
+from realtime_monitoring.cluster import LeaderUnavailable
+
+BATCH = '{"series": {"warehouse.load": {"values": [1.0, 2.0]}}}'
+
+class LeaderlessCoordinator:
+    acts_locally = False
+
+    def __init__(self, answer_after: int = None):
+        self.calls = 0
+        self.answer_after = answer_after
+
+    async def call(self, command: str, **args):
+        self.calls += 1
+        if self.answer_after is not None and self.calls > self.answer_after:
+            return {"queued": True}
+        raise LeaderUnavailable("No monitoring leader answered 'ingest'")
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(service, "INGEST_RETRY_SECONDS", 0.01)
+    monkeypatch.setattr(service, "INGEST_FORWARD_TIMEOUT_SECONDS", 0.1)
+    app = FastAPI()
+    app.include_router(service.router, prefix="/monitoring")
+    return TestClient(app)
+
+def test_closes_with_try_again_later_when_no_leader_answers(client, monkeypatch):
+    leaderless = LeaderlessCoordinator()
+    monkeypatch.setattr(service, "coordinator", leaderless)
+    with client.websocket_connect("/monitoring/ingest/ws") as websocket:
+        websocket.send_text(BATCH)
+        with pytest.raises(WebSocketDisconnect) as closed:
+            websocket.receive_text()
+    assert closed.value.code == service.WS_TRY_AGAIN_LATER
+    assert 1 < leaderless.calls <= 12
+
+def test_keeps_streaming_once_a_leader_answers(client, monkeypatch):
+    monkeypatch.setattr(service, "coordinator", LeaderlessCoordinator(answer_after=2))
+    with client.websocket_connect("/monitoring/ingest/ws") as websocket:
+        websocket.send_text(BATCH)
+        websocket.send_text("not json")
+        assert "error" in websocket.receive_json()  # Still open after the retried batch
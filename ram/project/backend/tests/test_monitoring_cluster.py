@@ -0,0 +1,176 @@
+"""Leader election and command forwarding between coordinators sharing one LocalBackend"""
+import asyncio
+from typing import List
+import pytest
+from realtime_monitoring import cluster
+from realtime_monitoring.cluster import LEADER_KEY, LeaderUnavailable, MonitoringCoordinator
+from realtime_monitoring.publisher import ConnectionManager, MonitoringPublisher, TickFrame
+from realtime_monitoring.state_backend import LocalBackend
+
+LEASE = 0.3
+
+@pytest.fixture(autouse=True)
+def short_lease(monkeypatch):
+    monkeypatch.setattr(cluster, "LEASE_SECONDS", LEASE)
+    monkeypatch.setattr(cluster, "RPC_TIMEOUT_SECONDS", 0.2)
+    monkeypatch.setattr(cluster, "RESUBSCRIBE_MIN_SECONDS", 0.05)
+
+class FlakyBackend(LocalBackend):
+    """Lease checks fail while `failing` is set, as when Redis is briefly unreachable"""
+
+    def __init__(self):
+        super().__init__()
+        self.failing = False
+
+    async def acquire_lease(self, key: str, owner: str, ttl_seconds: float) -> bool:
+        if self.failing:
+            raise ConnectionError("backend unreachable")
+        return await super().acquire_lease(key, owner, ttl_seconds)
+
+class BrokenSubscriptionBackend(LocalBackend):
+    """Once armed, the next subscription to `channel` fails, as when a Redis connection drops"""
+
+    def __init__(self, channel: str):
+        super().__init__()
+        self.channel = channel
+        self.armed = False
+        self.failures = 0
+
+    async def subscribe(self, channel: str):
+        if channel == self.channel and self.armed:
+            self.armed = False
+            self.failures += 1
+            raise ConnectionError("pub/sub connection lost")
+        async for data in super().subscribe(channel):
+            yield data
+
+def coordinator(backend: LocalBackend, worker_id: str, transitions: List = None) -> MonitoringCoordinator:
+    async def on_leadership(is_leader: bool):
+        if transitions is not None:
+            transitions.append((worker_id, is_leader))
+
+    node = MonitoringCoordinator(backend, MonitoringPublisher(None, ConnectionManager()), on_leadership, worker_id)
+    node.register("whoami", lambda: worker_id)
+    return node
+
+async def settle():
+    await asyncio.sleep(LEASE / 2)
+
+def test_exactly_one_leader():
+    async def scenario():
+        backend = LocalBackend()
+        nodes = [coordinator(backend, f"w{i}") for i in range(3)]
+        for node in nodes:
+            await node.start()
+        await settle()
+        leaders = [node.worker_id for node in nodes if node.is_leader]
+        for node in nodes:
+            await node.stop()
+        return leaders
+
+    assert len(asyncio.run(scenario())) == 1
+
+def test_follower_takes_over_when_leader_stops():
+    async def scenario():
+        backend = LocalBackend()
+        transitions = []
+        first, second = coordinator(backend, "first", transitions), coordinator(backend, "second", transitions)
+        await first.start()
+        await settle()
+        await second.start()
+        await settle()
+        await first.stop()
+        await asyncio.sleep(LEASE)
+        is_leader = second.is_leader
+        await second.stop()
+        return transitions, is_leader
+
+    transitions, is_leader = asyncio.run(scenario())
+    assert is_leader
+    assert transitions == [("first", True), ("first", False), ("second", True), ("second", False)]
+
+def test_follower_forwards_commands_to_leader():
+    async def scenario():
+        backend = LocalBackend()
+        leader, follower = coordinator(backend, "leader"), coordinator(backend, "follower")
+        await leader.start()
+        await settle()
+        await follower.start()
+        await settle()
+        answer = await follower.call("whoami")
+        await follower.stop()
+        await leader.stop()
+        return answer
+
+    assert asyncio.run(scenario()) == "leader"
+
+def test_call_without_leader_raises():
+    async def scenario():
+        backend = LocalBackend()
+        await backend.acquire_lease(LEADER_KEY, "crashed-worker", 60)  # Held by a worker that no longer answers
+        follower = coordinator(backend, "follower")
+        await follower.start()
+        await settle()
+        try:
+            await follower.call("whoami")
+        finally:
+            await follower.stop()
+
+    with pytest.raises(LeaderUnavailable):
+        asyncio.run(scenario())
+
+def test_transient_lease_error_keeps_leadership_until_expiry():
+    async def scenario():
+        backend = FlakyBackend()
+        node = coordinator(backend, "leader")
+        await node.start()
+        await settle()
+        backend.failing = True
+        await asyncio.sleep(LEASE / 3 + 0.02)  # One failed renewal
+        during_blip = node.is_leader
+        await asyncio.sleep(LEASE)
+        after_expiry = node.is_leader
+        backend.failing = False
+        await asyncio.sleep(LEASE / 2)
+        recovered = node.is_leader
+        await node.stop()
+        return during_blip, after_expiry, recovered
+
+    assert asyncio.run(scenario()) == (True, False, True)
+
+def test_frames_resume_after_subscription_failure():
+    async def scenario():
+        backend = BrokenSubscriptionBackend(cluster.FRAMES_CHANNEL)
+        leader, follower = coordinator(backend, "leader"), coordinator(backend, "follower")
+        await leader.start()
+        await settle()
+        backend.armed = True  # The follower's frame subscription fails
+        await follower.start()
+        await asyncio.sleep(0.2)  # Past the first resubscribe backoff
+        await leader._publish_frame(TickFrame(7, {"status": "ok"}, None, "epoch"))
+        await asyncio.sleep(0.05)
+        frame = follower.publisher.latest_frame
+        await follower.stop()
+        await leader.stop()
+        return backend.failures, frame
+
+    failures, frame = asyncio.run(scenario())
+    assert failures == 1
+    assert frame is not None and frame.version == 7
+
+def test_malformed_command_does_not_stop_the_leader():
+    async def scenario():
+        backend = LocalBackend()
+        leader, follower = coordinator(backend, "leader"), coordinator(backend, "follower")
+        await leader.start()
+        await settle()
+        await follower.start()
+        await settle()
+        await backend.publish(cluster.COMMANDS_CHANNEL, b"not json")
+        await backend.publish(cluster.COMMANDS_CHANNEL, b'{"command": "whoami", "args": {}, "reply_to": "gone"}')
+        answer = await follower.call("whoami")
+        await follower.stop()
+        await leader.stop()
+        return answer
+
+    assert asyncio.run(scenario()) == "leader"
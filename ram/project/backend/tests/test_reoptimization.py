@@ -0,0 +1,113 @@
+"""Re-optimizing a stored solution: locked prefixes, cancellations, unavailable vehicles, untouched routes"""
+import numpy as np
+import pytest
+from benchmarks import payloads
+from common.serialization import dumps, loads
+from route_optimiser.errors import RoutingInputError
+from route_optimiser.reoptimization import reoptimize_solution, solution_from_response
+from route_optimiser.service import RouteOptimizationRequest, RouteOptimizer
+
+@pytest.fixture(scope="module")
+def solution():
+    request = payloads.route_request(np.random.default_rng(3), num_stops=150, num_vehicles=8)
+    request["drone_delivery_enabled"] = False
+    parsed = RouteOptimizationRequest(**request)
+    stored = solution_from_response(loads(dumps(parsed)), loads(dumps(RouteOptimizer().optimize_routes(parsed))))
+    stored["solution_id"] = "base"
+    return stored
+
+def reoptimize(solution, current_time=600, added=(), removed=(), updated=(), positions=None, unavailable=()):
+    return reoptimize_solution(loads(dumps(solution)), current_time, added=list(added), removed=list(removed),
+                               updated=list(updated), positions=positions or {}, unavailable=list(unavailable),
+                               drone_plans=[])
+
+def routed(solution):
+    return {route["vehicle_id"]: route["stops"] for route in solution["routes"]}
+
+def assert_every_stop_once(result, expected):
+    stops = [stop for route in result["routes"] for stop in route["stops"]] + result["unassigned"]
+    assert sorted(stops) == sorted(expected)
+
+def assert_on_time(result):
+    deliveries = {d["node_id"]: d for d in result["deliveries"]}
+    for route in result["routes"]:
+        for stop, arrival in list(zip(route["stops"], route["arrivals"]))[route["served"]:]:
+            assert arrival <= deliveries[stop]["time_window_end"], (route["vehicle_id"], stop)
+
+def all_stops(solution):
+    return [d["node_id"] for d in solution["deliveries"]]
+
+def test_empty_delta_returns_every_route_as_stored(solution):
+    result = reoptimize(solution, current_time=0)
+    assert result["response"]["changed_vehicles"] == []
+    assert result["response"]["optimized_routes"] == [route["route"] for route in solution["routes"]]
+    assert routed(result) == routed(solution)
+
+def test_served_stops_stay_locked(solution):
+    vehicle, stops = next((r["vehicle_id"], r["stops"]) for r in solution["routes"] if len(r["stops"]) >= 4)
+    stored = next(r["route"] for r in solution["routes"] if r["vehicle_id"] == vehicle)
+    result = reoptimize(solution, removed=[stops[0], stops[3]], positions={vehicle: {"completed_stops": 2}})
+
+    route = next(r for r in result["routes"] if r["vehicle_id"] == vehicle)
+    assert route["served"] == 2 and route["stops"][:2] == stops[:2]
+    assert route["route"]["route_segments"][:2] == [s for s in stored["route_segments"]
+                                                    if s["delivery_node_id"] is not None][:2]
+    assert result["response"]["rejected_removals"] == [stops[0]]
+    assert stops[3] not in route["stops"]
+    assert_every_stop_once(result, set(all_stops(solution)) - {stops[3]})
+    assert_on_time(result)
+
+def test_cancelled_and_added_stops(solution):
+    cancelled = [route["stops"][-1] for route in solution["routes"][:3] if route["stops"]]
+    added = payloads.route_request(np.random.default_rng(9), num_stops=4, num_vehicles=1)["deliveries"]
+    for k, delivery in enumerate(added):
+        delivery["node_id"] = 1000 + k
+    result = reoptimize(solution, added=added, removed=cancelled)
+
+    assert not set(cancelled) & {d["node_id"] for d in result["deliveries"]}
+    expected = set(all_stops(solution)) - set(cancelled) | {d["node_id"] for d in added}
+    assert_every_stop_once(result, expected)
+    assert {d["node_id"] for d in added} <= set(result["response"]["inserted_deliveries"]) | set(result["unassigned"])
+    assert_on_time(result)
+
+def test_unavailable_vehicle_hands_its_stops_to_others(solution):
+    vehicle, stops = next((r["vehicle_id"], r["stops"]) for r in solution["routes"] if r["stops"])
+    result = reoptimize(solution, current_time=0, unavailable=[vehicle])  # Before it served anything
+
+    assert vehicle not in routed(result)
+    assert result["unavailable_vehicles"] == [vehicle]
+    assert_every_stop_once(result, all_stops(solution))
+    assert set(stops) <= set(result["response"]["inserted_deliveries"]) | set(result["unassigned"])
+    assert_on_time(result)
+
+    # The vehicle stays out of later re-optimizations of the new solution
+    again = reoptimize({**result, "solution_id": "next"}, current_time=0, removed=[stops[0]])
+    assert vehicle not in routed(again)
+
+def test_unavailable_vehicle_keeps_only_what_it_served(solution):
+    vehicle, stops = next((r["vehicle_id"], r["stops"]) for r in solution["routes"] if len(r["stops"]) >= 3)
+    result = reoptimize(solution, positions={vehicle: {"completed_stops": 1}}, unavailable=[vehicle])
+
+    assert routed(result)[vehicle] == stops[:1]
+    assert_every_stop_once(result, all_stops(solution))
+    assert_on_time(result)
+
+def test_untouched_routes_are_returned_as_stored(solution):
+    vehicle, stops = next((r["vehicle_id"], r["stops"]) for r in solution["routes"] if len(r["stops"]) >= 2)
+    result = reoptimize(solution, current_time=0, removed=[stops[1]])
+
+    changed = set(result["response"]["changed_vehicles"])
+    assert vehicle in changed
+    stored = {route["vehicle_id"]: route["route"] for route in solution["routes"]}
+    returned = {route["vehicle_id"]: route for route in result["response"]["optimized_routes"]}
+    for vid in set(stored) - changed:
+        assert returned[vid] == stored[vid]
+    assert_every_stop_once(result, set(all_stops(solution)) - {stops[1]})
+
+def test_unknown_references_are_rejected(solution):
+    with pytest.raises(RoutingInputError, match="unknown deliveries"):
+        reoptimize(solution, removed=[999999])
+    with pytest.raises(RoutingInputError, match="Unknown vehicle"):
+        reoptimize(solution, unavailable=[999])
+    with pytest.raises(RoutingInputError, match="already exists"):
+        reoptimize(solution, added=[solution["deliveries"][0]])
@@ -0,0 +1,78 @@
+"""Contraction-hierarchy road distances against plain Dijkstra on the uncontracted graph"""
+import numpy as np
+import pytest
+from scipy.sparse.csgraph import csgraph_from_dense, dijkstra
+from route_optimiser import road_network
+from route_optimiser.distance import haversine_matrix
+from route_optimiser.errors import RoutingInputError
+from route_optimiser.road_network import RoadNetwork, load_road_network, save_road_network, synthetic_road_network
+
+@pytest.fixture(scope="module")
+def network() -> RoadNetwork:
+    return RoadNetwork(synthetic_road_network(31.5, -97.0, radius_km=10, spacing_km=0.5, seed=3))
+
+@pytest.fixture(scope="module")
+def nodes(network: RoadNetwork) -> np.ndarray:
+    return np.random.default_rng(0).choice(network._snap_nodes, 60, replace=False)
+
+def dijkstra_minutes(network: RoadNetwork, sources: np.ndarray, targets: np.ndarray) -> np.ndarray:
+    graph = network.graph
+    n = len(graph.node_lats)
+    dense = np.full((n, n), np.inf)
+    np.minimum.at(dense, (graph.tails, graph.heads), graph.minutes)  # Parallel roads: the fastest counts
+    return dijkstra(csgraph_from_dense(dense, null_value=np.inf), indices=sources)[:, targets]
+
+def test_matrix_matches_dijkstra(network, nodes):
+    lats, lons = network.graph.node_lats[nodes], network.graph.node_lons[nodes]
+    km, minutes = network.matrix(lats, lons, lats, lons)
+    np.testing.assert_allclose(minutes, dijkstra_minutes(network, nodes, nodes), atol=1e-6)
+    assert np.all(km >= haversine_matrix(lats, lons, lats, lons) - 1e-6)
+
+def test_rectangular_matrix_matches_dijkstra(network, nodes):
+    sources, targets = nodes[:15], nodes[15:]
+    graph = network.graph
+    _, minutes = network.matrix(graph.node_lats[sources], graph.node_lons[sources],
+                                graph.node_lats[targets], graph.node_lons[targets])
+    np.testing.assert_allclose(minutes, dijkstra_minutes(network, sources, targets), atol=1e-6)
+
+def test_river_makes_roads_asymmetric_to_straight_lines(network, nodes):
+    lats, lons = network.graph.node_lats[nodes], network.graph.node_lons[nodes]
+    km, _ = network.matrix(lats, lons, lats, lons)
+    straight = haversine_matrix(lats, lons, lats, lons)
+    off_diagonal = ~np.eye(len(nodes), dtype=bool)
+    assert (km[off_diagonal] / straight[off_diagonal]).max() > 1.5
+
+def test_legs_match_matrix(network, nodes):
+    lats, lons = network.graph.node_lats[nodes[:10]], network.graph.node_lons[nodes[:10]]
+    km, minutes = network.legs(lats, lons)
+    full_km, full_minutes = network.matrix(lats, lons, lats, lons)
+    np.testing.assert_allclose(km, np.diagonal(full_km, 1))
+    np.testing.assert_allclose(minutes, np.diagonal(full_minutes, 1))
+
+def test_off_graph_points_pay_access_legs(network, nodes):
+    lats, lons = network.graph.node_lats[nodes[:2]], network.graph.node_lons[nodes[:2]]
+    _, on_graph = network.matrix(lats[:1], lons[:1], lats[1:], lons[1:])
+    _, off_graph = network.matrix(lats[:1] + 0.001, lons[:1], lats[1:], lons[1:])
+    assert off_graph[0, 0] > on_graph[0, 0]
+
+def test_table_matches_network(network, nodes):
+    lats, lons = network.graph.node_lats[nodes], network.graph.node_lons[nodes]
+    table = network.table(lats, lons)
+    for table_result, network_result in zip(table.matrix(lats[:5], lons[:5], lats, lons),
+                                            network.matrix(lats[:5], lons[:5], lats, lons)):
+        np.testing.assert_allclose(table_result, network_result)
+    # Points outside the table fall back to the network
+    np.testing.assert_allclose(table.legs(lats[:3] + 0.001, lons[:3])[1], network.legs(lats[:3] + 0.001, lons[:3])[1])
+
+def test_table_rejects_too_many_points(network, nodes, monkeypatch):
+    monkeypatch.setattr(road_network, "ROAD_MATRIX_MAX_POINTS", 10)
+    with pytest.raises(RoutingInputError):
+        network.table(network.graph.node_lats[nodes], network.graph.node_lons[nodes])
+
+def test_saved_hierarchy_loads_without_contracting(network, nodes, tmp_path):
+    path = str(tmp_path / "roads.npz")
+    save_road_network(network, path)
+    loaded = load_road_network(path)
+    np.testing.assert_array_equal(loaded.hierarchy.rank, network.hierarchy.rank)
+    lats, lons = network.graph.node_lats[nodes], network.graph.node_lons[nodes]
+    np.testing.assert_allclose(loaded.matrix(lats, lons, lats, lons)[1], network.matrix(lats, lons, lats, lons)[1])
@@ -0,0 +1,51 @@
+"""Vectorized safety stock policy against a per-row reference, and input validation"""
+from statistics import NormalDist
+import numpy as np
+import pyarrow as pa
+import pytest
+from inventory_optimiser.safety_stock import Z_P90, process_ipc_stream
+
+def ipc(**columns) -> bytes:
+    table = pa.table({"sku_id": [1, 2], "node_id": [10, 20], **columns})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def policy(body: bytes, **kwargs) -> pa.Table:
+    return pa.ipc.open_stream(process_ipc_stream(body, **kwargs)).read_all()
+
+P50 = [[10.0, 12.0, 14.0], [5.0, 5.0]]
+P90 = [[15.0, 18.0, 20.0], [8.0, 7.0]]
+
+def test_matches_per_row_reference():
+    result = policy(ipc(lead_time=[2, 1], p50=P50, p90=P90), service_level=0.95, review_period=1)
+    z = NormalDist().inv_cdf(0.95)
+    for row, (p50, p90, lead_time) in enumerate(zip(P50, P90, [2, 1])):
+        sigma = (np.array(p90) - np.array(p50)) / Z_P90
+        assert result["lead_time_demand"][row].as_py() == pytest.approx(sum(p50[:lead_time]))
+        assert result["safety_stock"][row].as_py() == pytest.approx(z * np.sqrt((sigma[:lead_time] ** 2).sum()))
+        assert result["reorder_point"][row].as_py() == pytest.approx(
+            sum(p50[:lead_time]) + z * np.sqrt((sigma[:lead_time] ** 2).sum())
+        )
+
+def test_days_past_the_horizon_repeat_the_average_day():
+    result = policy(ipc(lead_time=[5, 4], p50=P50, p90=P90))
+    assert result["lead_time_demand"].to_pylist() == pytest.approx([36 + 2 * 12, 10 + 2 * 5])
+
+@pytest.mark.parametrize("columns, message", [
+    ({"lead_time": [1, 1], "p50": [[1.0, 2.0], [1.0]], "p90": [[2.0], [2.0]]}, "same length"),
+    ({"lead_time": [1, 1], "p50": [[1.0], []], "p90": [[2.0], []]}, "non-empty"),
+    ({"lead_time": [1, 1], "p50": [[1.0], None], "p90": [[2.0], [2.0]]}, "nulls"),
+    ({"lead_time": [1, None], "p50": P50, "p90": P90}, "nulls"),
+    ({"lead_time": [1, -2], "p50": P50, "p90": P90}, "lead_time"),
+    ({"lead_time": [1, 1], "review_period": [7, -1], "p50": P50, "p90": P90}, "review_period"),
+    ({"lead_time": [1, 1], "service_level": [0.9, 1.0], "p50": P50, "p90": P90}, "service_level"),
+])
+def test_invalid_rows_are_rejected(columns, message):
+    with pytest.raises(pa.ArrowInvalid, match=message):
+        policy(ipc(**columns))
+
+def test_missing_column_is_rejected():
+    with pytest.raises(KeyError, match="p90"):
+        policy(ipc(lead_time=[1, 1], p50=P50))
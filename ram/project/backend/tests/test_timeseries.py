@@ -0,0 +1,15 @@
+"""Metric history keeps large counters exact at every resolution"""
+import numpy as np
+from realtime_monitoring.timeseries import MetricSeries
+
+def test_counters_past_float32_precision_are_exact():
+    series = MetricSeries()
+    timestamps = np.arange(0.0, 3600.0, 2.0)
+    counter = 2 ** 24 + np.arange(len(timestamps))  # Odd values above 2**24 do not fit in float32
+    series.append(timestamps, counter)
+
+    assert np.array_equal(series.query(0, 3600, "raw")["value"], counter)
+    minutes = series.query(0, 3600, "1m")
+    assert np.array_equal(minutes["min"], counter[::30])
+    assert np.array_equal(minutes["max"], counter[29::30])
+    assert series.query(0, 3600, "1h")["mean"][0] == counter.mean()